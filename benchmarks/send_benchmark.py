@@ -0,0 +1,368 @@
+"""
+Throughput benchmark for the email send pipeline.
+
+Generates a synthetic recipient sheet, templates, attachment and pictures,
+then runs main.main() against an in-process SMTP sink and reports how long
+each stage took, messages per second and peak memory.
+
+Run from the repository root:
+    python -m benchmarks.send_benchmark --rows 1000 10000 --output bench.json
+    python -m benchmarks.send_benchmark --rows 1000 --compare bench.json
+
+Every size runs in its own process so peak RSS is measured per size.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import smtplib
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+DEFAULT_ROWS = [1000, 10000, 100000]
+DEFAULT_ATTACHMENT_KB = 500
+PICTURE_COUNT = 50
+
+# Stage name -> (module, attribute) timed by wrapping the function
+STAGES = {
+    'excel_load': ('sending_email.excel_handler', 'load_recipients'),
+    'template_load': ('sending_email.template_handler', 'get_compiled_template'),
+    'personalize': ('sending_email.template_handler', 'render_recipient'),
+    'mime_build': ('sending_email.email_sender', 'build_message'),
+    'excel_save': ('sending_email.excel_handler', 'save_recipients'),
+}
+
+TEXT_TEMPLATE = """Subject: Hello from {your_name} - {company}
+---
+Hi {first_name},
+
+I saw the {position} opening at {company}. {value_prop_sentence}
+
+Best,
+{your_name}
+{your_phone_number} | {your_email} | {your_city_and_state}
+"""
+
+# Same file name as the real picture template, so pictures get embedded
+PICTURE_TEMPLATE_FILE = 'template_shpe_2025_with_picture.html'
+PICTURE_TEMPLATE = """Subject: Great meeting you, {first_name}
+---
+<html><body>
+<p>Hi {first_name},</p>
+<p>Thanks for stopping by, it was great to hear about {position} roles at {company}.</p>
+{dynamic_image_tag}
+<p>{value_prop_sentence}</p>
+<p>Best,<br>{your_name}<br>{your_phone_number}</p>
+</body></html>
+"""
+
+# Smallest valid GIF; the index only looks at the file name
+_GIF_BYTES = (b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00'
+              b',\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;')
+
+
+class StageTimer:
+    """
+    Adds up wall time and call counts per stage across all threads.
+
+    Stages that run on the pool's worker threads overlap each other, so their
+    totals can add up to more than the run's wall time.
+    """
+
+    def __init__(self):
+        self.seconds = {}
+        self.calls = {}
+        self._lock = threading.Lock()
+        self._patches = []
+
+    def add(self, stage, elapsed):
+        with self._lock:
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + elapsed
+            self.calls[stage] = self.calls.get(stage, 0) + 1
+
+    def wrap(self, owner, attribute, stage):
+        original = getattr(owner, attribute)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.add(stage, time.perf_counter() - start)
+
+        setattr(owner, attribute, timed)
+        self._patches.append((owner, attribute, original))
+
+    def restore(self):
+        for owner, attribute, original in reversed(self._patches):
+            setattr(owner, attribute, original)
+        self._patches = []
+
+    def report(self):
+        return {
+            stage: {'seconds': round(self.seconds[stage], 4), 'calls': self.calls[stage]}
+            for stage in sorted(self.seconds)
+        }
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB, or None where unsupported."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+# --- Synthetic data ---
+
+def make_fixture(folder, rows, attachment_kb):
+    """
+    Writes a recipient sheet, two templates, one attachment and a few
+    pictures into 'folder'.
+
+    Returns:
+        dict: Paths of everything written.
+    """
+    template_folder = os.path.join(folder, 'templates')
+    image_folder = os.path.join(folder, 'pictures')
+    os.makedirs(template_folder, exist_ok=True)
+    os.makedirs(image_folder, exist_ok=True)
+
+    with open(os.path.join(template_folder, 'template_bench.txt'), 'w', encoding='utf-8') as f:
+        f.write(TEXT_TEMPLATE)
+    with open(os.path.join(template_folder, PICTURE_TEMPLATE_FILE), 'w', encoding='utf-8') as f:
+        f.write(PICTURE_TEMPLATE)
+
+    attachment = os.path.join(folder, 'attachment.pdf')
+    with open(attachment, 'wb') as f:
+        f.write(os.urandom(attachment_kb * 1024))
+
+    names = [f"Person{i} Example" for i in range(rows)]
+    companies = [f"Company{i % 997}" for i in range(rows)]
+    for i in range(min(PICTURE_COUNT, rows)):
+        with open(os.path.join(image_folder, f"{companies[i]}_{names[i]}.gif"), 'wb') as f:
+            f.write(_GIF_BYTES)
+
+    df = pd.DataFrame({
+        'Name': names,
+        'Email': [f"person{i}@example.com" for i in range(rows)],
+        'Companies': companies,
+        'Positions': ['Software Engineer Intern', 'Data Analyst', 'Product Manager'] * (rows // 3) +
+                     ['Software Engineer Intern'] * (rows % 3),
+        # Every 10th row uses the picture template
+        'Template File': [PICTURE_TEMPLATE_FILE if i % 10 == 0 else 'template_bench.txt' for i in range(rows)],
+        'Framework': ['passion', 'known_for', 'mission', ''] * (rows // 4) + [''] * (rows % 4),
+        'my strength': 'building reliable data pipelines',
+        'something my target audience values': 'faster product decisions',
+        'Sent or Not': None,
+    })
+    excel_file = os.path.join(folder, 'recipients.xlsx')
+    df.to_excel(excel_file, index=False)
+
+    return {
+        'excel_file': excel_file,
+        'template_folder': template_folder,
+        'image_folder': image_folder,
+        'attachment': attachment,
+    }
+
+
+# --- One run ---
+
+def run_once(rows, attachment_kb, pool_size, backend, transport='threads', latency_ms=0):
+    """
+    Runs main.main() once over a fresh synthetic sheet of 'rows' recipients.
+
+    Returns:
+        dict: Timings and counters for this run.
+    """
+    import main
+    from sending_email import config
+    from sending_email import email_sender
+    from sending_email import excel_handler
+    from sending_email import template_handler
+    from benchmarks.smtp_sink import SmtpSink
+
+    modules = {
+        'sending_email.excel_handler': excel_handler,
+        'sending_email.template_handler': template_handler,
+        'sending_email.email_sender': email_sender,
+    }
+
+    with tempfile.TemporaryDirectory(prefix='send-bench-') as folder:
+        fixture = make_fixture(folder, rows, attachment_kb)
+
+        with SmtpSink(latency=latency_ms / 1000) as sink:
+            config.EXCEL_FILE = fixture['excel_file']
+            config.TEMPLATE_FOLDER = fixture['template_folder']
+            config.IMAGE_FOLDER = fixture['image_folder']
+            config.IMAGE_OPTIMIZE_DIR = os.path.join(folder, 'image_cache')
+            config.ATTACHMENT_FILES = [fixture['attachment']]
+            config.RECIPIENT_BACKEND = backend
+            config.RECIPIENT_CACHE_DIR = os.path.join(folder, 'cache')
+            config.SEND_JOURNAL_FILE = os.path.join(folder, 'journal.sqlite3')
+            config.SENDER_EMAIL = 'bench@example.com'
+            config.PASSWORD = ''
+            config.SMTP_SERVER = '127.0.0.1'
+            config.SMTP_PORT = sink.port
+            config.SMTP_USE_SSL = False
+            config.SMTP_POOL_SIZE = pool_size
+            config.SMTP_TRANSPORT = transport
+            config.MAX_EMAILS_PER_SECOND = None
+            config.MAX_EMAILS_PER_MINUTE = None
+            # Every fixture recipient is @example.com; measure the pipeline, not the per-domain cap
+            config.DOMAIN_MAX_IN_FLIGHT = None
+            config.DOMAIN_MAX_PER_MINUTE = None
+
+            timer = StageTimer()
+            for stage, (module_name, attribute) in STAGES.items():
+                timer.wrap(modules[module_name], attribute, stage)
+            # send_message() ends in sendmail(), and pre-rendered sends call it directly
+            timer.wrap(smtplib.SMTP, 'sendmail', 'smtp_transmit')
+
+            start = time.perf_counter()
+            try:
+                # main() prints a line per recipient; keep the report readable
+                with contextlib.redirect_stdout(io.StringIO()):
+                    main.main([])
+            finally:
+                wall = time.perf_counter() - start
+                timer.restore()
+
+            delivered = sink.messages
+            delivered_mb = sink.bytes / (1024 * 1024)
+
+    return {
+        'rows': rows,
+        'attachment_kb': attachment_kb,
+        'pool_size': pool_size,
+        'backend': backend,
+        'transport': transport,
+        'latency_ms': latency_ms,
+        'delivered': delivered,
+        'delivered_mb': round(delivered_mb, 1),
+        'wall_seconds': round(wall, 3),
+        'messages_per_second': round(delivered / wall, 2) if wall else None,
+        'peak_rss_mb': peak_rss_mb(),
+        'stages': timer.report(),
+    }
+
+
+# --- Reporting ---
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def print_result(result):
+    print(f"\n{result['rows']} rows: {result['delivered']} delivered in {result['wall_seconds']}s "
+          f"({result['messages_per_second']} msg/s, peak RSS {result['peak_rss_mb']} MB)")
+    for stage, numbers in result['stages'].items():
+        print(f"  {stage:<15} {numbers['seconds']:>10.3f}s  {numbers['calls']:>8} calls")
+
+
+def compare(results, baseline_file):
+    """Prints msg/s against a previous results file, matched on row count."""
+    try:
+        with open(baseline_file, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Error: Could not read baseline '{baseline_file}': {e}")
+        return
+    previous = {entry['rows']: entry for entry in baseline.get('results', [])}
+    print(f"\nCompared with {baseline_file} (revision {baseline.get('revision')}):")
+    for result in results:
+        old = previous.get(result['rows'])
+        if not old or not old.get('messages_per_second'):
+            print(f"  {result['rows']} rows: no baseline")
+            continue
+        change = result['messages_per_second'] / old['messages_per_second'] - 1
+        print(f"  {result['rows']} rows: {old['messages_per_second']} -> "
+              f"{result['messages_per_second']} msg/s ({change:+.1%})")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the email send pipeline against a local SMTP sink.")
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS,
+                        help="Recipient sheet sizes to run (default: 1000 10000 100000).")
+    parser.add_argument('--attachment-kb', type=int, default=DEFAULT_ATTACHMENT_KB,
+                        help="Size of the synthetic attachment sent with every email.")
+    parser.add_argument('--pool-size', type=int, default=3, help="SMTP connections (SMTP_POOL_SIZE).")
+    parser.add_argument('--backend', default='excel', help="RECIPIENT_BACKEND to use.")
+    parser.add_argument('--transport', default='threads', choices=('threads', 'pipelined'),
+                        help="SMTP_TRANSPORT to use.")
+    parser.add_argument('--latency-ms', type=int, default=0,
+                        help="Delay the sink adds before every reply, to mimic a distant server.")
+    parser.add_argument('--output', default='bench_results.json', help="Where to write the JSON results.")
+    parser.add_argument('--compare', metavar='FILE', help="Previous results file to compare against.")
+    # Internal: run one size in this process and write its result to a file
+    parser.add_argument('--single-run', metavar='FILE', help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.single_run:
+        result = run_once(args.rows[0], args.attachment_kb, args.pool_size, args.backend,
+                          args.transport, args.latency_ms)
+        with open(args.single_run, 'w', encoding='utf-8') as f:
+            json.dump(result, f)
+        return
+
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results = []
+    for rows in args.rows:
+        print(f"Running {rows} rows...")
+        with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+            result_file = f.name
+        try:
+            completed = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.send_benchmark', '--single-run', result_file,
+                 '--rows', str(rows), '--attachment-kb', str(args.attachment_kb),
+                 '--pool-size', str(args.pool_size), '--backend', args.backend,
+                 '--transport', args.transport, '--latency-ms', str(args.latency_ms)],
+                cwd=repo_root
+            )
+            if completed.returncode != 0:
+                print(f"Error: The {rows}-row run failed (exit code {completed.returncode}).")
+                continue
+            with open(result_file, 'r', encoding='utf-8') as f:
+                result = json.load(f)
+        finally:
+            os.remove(result_file)
+        results.append(result)
+        print_result(result)
+
+    report = {
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to '{args.output}'.")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
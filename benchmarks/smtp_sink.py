@@ -0,0 +1,159 @@
+import collections
+import queue
+import re
+import socket
+import socketserver
+import threading
+import time
+
+_RCPT_ADDRESS = re.compile(rb'<([^>]*)>')
+
+
+class _SinkHandler(socketserver.StreamRequestHandler):
+    """Speaks just enough SMTP for smtplib to deliver messages, then drops them."""
+
+    def _send(self, data):
+        if self._delayed is None:
+            self.wfile.write(data)
+        else:
+            self._delayed.put((time.monotonic() + self.server.sink.latency, data))
+
+    def _reply(self, line):
+        self._send(line.encode('ascii') + b'\r\n')
+
+    def _write_delayed(self):
+        # Every reply arrives 'latency' after its command, like a distant
+        # server: pipelined commands share one wait, lockstep ones each pay it
+        while True:
+            item = self._delayed.get()
+            if item is None:
+                return
+            due, data = item
+            time.sleep(max(0.0, due - time.monotonic()))
+            try:
+                self.wfile.write(data)
+            except OSError:
+                return
+
+    def handle(self):
+        # Like a real MTA; otherwise Nagle skews small pipelined replies
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._delayed = None
+        writer = None
+        if self.server.sink.latency:
+            self._delayed = queue.Queue()
+            writer = threading.Thread(target=self._write_delayed, daemon=True)
+            writer.start()
+        try:
+            self._converse()
+        finally:
+            if writer is not None:
+                self._delayed.put(None)
+                writer.join()
+
+    def _converse(self):
+        sink = self.server.sink
+        self._reply("220 sink ready")
+        recipients = 0  # accepted RCPTs in the current transaction
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            sink.count(command.decode('ascii', 'replace'))
+            if command == b'EHLO':
+                self._send(b"250-sink\r\n250-PIPELINING\r\n250-8BITMIME\r\n250-SMTPUTF8\r\n250 OK\r\n")
+            elif command == b'DATA' and not recipients:
+                # What real servers answer after every RCPT was refused
+                self._reply("554 5.5.1 No valid recipients")
+            elif command == b'DATA':
+                recipients = 0
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                size = 0
+                for data_line in self.rfile:
+                    if data_line in (b'.\r\n', b'.\n'):
+                        break
+                    size += len(data_line)
+                sink.record(size)
+                self._reply("250 OK")
+            elif command == b'QUIT':
+                self._reply("221 Bye")
+                return
+            elif command == b'RCPT':
+                match = _RCPT_ADDRESS.search(line)
+                reply = sink.rcpt_reply(match.group(1).decode('utf-8', 'replace') if match else '')
+                self._reply(reply)
+                if reply.startswith('25'):
+                    recipients += 1
+                if reply.startswith('421'):
+                    # 421 = closing the connection, and a real server then does
+                    return
+            elif command in (b'MAIL', b'RSET'):
+                recipients = 0
+                self._reply("250 OK")
+            elif command in (b'HELO', b'NOOP'):
+                self._reply("250 OK")
+            else:
+                self._reply("502 Command not implemented")
+
+
+class _SinkServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SmtpSink:
+    """
+    In-process SMTP server that accepts and discards every message.
+
+    Used by the benchmarks and tests so the send path can be exercised
+    without a network or a real mail provider. Listens on 127.0.0.1; port 0
+    picks a free port (see 'port' after start()). 'latency' (seconds) delays
+    every reply to mimic a server far away.
+
+    'rcpt_replies' scripts refusals: {address: ['451 4.7.1 Try later', ...]}
+    answers that address's next RCPT TOs with those lines, in order, then
+    accepts it. A '421' reply also closes the connection. 'commands' counts
+    the commands received, by verb.
+    """
+
+    def __init__(self, port=0, latency=0.0, rcpt_replies=None):
+        self.latency = latency
+        self.messages = 0
+        self.bytes = 0
+        self.commands = collections.Counter()
+        self.rcpt_replies = {address.lower(): list(replies) for address, replies in (rcpt_replies or {}).items()}
+        self._lock = threading.Lock()
+        self._server = _SinkServer(('127.0.0.1', port), _SinkHandler)
+        self._server.sink = self
+        self.port = self._server.server_address[1]
+        self._thread = None
+
+    def record(self, size):
+        with self._lock:
+            self.messages += 1
+            self.bytes += size
+
+    def count(self, command):
+        with self._lock:
+            self.commands[command] += 1
+
+    def rcpt_reply(self, address):
+        with self._lock:
+            scripted = self.rcpt_replies.get(address.lower())
+            return scripted.pop(0) if scripted else "250 OK"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,115 @@
+"""
+One entry point for every tool in this repository:
+
+    python cli.py send [main.py options]        # send the campaign
+    python cli.py scrape [scrape_pages options] # extract companies from saved pages
+    python cli.py combine [combine_data options]
+    python cli.py rate [rating_companies options]
+    python cli.py status [--show-config]        # progress from the send journal
+
+Heavy dependencies (pandas, bs4, genai) are imported only by the subcommand
+that needs them, so 'status' and '--help' start instantly.
+
+Settings from sending_email/config.py can be overridden, in increasing order
+of priority, by a config file (--config, $EMAILER_CONFIG or ./emailer.toml /
+./emailer.json), EMAILER_<NAME> environment variables and --set NAME=VALUE.
+"""
+import argparse
+import os
+import sys
+
+SCRAPER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scrapping-companies')
+
+# Settings whose values 'status --show-config' never prints
+SECRET_SETTINGS = ('PASSWORD', 'SENDER_ACCOUNTS')
+
+
+def _scraper_module(name):
+    # The scraper scripts import each other as top-level modules
+    if SCRAPER_DIR not in sys.path:
+        sys.path.insert(0, SCRAPER_DIR)
+    return __import__(name)
+
+
+def run_send(args, rest):
+    import main
+    main.main(rest)
+
+
+def run_scrape(args, rest):
+    _scraper_module('scrape_pages').main(rest)
+
+
+def run_combine(args, rest):
+    _scraper_module('combine_data').main(rest)
+
+
+def run_rate(args, rest):
+    _scraper_module('rating_companies').main(rest)
+
+
+def run_status(args, rest):
+    from sending_email import config
+    from sending_email import campaign_status
+
+    status_parser = argparse.ArgumentParser(prog='cli.py status', description="Show campaign progress.")
+    status_parser.add_argument('--show-config', action='store_true',
+                               help="Also print every setting and where its value came from.")
+    status_args = status_parser.parse_args(rest)
+
+    campaign_status.print_status(config.SEND_JOURNAL_FILE)
+    if status_args.show_config:
+        from sending_email import settings
+        print("\nSettings:")
+        for name in settings.setting_names(config):
+            value = getattr(config, name)
+            if name in SECRET_SETTINGS and value:
+                value = '***'
+            source = args.sources.get(name, 'config.py')
+            print(f"  {name} = {value!r}  [{source}]")
+
+
+COMMANDS = {
+    'send': (run_send, "Send the email campaign (options are main.py's)."),
+    'scrape': (run_scrape, "Extract companies from saved pages or URLs."),
+    'combine': (run_combine, "Combine company lists, or update the company master."),
+    'rate': (run_rate, "Rate companies with Gemini."),
+    'status': (run_status, "Show campaign progress from the send journal."),
+}
+
+# Subcommands that read sending_email/config.py
+USES_CONFIG = ('send', 'status')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='cli.py',
+        description="Scrape companies and send personalized emails.",
+        epilog="Run 'cli.py COMMAND --help' for a command's own options."
+    )
+    parser.add_argument('--config', metavar='FILE',
+                        help="JSON/TOML file overriding settings in sending_email/config.py.")
+    parser.add_argument('--set', dest='overrides', action='append', default=[], metavar='NAME=VALUE',
+                        help="Override one setting, e.g. --set SMTP_POOL_SIZE=5 (repeatable).")
+    subparsers = parser.add_subparsers(dest='command', metavar='COMMAND', required=True)
+    for name, (_, help_text) in COMMANDS.items():
+        # The subcommand's own parser handles its options, including --help
+        subparsers.add_parser(name, help=help_text, add_help=False)
+    return parser.parse_known_args(argv)
+
+
+def main(argv=None):
+    args, rest = parse_args(argv)
+    args.sources = {}
+    if args.command in USES_CONFIG:
+        from sending_email import config
+        from sending_email import settings
+        sources = settings.apply_once(config, args.config, pairs=args.overrides)
+        if sources is None:
+            sys.exit(2)
+        args.sources = sources
+    COMMANDS[args.command][0](args, rest)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,12 +1,220 @@
-import time
+import argparse
+from collections import Counter
+
+import pandas as pd
+
 from sending_email import config
 from sending_email import excel_handler
 from sending_email import template_handler
 from sending_email import email_sender
+from sending_email import send_pool
+from sending_email import send_journal
+from sending_email import image_index
+from sending_email import image_optimizer
+from sending_email import render_stage
+from sending_email import metrics
+from sending_email import sharding
+from sending_email import smtp_pipeline
+from sending_email import settings
+
+def select_recipients(df, report_skipped=True):
+    """
+    Picks the rows that will get an email: pending rows with a template
+    that loads. Rows that are already sent or have no or a bad template are
+    skipped here, so len() of the result is what the run will send.
+
+    Returns:
+        (pd.DataFrame, dict): (prepare_recipients() rows to send,
+        {template file: CompiledTemplate}).
+    """
+    # Work out the pending rows, first names and value props for the whole sheet at once
+    pending = excel_handler.pending_mask(df)
+    skipped_count = int((~pending).sum())
+    if skipped_count:
+        metrics.registry.inc('emails_skipped_total', {'reason': 'already_sent'}, skipped_count)
+        if report_skipped:
+            print(f"  [SKIPPED] {skipped_count} emails already marked as 'Sent or Response'.")
+    recipients = template_handler.prepare_recipients(df[pending])
+
+    templates = {}
+    selected = []
+    for recipient in recipients.itertuples(name='Recipient'):
+        # Get the template file name from the row
+        template_file = recipient.template_file
+        if pd.isna(template_file) or not str(template_file).strip():
+            metrics.registry.inc('emails_skipped_total', {'reason': 'no_template'})
+            print(f"  [SKIPPED] No template file specified for {recipient.name}.")
+            continue
+
+        # Load the correct template (parsed once, then served from the cache)
+        if template_file not in templates:
+            templates[template_file] = template_handler.get_compiled_template(
+                config.TEMPLATE_FOLDER,
+                template_file
+            )
+        if templates[template_file] is None:
+            metrics.registry.inc('emails_skipped_total', {'reason': 'bad_template'})
+            print(f"  [SKIPPED] Could not load template for {recipient.name}.")
+            continue
+        selected.append(recipient.Index)
+    return recipients.loc[selected], templates
+
+def personalize_jobs(recipients, templates):
+    """Yields a SendJob for every row select_recipients() picked."""
+    for recipient in recipients.itertuples(name='Recipient'):
+        template_file = recipient.template_file
+        subject, body, image_to_embed = template_handler.render_recipient(
+            templates[template_file],
+            recipient,
+            config.YOUR_NAME,
+            config.YOUR_PHONE_NUMBER,
+            config.SENDER_EMAIL,
+            config.YOUR_STATE_AND_CITY,
+            config.IMAGE_FOLDER
+        )
+        if image_to_embed:
+            # Pictures are optimized here, in the thread feeding the pool, once each,
+            # rather than by whichever send worker builds the first message
+            image_optimizer.optimized_path(image_to_embed)
+
+        # Attach resume to ALL emails
+        yield send_pool.SendJob(
+            key=recipient.Index,
+            recipient_email=recipient.email,
+            subject=subject,
+            body=body,
+            attachment_paths=config.ATTACHMENT_FILES,
+            inline_image_path=image_to_embed,
+            template_file=template_file
+        )
+
+def build_send_jobs(df, report_skipped=True):
+    """
+    Yields a SendJob for every row that still needs an email.
+    Rows that are already sent or can't be personalized are skipped here.
+    """
+    recipients, templates = select_recipients(df, report_skipped)
+    yield from personalize_jobs(recipients, templates)
+
+def filter_recipients(df, shard, shard_by, check):
+    """
+    Finds the rows of 'df' (the sheet, or one chunk of it) that this run
+    sends to: this shard's rows that pass the recipient checks. Email cells
+    are cleaned up in place.
+
+    Args:
+        shard ((int, int) or None): (index, count) from --shard.
+        shard_by (str): One of sharding.SHARD_MODES.
+        check (callable): Takes df, returns issues like check_recipients().
+
+    Returns:
+        (pd.Series, pd.Series): (rows to send, issues of this shard's rows).
+    """
+    to_send = pd.Series(True, index=df.index)
+    if shard is not None:
+        offset = int(df.index[0]) if len(df) else 0
+        to_send = sharding.shard_mask(df, shard[0], shard[1], shard_by, offset=offset)
+
+    # Blank, malformed and duplicate addresses never reach the MIME/SMTP stages
+    if 'Email' in df.columns:
+        cleaned = excel_handler.normalize_emails(df['Email'])
+        changed = df['Email'].notna() & (cleaned != df['Email'].astype(str))
+        df.loc[changed, 'Email'] = cleaned[changed]
+    issues = check(df)
+    for reason, count in issues[to_send & (issues != '')].value_counts().items():
+        metrics.registry.inc('emails_skipped_total', {'reason': reason}, int(count))
+    return to_send & (issues == ''), issues[to_send]
+
+def build_streamed_jobs(chunks, journal, sent, shard, shard_by, checker, issues_file, stats, issues):
+    """
+    Yields SendJobs while the sheet is still being read (--stream). Each
+    chunk goes through the same steps main() applies to the whole sheet:
+    journal merge, shard filter, recipient checks, personalization.
+
+    Args:
+        chunks (iterable): DataFrames from excel_handler.iter_recipient_chunks().
+        sent (set): journal.sent_keys(), read up front: this generator runs
+            in the pool's feeder thread, which can't use the journal's connection.
+        checker (excel_handler.StreamingRecipientChecker): Carries the
+            duplicate checks across chunks.
+        stats (collections.Counter): Counts 'rows', 'recovered' and
+            'already_sent', for the end-of-run summary.
+        issues (collections.Counter): Counts skipped rows per check_recipients() reason.
+    """
+    issues_written = False
+    for chunk in chunks:
+        stats['rows'] += len(chunk)
+        stats['recovered'] += journal.merge_into(chunk, sent)
+        to_send, chunk_issues = filter_recipients(chunk, shard, shard_by, checker.check)
+        flagged = chunk_issues[chunk_issues != '']
+        issues.update(flagged.tolist())
+        if issues_file and not flagged.empty:
+            # The run's first write replaces the file, later chunks append
+            excel_handler.write_issues(chunk, flagged, issues_file, append=issues_written)
+            issues_written = True
+        stats['already_sent'] += int((~excel_handler.pending_mask(chunk[to_send])).sum())
+        yield from build_send_jobs(chunk[to_send], report_skipped=False)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Send personalized emails from the recipient sheet.")
+    parser.add_argument('--compact-journal', action='store_true',
+                        help="Write every send recorded in the journal into the recipient store, then exit.")
+    parser.add_argument('--export-excel', action='store_true',
+                        help="Write the cached recipients back into the Excel file, then exit "
+                             "(only needed with the 'parquet' or 'sqlite' RECIPIENT_BACKEND).")
+    parser.add_argument('--render-only', metavar='DIR',
+                        help="Don't send anything: write every pending email to DIR as an .eml file.")
+    parser.add_argument('--send-rendered', metavar='DIR',
+                        help="Send the .eml files a previous --render-only run wrote to DIR.")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Processes used by --render-only (default: one per CPU core).")
+    parser.add_argument('--metrics-file', default=config.METRICS_FILE,
+                        help="Keep campaign metrics in this file while sending (see METRICS_FORMAT).")
+    parser.add_argument('--shard', metavar='INDEX/COUNT',
+                        help="Only send this shard's rows, e.g. 0/3. Run one process per shard; rows are "
+                             "claimed in the send journal so none is sent twice. Shards only write to the "
+                             "journal, never the shared Excel file: run --compact-journal once they're all done.")
+    parser.add_argument('--shard-by', choices=sharding.SHARD_MODES, default='email',
+                        help="Split rows by a hash of the email address (default) or by row position.")
+    parser.add_argument('--stream', action='store_true',
+                        help="Read the sheet in chunks and start sending while it's still being read. "
+                             "Memory stays flat for very large sheets; the Excel file isn't rewritten "
+                             "(run --compact-journal afterwards).")
+    parser.add_argument('--follow-up', metavar='TEMPLATE',
+                        help="Send TEMPLATE to everyone who was sent --after-template at least --after-days "
+                             "ago and hasn't responded. Found from the send journal; the sheet isn't edited.")
+    parser.add_argument('--after-template', metavar='TEMPLATE',
+                        help="The earlier campaign's template, for --follow-up.")
+    parser.add_argument('--after-days', type=float, default=config.FOLLOW_UP_AFTER_DAYS,
+                        help="Days to wait before following up (default: FOLLOW_UP_AFTER_DAYS).")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    # Same layering as cli.py: a config file and EMAILER_* variables override config.py
+    if settings.apply_once(config) is None:
+        return
+    args = parse_args(argv)
+
+    if args.compact_journal:
+        journal = send_journal.SendJournal(config.SEND_JOURNAL_FILE)
+        try:
+            send_journal.compact(journal, config.EXCEL_FILE, config.RECIPIENT_BACKEND, config.RECIPIENT_CACHE_DIR)
+        finally:
+            journal.close()
+        if not args.export_excel:
+            return
+
+    if args.export_excel:
+        excel_handler.export_recipients(config.EXCEL_FILE, config.RECIPIENT_BACKEND, config.RECIPIENT_CACHE_DIR)
+        return
 
-def main():
     print(f"--- Starting Email Sender ---")
-    
+    image_index.configure(
+        refresh_seconds=config.IMAGE_INDEX_REFRESH_SECONDS,
+        max_cache_bytes=config.IMAGE_CACHE_MAX_MB * 1024 * 1024
+    )
+    image_optimizer.configure(config.IMAGE_OPTIMIZE_DIR, config.IMAGE_MAX_WIDTH, config.IMAGE_QUALITY)
+
     # --- 1. GET PASSWORD SECURELY ---
     try:
         password = config.PASSWORD
@@ -14,97 +222,228 @@ def main():
         print(f"Error getting password: {e}")
         return
 
+    if args.stream and (args.render_only or args.send_rendered or args.follow_up):
+        print("Error: --stream sends straight from the sheet; it can't be combined with "
+              "--render-only, --send-rendered or --follow-up.")
+        return
+    if args.follow_up and not args.after_template:
+        print("Error: --follow-up needs --after-template, the template the first email was sent from.")
+        return
+
+    # Several processes can share one workbook, each sending its own shard
+    sender_email = config.SENDER_EMAIL
+    shard = shard_index = None
+    if args.shard:
+        shard = sharding.parse_shard_spec(args.shard)
+        if shard is None:
+            return
+        shard_index = shard[0]
+        if config.SENDER_ACCOUNTS:
+            account = config.SENDER_ACCOUNTS[shard_index % len(config.SENDER_ACCOUNTS)]
+            sender_email, password = account['email'], account['password']
+        print(f"Sending as {sender_email}.")
+    mx_cache = excel_handler.load_mx_cache(config.MX_CACHE_FILE) if config.MX_CACHE_FILE else None
+
     # --- 2. LOAD EXCEL DATA ---
-    df = excel_handler.load_recipients(config.EXCEL_FILE)
-    if df is None:
-        print("Exiting program.")
+    journal = send_journal.SendJournal(config.SEND_JOURNAL_FILE)
+    if args.stream:
+        # Rows are read, checked and personalized chunk by chunk while the pool sends
+        df = sheet = to_send = None
+        recovered_count = 0
+        stream_stats, stream_issues = Counter(), Counter()
+    else:
+        df = excel_handler.load_recipients(config.EXCEL_FILE, config.RECIPIENT_BACKEND, config.RECIPIENT_CACHE_DIR)
+        if df is None:
+            print("Exiting program.")
+            journal.close()
+            return
+
+        # Bring back any sends an earlier, interrupted run recorded but never saved
+        recovered_count = journal.merge_into(df)
+        if recovered_count:
+            print(f"Recovered {recovered_count} 'Sent' marks from the send journal.")
+
+        # From here on 'df' holds the rows to send; 'sheet' is what gets saved
+        sheet = df
+        if args.follow_up:
+            # The journal knows who got what and when; the sheet knows who responded
+            journal.record_responses(excel_handler.responded_emails(sheet))
+            due = journal.follow_ups_due(args.after_template, args.follow_up, args.after_days)
+            print(f"Follow-ups due: {len(due)} recipients of '{args.after_template}' "
+                  f"from more than {args.after_days:g} days ago.")
+            df = excel_handler.follow_up_rows(sheet, due, args.after_template, args.follow_up)
+
+        to_send, issues = filter_recipients(
+            df, shard, args.shard_by, lambda frame: excel_handler.check_recipients(frame, mx_cache)
+        )
+        if shard is not None:
+            print(f"Shard {shard_index}/{shard[1]}: {len(issues)} of {len(df)} rows.")
+        excel_handler.report_issues(df, issues, issues_file=config.RECIPIENT_ISSUES_FILE)
+
+    if args.render_only:
+        # CPU-bound stage only: personalize and build every message, no SMTP
+        render_settings = render_stage.RenderSettings(
+            template_folder=config.TEMPLATE_FOLDER,
+            image_folder=config.IMAGE_FOLDER,
+            attachment_paths=config.ATTACHMENT_FILES,
+            sender_email=sender_email,
+            your_name=config.YOUR_NAME,
+            your_phone_number=config.YOUR_PHONE_NUMBER,
+            your_city_and_state=config.YOUR_STATE_AND_CITY,
+            image_optimize_dir=config.IMAGE_OPTIMIZE_DIR,
+            image_max_width=config.IMAGE_MAX_WIDTH,
+            image_quality=config.IMAGE_QUALITY
+        )
+        render_stage.render_campaign(df[to_send], args.render_only, render_settings, workers=args.workers)
+        journal.close()
         return
-        
+
     # --- 3. CONNECT TO EMAIL SERVER ---
-    server = email_sender.login_to_server(
-        config.SMTP_SERVER, 
-        config.SMTP_PORT, 
-        config.SENDER_EMAIL, 
-        password
-    )
-    
+    def connect():
+        return email_sender.login_to_server(
+            config.SMTP_SERVER,
+            config.SMTP_PORT,
+            sender_email,
+            password,
+            use_ssl=config.SMTP_USE_SSL
+        )
+
+    # Check the credentials once before starting the worker pool
+    server = connect()
     if server is None:
         print("Could not log in. Exiting program.")
+        if recovered_count and shard is None:
+            excel_handler.save_recipients(sheet, config.EXCEL_FILE, config.RECIPIENT_BACKEND, config.RECIPIENT_CACHE_DIR)
+        journal.close()
         return
+    server.quit()
+
+    rate_limiter = send_pool.RateLimiter(
+        per_second=config.MAX_EMAILS_PER_SECOND,
+        per_minute=config.MAX_EMAILS_PER_MINUTE
+    )
+    if config.SMTP_TRANSPORT == 'pipelined':
+        # Few connections, many messages in flight on each
+        pool = smtp_pipeline.PipelinedSenderPool(
+            config.SMTP_SERVER,
+            config.SMTP_PORT,
+            sender_email,
+            password,
+            use_ssl=config.SMTP_USE_SSL,
+            size=config.SMTP_POOL_SIZE,
+            batch_size=config.SMTP_PIPELINE_BATCH,
+            rate_limiter=rate_limiter,
+            max_attempts=config.MAX_SEND_ATTEMPTS,
+            keepalive_seconds=config.SMTP_KEEPALIVE_SECONDS,
+            retry_base_seconds=config.RETRY_BASE_SECONDS,
+            retry_max_seconds=config.RETRY_MAX_SECONDS
+        )
+    else:
+        pool = send_pool.SmtpSenderPool(
+            connect,
+            sender_email,
+            size=config.SMTP_POOL_SIZE,
+            rate_limiter=rate_limiter,
+            max_attempts=config.MAX_SEND_ATTEMPTS,
+            retry_base_seconds=config.RETRY_BASE_SECONDS,
+            retry_max_seconds=config.RETRY_MAX_SECONDS,
+            domain_max_in_flight=config.DOMAIN_MAX_IN_FLIGHT,
+            domain_per_minute=config.DOMAIN_MAX_PER_MINUTE,
+            domain_limits=config.DOMAIN_LIMITS
+        )
 
     # --- 4. ITERATE, PERSONALIZE, AND SEND ---
     emails_sent_count = 0
+    claims = lease_keeper = None
+    if args.shard:
+        claims = sharding.ClaimStore(
+            config.SEND_JOURNAL_FILE,
+            sharding.default_owner(shard_index),
+            config.CLAIM_LEASE_SECONDS
+        )
+        lease_keeper = sharding.LeaseKeeper(claims).start()
+    progress = None
     try:
-        for index, row in df.iterrows():
-            # Check if the email needs to be sent
-            if str(row.get('Sent or Not', '')).lower() == 'sent' or str(row.get('Sent or Not', '')).lower() == 'response':
-                print(f"  [SKIPPED] Email for {row.get('Name')} already marked as 'Sent or Response'.")
-                continue
-                
-            # Get the template file name from the row
-            template_file = row.get('Template File')
-            if not template_file:
-                print(f"  [SKIPPED] No template file specified for {row.get('Name')}.")
-                continue
-
-            # A. Load the correct template
-            subject_template, body_template = template_handler.load_template(
-                config.TEMPLATE_FOLDER, 
-                template_file
-            )
-            if subject_template is None:
-                print(f"  [SKIPPED] Could not load template for {row.get('Name')}.")
-                continue
-            
-            # B. Personalize the template
-            subject, body,image_to_embed = template_handler.personalize_template(
-                subject_template, 
-                body_template, 
-                row, 
-                config.YOUR_NAME,
-                config.YOUR_PHONE_NUMBER, 
-                config.SENDER_EMAIL,       
-                config.YOUR_STATE_AND_CITY,
-                config.IMAGE_FOLDER,
-                template_file
-            )
-            
-            recipient_email = row.get('Email')
-            # Attach resume to ALL emails
-            files_to_send = config.ATTACHMENT_FILES
-            
-            # C. Send the email
-            success = email_sender.send_email(
-                server, 
-                config.SENDER_EMAIL, 
-                recipient_email, 
-                subject, 
-                body,
-                attachment_paths=files_to_send,
-                inline_image_path=image_to_embed,
-                
-            )
-            
-            if success:
-                print(f"  [SUCCESS] Email sent to {row.get('Name')} at {recipient_email}")
-                df.at[index, 'Sent or Not'] = 'Sent'
+        # The total for the ETA counts only the messages that will actually be sent
+        total = None
+        if args.stream:
+            chunks = excel_handler.iter_recipient_chunks(config.EXCEL_FILE, config.STREAM_CHUNK_ROWS)
+            checker = excel_handler.StreamingRecipientChecker(mx_cache)
+            jobs = build_streamed_jobs(chunks, journal, journal.sent_keys(), shard, args.shard_by, checker,
+                                       config.RECIPIENT_ISSUES_FILE, stream_stats, stream_issues)
+        elif args.send_rendered:
+            # Only file paths: cheap to list up front
+            jobs = [job for job in render_stage.iter_rendered_jobs(args.send_rendered, df) if to_send[job.key]]
+            total = len(jobs)
+        else:
+            recipients, templates = select_recipients(df[to_send])
+            jobs = personalize_jobs(recipients, templates)
+            total = len(recipients)
+        progress = metrics.ProgressReporter(
+            total=total,
+            interval=config.PROGRESS_INTERVAL_SECONDS,
+            metrics_file=args.metrics_file,
+            metrics_format=config.METRICS_FORMAT
+        ).start()
+        if claims is not None:
+            jobs = claims.claimed_jobs(jobs)
+        for result in pool.send_all(jobs):
+            template_file = result.job.template_file
+            recipient = result.job.recipient_email
+            if df is not None:
+                name = df.at[result.job.key, 'Name'] if 'Name' in df.columns else None
+                recipient = f"{name} at {recipient}"
+            if result.success:
+                # Journal first: it's what survives a crash before the Excel save
+                journal.record(result.job.key, result.job.recipient_email, template_file, 'Sent')
+                print(f"  [SUCCESS] Email sent to {recipient}")
+                if df is not None:
+                    df.at[result.job.key, 'Sent or Not'] = 'Sent'
+                metrics.registry.inc('emails_sent_total')
                 emails_sent_count += 1
-                
-                # Be polite to the server, wait a moment
-                time.sleep(2)
+            else:
+                journal.record(result.job.key, result.job.recipient_email, template_file, 'Failed', result.error)
+                metrics.registry.inc('emails_failed_total', {'code': email_sender.smtp_error_code(result.error)})
+                print(f"  [FAILED] to send to {result.job.recipient_email}: {result.error}")
+            if claims is not None:
+                claims.release(result.job.recipient_email, template_file)
 
     except Exception as e:
         print(f"An unexpected error occurred during sending: {e}")
     finally:
+        if progress is not None:
+            progress.stop()
+        if claims is not None:
+            lease_keeper.stop()
+            # Anything still claimed was never sent; let another process have it
+            claims.release_all()
+            claims.close()
         # --- 5. QUIT SERVER ---
-        server.quit()
+        # Each worker logs out of its own connection when the pool shuts down
         print(f"\nLogged out of SMTP server.")
-        
+
         # --- 6. SAVE CHANGES TO EXCEL ---
-        if emails_sent_count > 0:
-            excel_handler.save_recipients(df, config.EXCEL_FILE)
+        # One write at the end; the journal already has every send if this never runs
+        if args.stream:
+            print(f"Streamed {stream_stats['rows']} rows: {stream_stats['already_sent']} already sent "
+                  f"({stream_stats['recovered']} according to the journal).")
+            if stream_issues:
+                print(f"  [SKIPPED] {sum(stream_issues.values())} rows failed the recipient checks: "
+                      + ', '.join(f"{reason}: {count}" for reason, count in stream_issues.most_common()))
+            print("The Excel file is unchanged; run 'python main.py --compact-journal' to write the 'Sent' marks.")
+        elif shard is not None:
+            # Several shards rewriting one workbook at once can leave it corrupt;
+            # the journal is safe to share, so the marks are folded in once at the end
+            print(f"Shard {shard_index}/{shard[1]}: {emails_sent_count} sends recorded in the send journal; the Excel file is unchanged.")
+            print("Once every shard is done, run 'python main.py --compact-journal' to write the 'Sent' marks.")
+        elif (emails_sent_count > 0 and not args.follow_up) or recovered_count > 0:
+            # Follow-ups live in the journal only; their rows in the sheet are already 'Sent'
+            excel_handler.save_recipients(sheet, config.EXCEL_FILE, config.RECIPIENT_BACKEND, config.RECIPIENT_CACHE_DIR)
+        elif args.follow_up and emails_sent_count > 0:
+            print(f"{emails_sent_count} follow-ups recorded in the send journal; the Excel file is unchanged.")
         else:
             print("No new emails were sent, no changes saved to Excel.")
+        journal.close()
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -1,5 +1,10 @@
+import argparse
+
 import pandas as pd
 
+import company_master
+import company_matching
+
 # --- Configuration ---
 FILE_DATA1 = 'data1.xlsx'  # Your main file (the default)
 FILE_DATA2 = 'data2.xlsx'  # The file with new data
@@ -7,17 +12,64 @@ OUTPUT_FILE = 'data_combined.xlsx' # The final output file
 
 # Column name to use for matching
 MATCH_COLUMN = 'Company Name'
+# Names scoring at least this much count as the same company ("Google LLC" ~ "Google").
+# Set to 1.0 to only match names that are identical after normalization.
+MATCH_THRESHOLD = 0.85
+
+# Master mode: 'python combine_data.py --master source1.xlsx source2.xlsx ...'
+MASTER_DB = 'company_master.sqlite3'
+MASTER_OUTPUT_FILE = 'company_master.xlsx'
 # ---------------------
 
-def main():
-    print(f"Reading '{FILE_DATA1}' (default) and '{FILE_DATA2}' (new data)...")
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Combine scraped company lists.")
+    parser.add_argument('--master', nargs='+', metavar='SOURCE',
+                        help="Merge any number of source files into the incremental company master "
+                             f"('{MASTER_DB}') instead of combining '{FILE_DATA1}' and '{FILE_DATA2}'.")
+    parser.add_argument('--master-db', default=MASTER_DB, help="Master database file.")
+    parser.add_argument('--data1', default=FILE_DATA1, help="Main file (all of its rows are kept).")
+    parser.add_argument('--data2', default=FILE_DATA2, help="File with the new data.")
+    parser.add_argument('--output', default=None, help="Excel file to write.")
+    return parser.parse_args(argv)
+
+def update_master(sources, master_db, output_file):
+    """
+    Folds new or changed source files into the company master and exports it.
+    Sources whose content hash hasn't changed are skipped.
+    """
+    print(f"Updating company master '{master_db}' from {len(sources)} sources...")
+    master = company_master.CompanyMaster(master_db, MATCH_THRESHOLD)
+    try:
+        statuses = master.update_sources(sources)
+        changed = sum(status in ('added', 'updated') for status in statuses.values())
+        print(f"{changed} sources added or updated, "
+              f"{sum(status == 'unchanged' for status in statuses.values())} unchanged.")
+        df = master.to_dataframe()
+    finally:
+        master.close()
+
+    try:
+        df.to_excel(output_file, sheet_name='Master', index=False)
+        print(f"\n✅ Success! {len(df)} companies saved to '{output_file}'.")
+    except Exception as e:
+        print(f"Error writing Excel file: {e}")
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.master:
+        update_master(args.master, args.master_db, args.output or MASTER_OUTPUT_FILE)
+        return
+
+    output_file = args.output or OUTPUT_FILE
+    file_data1, file_data2 = args.data1, args.data2
+    print(f"Reading '{file_data1}' (default) and '{file_data2}' (new data)...")
     try:
         # Read both Excel files (assuming data is on the first sheet)
-        df1 = pd.read_excel(FILE_DATA1, sheet_name=0)
-        df2 = pd.read_excel(FILE_DATA2, sheet_name=0)
+        df1 = pd.read_excel(file_data1, sheet_name=0)
+        df2 = pd.read_excel(file_data2, sheet_name=0)
     except FileNotFoundError as e:
         print(f"Error: Could not find file {e.filename}.")
-        print("Please make sure 'data1.xlsx' and 'data2.xlsx' are in the same directory.")
+        print(f"Please make sure '{file_data1}' and '{file_data2}' exist.")
         return
     except Exception as e:
         print(f"Error reading Excel files: {e}")
@@ -37,37 +89,45 @@ def main():
     # ---------------------
 
     print("Merging matching companies to 'data1'...")
-    # 1. Merge data1 and data2, keeping ALL rows from data1 (how='left')
-    # This adds columns from data2 to data1 where 'Company Name' matches.
-    merged_sheet1 = df1.merge(
-        df2, 
-        on=MATCH_COLUMN, 
-        how='left', 
+    # 1. Find the best data2 match for every data1 company (exact or fuzzy)
+    # and join on it, keeping ALL rows from data1.
+    matches = company_matching.fuzzy_match(df1[MATCH_COLUMN], df2[MATCH_COLUMN], MATCH_THRESHOLD)
+    right = df2.reset_index(drop=True).rename(columns={MATCH_COLUMN: 'Matched ' + MATCH_COLUMN})
+    left = df1.reset_index(drop=True).assign(_right_position=matches['right_position'].values)
+    merged_sheet1 = left.merge(
+        right,
+        left_on='_right_position',
+        right_index=True,
+        how='left',
         suffixes=('_data1', '_data2') # This renames 'Rank' to 'Rank_data1' and 'Rank_data2'
-    )
+    ).drop(columns='_right_position')
+    merged_sheet1['Match Score'] = matches['score'].values
+    print(f"Matched {int(matches['right_position'].notna().sum())} of {len(df1)} companies "
+          f"({int((matches['score'] == 1.0).sum())} exact after normalization).")
     
     # 2. Find additional companies (in data2 but NOT in data1)
     print("Finding additional companies from 'data2'...")
     
-    # We find which data2 companies are NOT in the data1 list.
-    additional_companies = df2[~df2[MATCH_COLUMN].isin(df1[MATCH_COLUMN])]
+    # We find which data2 companies were not matched by any data1 company.
+    matched_positions = set(matches['right_position'].dropna().astype(int))
+    additional_companies = df2[[position not in matched_positions for position in range(len(df2))]]
 
     # 3. Write both DataFrames to a new Excel file
-    print(f"Writing results to '{OUTPUT_FILE}'...")
+    print(f"Writing results to '{output_file}'...")
     try:
-        with pd.ExcelWriter(OUTPUT_FILE, engine='openpyxl') as writer:
+        with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
             # Write the main merged data
             merged_sheet1.to_excel(writer, sheet_name='Sheet1_Combined', index=False)
             
             # Write the additional companies to a new sheet
             additional_companies.to_excel(writer, sheet_name='Additional_Companies', index=False)
         
-        print(f"\n✅ Success! Data combined and saved to '{OUTPUT_FILE}'.")
+        print(f"\n✅ Success! Data combined and saved to '{output_file}'.")
         print("\nWhat this script did:")
-        print(f"- 'Sheet1_Combined': Contains all companies from '{FILE_DATA1}'.")
-        print("  - Where a match was found, 'Rank_data2' has the new rank.")
+        print(f"- 'Sheet1_Combined': Contains all companies from '{file_data1}'.")
+        print("  - Where a match was found, 'Rank_data2' has the new rank and 'Match Score' how close the names were.")
         print("  - Where no match was found, 'Rank_data2' will be blank (NaN).")
-        print(f"- 'Additional_Companies': Contains all companies from '{FILE_DATA2}' that were NOT in '{FILE_DATA1}'.")
+        print(f"- 'Additional_Companies': Contains all companies from '{file_data2}' that were NOT in '{file_data1}'.")
         
     except Exception as e:
         print(f"Error writing Excel file: {e}")
@@ -0,0 +1,252 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+import pandas as pd
+
+import company_matching
+
+MATCH_COLUMN = 'Company Name'
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _clean_records(df):
+    # NaN / numpy scalars -> JSON-friendly Python values
+    df = df.astype(object).where(df.notna(), None)
+    return df.to_dict('records')
+
+
+class CompanyMaster:
+    """
+    Master table of companies built from any number of source files.
+
+    Everything lives in one SQLite file: the companies, each source's rows
+    (with their own columns, e.g. that list's Rank) and the content hash of
+    every source. update_source() skips files whose hash hasn't changed, and
+    matching a new file only touches the indexed rows its names need, so
+    adding one file costs time proportional to that file, not the master.
+
+    Args:
+        path (str): Path of the master database.
+        threshold (float): Minimum fuzzy score to reuse an existing company.
+    """
+
+    def __init__(self, path, threshold=company_matching.DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sources (
+                source_id TEXT PRIMARY KEY,
+                label TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                row_count INTEGER,
+                updated_at REAL
+            );
+            CREATE TABLE IF NOT EXISTS companies (
+                company_id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                key TEXT NOT NULL UNIQUE
+            );
+            CREATE TABLE IF NOT EXISTS source_rows (
+                source_id TEXT NOT NULL,
+                company_id INTEGER NOT NULL,
+                source_name TEXT,
+                match_score REAL,
+                data TEXT,
+                PRIMARY KEY (source_id, company_id)
+            );
+            CREATE TABLE IF NOT EXISTS company_tokens (
+                token TEXT NOT NULL,
+                company_id INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_company_tokens ON company_tokens (token);
+            CREATE TABLE IF NOT EXISTS company_grams (
+                gram TEXT NOT NULL,
+                company_id INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_company_grams ON company_grams (gram);
+            CREATE TABLE IF NOT EXISTS gram_counts (
+                gram TEXT PRIMARY KEY,
+                n INTEGER NOT NULL
+            );
+        """)
+        self.conn.commit()
+
+    # --- Matching ---
+
+    def _candidates(self, grams, tokens):
+        counts = {}
+        token_list = list(tokens)
+        rows = self.conn.execute(
+            f"SELECT token, company_id FROM company_tokens WHERE token IN ({','.join('?' * len(token_list))})",
+            token_list
+        ).fetchall()
+        postings = {}
+        for token, company_id in rows:
+            postings.setdefault(token, []).append(company_id)
+        for ids in postings.values():
+            if len(ids) <= company_matching.MAX_TOKEN_POSTINGS:
+                for company_id in ids:
+                    counts[company_id] = counts.get(company_id, 0) + 1
+
+        # Rarest trigrams only, same as CompanyIndex
+        gram_list = list(grams)
+        rare = [gram for (gram,) in self.conn.execute(
+            f"SELECT gram FROM gram_counts WHERE gram IN ({','.join('?' * len(gram_list))}) ORDER BY n LIMIT ?",
+            gram_list + [company_matching.CANDIDATE_TRIGRAMS]
+        )]
+        if rare:
+            for (company_id,) in self.conn.execute(
+                f"SELECT company_id FROM company_grams WHERE gram IN ({','.join('?' * len(rare))})", rare
+            ):
+                counts[company_id] = counts.get(company_id, 0) + 1
+
+        ranked = sorted(counts.items(), key=lambda item: -item[1])[:company_matching.MAX_CANDIDATES]
+        return [company_id for company_id, shared in ranked if shared >= company_matching.MIN_SHARED]
+
+    def _match(self, key):
+        """Returns (company_id, score) of the best existing company, or (None, 0.0)."""
+        row = self.conn.execute("SELECT company_id FROM companies WHERE key = ?", (key,)).fetchone()
+        if row:
+            return row[0], 1.0
+
+        tokens = company_matching.name_tokens(key)
+        grams = company_matching.name_trigrams(key)
+        candidates = self._candidates(grams, tokens)
+        if not candidates:
+            return None, 0.0
+        keys = self.conn.execute(
+            f"SELECT company_id, key FROM companies WHERE company_id IN ({','.join('?' * len(candidates))})",
+            candidates
+        ).fetchall()
+        best_id, best_score = None, 0.0
+        for company_id, other_key in keys:
+            score = company_matching.similarity(key, other_key, tokens, grams_a=grams)
+            if score > best_score:
+                best_id, best_score = company_id, score
+        if best_score < self.threshold:
+            return None, 0.0
+        return best_id, best_score
+
+    def _add_company(self, name, key):
+        cursor = self.conn.execute("INSERT INTO companies (name, key) VALUES (?, ?)", (name, key))
+        company_id = cursor.lastrowid
+        self.conn.executemany("INSERT INTO company_tokens VALUES (?, ?)",
+                              [(token, company_id) for token in company_matching.name_tokens(key)])
+        grams = company_matching.name_trigrams(key)
+        self.conn.executemany("INSERT INTO company_grams VALUES (?, ?)", [(gram, company_id) for gram in grams])
+        self.conn.executemany(
+            "INSERT INTO gram_counts VALUES (?, 1) ON CONFLICT(gram) DO UPDATE SET n = n + 1",
+            [(gram,) for gram in grams]
+        )
+        return company_id
+
+    # --- Sources ---
+
+    def update_source(self, path, label=None):
+        """
+        Adds or refreshes one source file.
+
+        Args:
+            path (str): Excel file with a 'Company Name' column.
+            label (str or None): Name used in the per-source column headers
+                (defaults to the file name without extension).
+
+        Returns:
+            str: 'unchanged', 'added', 'updated' or 'error'.
+        """
+        source_id = os.path.abspath(path)
+        label = label or os.path.splitext(os.path.basename(path))[0]
+        try:
+            content_hash = file_hash(path)
+        except OSError as e:
+            print(f"Error: Could not read '{path}': {e}")
+            return 'error'
+
+        known = self.conn.execute(
+            "SELECT content_hash FROM sources WHERE source_id = ?", (source_id,)
+        ).fetchone()
+        if known and known[0] == content_hash:
+            return 'unchanged'
+
+        try:
+            df = pd.read_excel(path, sheet_name=0)
+        except Exception as e:
+            print(f"Error reading '{path}': {e}")
+            return 'error'
+        if MATCH_COLUMN not in df.columns:
+            print(f"Error: The match column '{MATCH_COLUMN}' was not found in '{path}'.")
+            return 'error'
+
+        df[MATCH_COLUMN] = df[MATCH_COLUMN].astype(str).str.strip()
+        rows = []
+        seen = set()
+        with self.conn:
+            # A changed file replaces everything it contributed before
+            self.conn.execute("DELETE FROM source_rows WHERE source_id = ?", (source_id,))
+            for record in _clean_records(df):
+                name = record.pop(MATCH_COLUMN)
+                key = company_matching.normalize_name(name)
+                if not key:
+                    continue
+                company_id, score = self._match(key)
+                if company_id is None:
+                    company_id, score = self._add_company(name, key), 1.0
+                if company_id in seen:
+                    continue  # keep the first row for a company within one file
+                seen.add(company_id)
+                rows.append((source_id, company_id, name, round(score, 3), json.dumps(record, default=str)))
+            self.conn.executemany("INSERT INTO source_rows VALUES (?, ?, ?, ?, ?)", rows)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?, ?)",
+                (source_id, label, content_hash, len(rows), time.time())
+            )
+        return 'updated' if known else 'added'
+
+    def update_sources(self, paths):
+        """
+        Runs update_source for every path.
+
+        Returns:
+            dict: {path: status}
+        """
+        statuses = {}
+        for path in paths:
+            statuses[path] = self.update_source(path)
+            print(f"  [{statuses[path].upper()}] {path}")
+        return statuses
+
+    def to_dataframe(self):
+        """
+        Builds the wide master table: one row per company with at least one
+        source, and '<column> (<source label>)' columns for every source.
+        """
+        rows = self.conn.execute("""
+            SELECT c.company_id, c.name, s.label, r.source_name, r.match_score, r.data
+            FROM source_rows r
+            JOIN companies c ON c.company_id = r.company_id
+            JOIN sources s ON s.source_id = r.source_id
+            ORDER BY c.company_id
+        """).fetchall()
+
+        table = {}
+        for company_id, name, label, source_name, score, data in rows:
+            entry = table.setdefault(company_id, {MATCH_COLUMN: name, 'Sources': 0})
+            entry['Sources'] += 1
+            entry[f"Name ({label})"] = source_name
+            entry[f"Match Score ({label})"] = score
+            for column, value in json.loads(data).items():
+                entry[f"{column} ({label})"] = value
+        return pd.DataFrame(list(table.values()))
+
+    def close(self):
+        self.conn.close()
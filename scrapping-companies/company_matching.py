@@ -0,0 +1,166 @@
+import re
+import unicodedata
+from collections import Counter, defaultdict
+
+import pandas as pd
+
+# Trailing words that don't change which company it is
+LEGAL_SUFFIXES = {
+    'inc', 'incorporated', 'llc', 'llp', 'lp', 'ltd', 'limited', 'corp',
+    'corporation', 'co', 'company', 'plc', 'gmbh', 'ag', 'sa', 'nv', 'bv',
+    'pte', 'pty', 'srl', 'spa', 'holdings', 'group'
+}
+STOP_WORDS = {'the', 'and', 'of'}
+
+DEFAULT_THRESHOLD = 0.85
+# Only the rarest few trigrams of a name are used to find candidates, so a
+# common trigram like 'ing' never drags in half the other list
+CANDIDATE_TRIGRAMS = 6
+MAX_CANDIDATES = 20
+# A real match shares several rare words/trigrams; one shared trigram is noise
+MIN_SHARED = 2
+# Words on more names than this (e.g. 'technologies') are too common to block on
+MAX_TOKEN_POSTINGS = 400
+
+
+def normalize_name(name):
+    """
+    Canonical key for a company name: lower case, no accents or punctuation,
+    '&' -> 'and', legal suffixes dropped ("Google LLC" -> "google").
+    """
+    if name is None or (isinstance(name, float) and pd.isna(name)):
+        return ''
+    text = unicodedata.normalize('NFKD', str(name))
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+    text = text.replace('&', ' and ')
+    tokens = re.sub(r'[^\w\s]', ' ', text).split()
+    # Re-join dotted abbreviations split up above: "s a" (from "S.A.") -> "sa"
+    # ("J.P. Morgan" -> "jp morgan"). 'single' tracks whether the last token
+    # was built only from one-letter pieces.
+    merged = []
+    single = False
+    for token in tokens:
+        if len(token) == 1 and single:
+            merged[-1] += token
+        else:
+            merged.append(token)
+            single = len(token) == 1
+    tokens = merged
+    # Only strip suffixes from the end ("& Co." too), and never strip the whole name
+    while len(tokens) > 1 and (tokens[-1] in LEGAL_SUFFIXES or tokens[-1] == 'and'):
+        tokens.pop()
+    return ' '.join(tokens)
+
+
+def name_tokens(key):
+    words = set(key.split()) - STOP_WORDS
+    return words or set(key.split())
+
+
+def name_trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(key_a, key_b, tokens_a=None, tokens_b=None, grams_a=None, grams_b=None):
+    """
+    Scores two normalized names from 0 to 1.
+
+    The score is the better of the character-trigram Dice coefficient (catches
+    typos) and the share of the shorter name's words found in the longer one,
+    slightly discounted, so "jane street" vs "jane street capital" still
+    scores high. Word containment only counts when at least two words are
+    shared, so a one-word name isn't matched to every longer name holding it.
+    """
+    if key_a == key_b:
+        return 1.0
+    tokens_a = tokens_a if tokens_a is not None else name_tokens(key_a)
+    tokens_b = tokens_b if tokens_b is not None else name_tokens(key_b)
+    grams_a = grams_a if grams_a is not None else name_trigrams(key_a)
+    grams_b = grams_b if grams_b is not None else name_trigrams(key_b)
+    containment = 0.0
+    shared = len(tokens_a & tokens_b)
+    # One shared word proves nothing: "capital" is in "capital one" but isn't it
+    if shared >= 2:
+        containment = shared / min(len(tokens_a), len(tokens_b))
+    dice = 2 * len(grams_a & grams_b) / (len(grams_a) + len(grams_b))
+    return max(dice, 0.95 * containment)
+
+
+class CompanyIndex:
+    """
+    Blocking index over one list of company names.
+
+    Candidates for a lookup come from exact key matches, shared words and the
+    rarest shared trigrams, so each lookup only scores a handful of names
+    instead of the whole list.
+    """
+
+    def __init__(self, names):
+        self.keys = [normalize_name(name) for name in names]
+        self.token_sets = [name_tokens(key) for key in self.keys]
+        self.gram_sets = [name_trigrams(key) for key in self.keys]
+        self.by_key = defaultdict(list)
+        self.by_token = defaultdict(list)
+        self.by_trigram = defaultdict(list)
+        for position, key in enumerate(self.keys):
+            if not key:
+                continue
+            self.by_key[key].append(position)
+            for token in self.token_sets[position]:
+                self.by_token[token].append(position)
+            for gram in self.gram_sets[position]:
+                self.by_trigram[gram].append(position)
+
+    def _candidates(self, grams, tokens):
+        counts = Counter()
+        # Shared words, rarest first
+        for token in sorted(tokens, key=lambda t: len(self.by_token.get(t, ()))):
+            postings = self.by_token.get(token)
+            if postings and len(postings) <= MAX_TOKEN_POSTINGS:
+                counts.update(postings)
+        # Shared rare trigrams catch typos and run-together words
+        grams = sorted((g for g in grams if g in self.by_trigram),
+                       key=lambda g: len(self.by_trigram[g]))
+        for gram in grams[:CANDIDATE_TRIGRAMS]:
+            counts.update(self.by_trigram[gram])
+        return [position for position, shared in counts.most_common(MAX_CANDIDATES) if shared >= MIN_SHARED]
+
+    def best_match(self, name, threshold=DEFAULT_THRESHOLD):
+        """
+        Returns (position, score) of the best match for 'name', or (None, 0.0).
+        """
+        key = normalize_name(name)
+        if not key:
+            return None, 0.0
+        exact = self.by_key.get(key)
+        if exact:
+            return exact[0], 1.0
+
+        tokens = name_tokens(key)
+        grams = name_trigrams(key)
+        best_position, best_score = None, 0.0
+        for position in self._candidates(grams, tokens):
+            score = similarity(key, self.keys[position], tokens, self.token_sets[position],
+                               grams, self.gram_sets[position])
+            if score > best_score:
+                best_position, best_score = position, score
+        if best_score < threshold:
+            return None, 0.0
+        return best_position, best_score
+
+
+def fuzzy_match(left_names, right_names, threshold=DEFAULT_THRESHOLD):
+    """
+    Finds the best match in 'right_names' for every name in 'left_names'.
+
+    Returns:
+        pd.DataFrame: One row per left name (same order) with columns
+        'right_position' (nullable int) and 'score' (0 when unmatched).
+    """
+    index = CompanyIndex(right_names)
+    matches = [index.best_match(name, threshold) for name in left_names]
+    return pd.DataFrame({
+        'right_position': pd.array([position for position, _ in matches], dtype='Int64'),
+        'score': [round(score, 3) for _, score in matches],
+    })
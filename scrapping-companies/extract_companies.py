@@ -1,64 +1,75 @@
 import pandas as pd
-from bs4 import BeautifulSoup
+
+import extraction_cache
+import html_stream
 
 # --- Configuration ---
 HTML_FILE_TO_READ = 'index.html'
 OUTPUT_EXCEL_FILE = 'extracted_companies.xlsx'
 COLUMN_NAME = 'Company Name'
+CACHE_FILE = extraction_cache.CACHE_FILE
 # ---------------------
 
 def extract_company_names(html_content):
     """
     Parses the HTML and extracts company names based on the h2 tag.
     """
-    # Initialize BeautifulSoup
-    soup = BeautifulSoup(html_content, 'html.parser')
-    
-    # Find all <h2> tags that match the specific attribute
-    company_tags = soup.find_all(
-        'h2', 
-        attrs={'data-dd-action-name': 'Exhibitor name'}
-    )
-    
-    # Extract the text from each tag and clean it
-    company_names = [tag.get_text().strip() for tag in company_tags]
-    
-    return company_names
+    records = html_stream.parse_string(html_content, html_stream.ExhibitorNameParser)
+    return [record['Company Name'] for record in records]
+
+def iter_company_names(file_path):
+    """
+    Streams the HTML file and yields each company name as its
+    <h2 data-dd-action-name="Exhibitor name"> closes, without loading the whole page.
+    """
+    for record in html_stream.iter_records(file_path, html_stream.ExhibitorNameParser):
+        yield record['Company Name']
 
 def main():
     """
     Main function to read the HTML, extract data, and save to Excel.
     """
     print(f"Reading HTML file: '{HTML_FILE_TO_READ}'...")
+    cache = extraction_cache.ExtractionCache(CACHE_FILE)
     try:
-        # Read the content of the local HTML file
-        with open(HTML_FILE_TO_READ, 'r', encoding='utf-8') as f:
-            html_content = f.read()
+        # Only parse the page if its content changed since the last run
+        records, digest, cached = extraction_cache.cached_records(HTML_FILE_TO_READ, html_stream.ExhibitorNameParser, cache)
+        company_names = [record['Company Name'] for record in records]
     except FileNotFoundError:
         print(f"Error: The file '{HTML_FILE_TO_READ}' was not found.")
         print("Please make sure the HTML file is in the same directory.")
+        cache.close()
         return
     except Exception as e:
         print(f"An error occurred while reading the file: {e}")
+        cache.close()
         return
 
-    # Extract the data
-    company_names = extract_company_names(html_content)
-
     if not company_names:
         print("No company names were found. The output file will be empty.")
     else:
         print(f"Successfully found {len(company_names)} companies.")
 
+    if cached:
+        print("Page unchanged since the last run, reused its cached extraction.")
+    fingerprint = extraction_cache.inputs_fingerprint([digest, extraction_cache.extractor_version(html_stream.ExhibitorNameParser), COLUMN_NAME])
+    if cache.output_is_current(OUTPUT_EXCEL_FILE, fingerprint):
+        print(f"✅ '{OUTPUT_EXCEL_FILE}' is already up to date.")
+        cache.close()
+        return
+
     # Create a pandas DataFrame
     df = pd.DataFrame(company_names, columns=[COLUMN_NAME])
 
     # Save the DataFrame to an Excel file
     try:
         df.to_excel(OUTPUT_EXCEL_FILE, index=False)
+        cache.mark_output(OUTPUT_EXCEL_FILE, fingerprint)
         print(f"✅ Success! Data saved to '{OUTPUT_EXCEL_FILE}'.")
     except Exception as e:
         print(f"An error occurred while saving the Excel file: {e}")
+    finally:
+        cache.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
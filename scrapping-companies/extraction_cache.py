@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+import html_stream
+
+# --- Configuration ---
+CACHE_FILE = 'extraction_cache.sqlite3'
+HASH_CHUNK_SIZE = 1024 * 1024
+# ---------------------
+
+
+def content_hash(file_path, chunk_size=HASH_CHUNK_SIZE):
+    """
+    SHA-256 of a page's bytes. Hashing is far cheaper than parsing, so an
+    unchanged page costs one read instead of a full parse.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def extractor_version(parser_class):
+    """The cache version of one parser class (see _RecordParser.VERSION)."""
+    return f"{parser_class.__name__}:{parser_class.VERSION}"
+
+
+def inputs_fingerprint(inputs):
+    """Hashes a JSON-serializable description of what an output file was built from."""
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class ExtractionCache:
+    """
+    Persistent extraction results keyed by (page content hash, extractor,
+    extractor version), so reruns only parse pages that changed.
+
+    It also remembers what each output file was written from, so an output
+    whose inputs haven't changed (and that nobody touched since) isn't
+    rewritten. Only used from the main process.
+    """
+
+    def __init__(self, path=CACHE_FILE):
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS extractions (
+                content_hash TEXT NOT NULL,
+                extractor TEXT NOT NULL,
+                version TEXT NOT NULL,
+                chosen TEXT,
+                records TEXT NOT NULL,
+                extracted_at REAL,
+                PRIMARY KEY (content_hash, extractor, version)
+            );
+            CREATE TABLE IF NOT EXISTS outputs (
+                path TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                mtime_ns INTEGER,
+                size INTEGER
+            );
+        """)
+        self.conn.commit()
+
+    def get(self, content_hash, extractor, version):
+        """
+        Returns (extractor used, records) for a page parsed before, or None.
+        'extractor' may be 'auto', in which case the one detected is returned.
+        """
+        row = self.conn.execute(
+            "SELECT chosen, records FROM extractions "
+            "WHERE content_hash = ? AND extractor = ? AND version = ?",
+            (content_hash, extractor, version)
+        ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def put(self, content_hash, extractor, version, chosen, records):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO extractions VALUES (?, ?, ?, ?, ?, ?)",
+            (content_hash, extractor, version, chosen, json.dumps(records), time.time())
+        )
+        self.conn.commit()
+
+    def output_is_current(self, output_path, fingerprint):
+        """
+        True if 'output_path' was last written from the same inputs and is
+        still exactly the file that was written then.
+        """
+        row = self.conn.execute(
+            "SELECT fingerprint, mtime_ns, size FROM outputs WHERE path = ?",
+            (os.path.abspath(output_path),)
+        ).fetchone()
+        if row is None or row[0] != fingerprint:
+            return False
+        try:
+            stat = os.stat(output_path)
+        except OSError:
+            return False
+        return (stat.st_mtime_ns, stat.st_size) == (row[1], row[2])
+
+    def mark_output(self, output_path, fingerprint):
+        """Records what 'output_path' was just written from."""
+        stat = os.stat(output_path)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO outputs VALUES (?, ?, ?, ?)",
+            (os.path.abspath(output_path), fingerprint, stat.st_mtime_ns, stat.st_size)
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+def cached_records(file_path, parser_class, cache):
+    """
+    Returns (records, content hash, whether they came from the cache) for one
+    local page, streaming it through 'parser_class' only on a cache miss.
+    """
+    digest = content_hash(file_path)
+    name = parser_class.__name__
+    version = extractor_version(parser_class)
+    hit = cache.get(digest, name, version)
+    if hit is not None:
+        return hit[1], digest, True
+    records = list(html_stream.iter_records(file_path, parser_class))
+    cache.put(digest, name, version, name, records)
+    return records, digest, False
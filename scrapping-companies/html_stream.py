@@ -0,0 +1,184 @@
+from html.parser import HTMLParser
+
+# Tags that never have a closing tag, so they must not be pushed on the stack
+VOID_TAGS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+    'link', 'meta', 'param', 'source', 'track', 'wbr'
+}
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _classes(attrs):
+    for key, value in attrs:
+        if key == 'class' and value:
+            return value.split()
+    return []
+
+
+class _RecordParser(HTMLParser):
+    """
+    Base class for the streaming extractors.
+    Subclasses append finished records to self.records as their element closes;
+    iter_records() drains them after every chunk, so memory stays bounded by
+    the size of one record rather than the whole page.
+
+    Bump a subclass's VERSION whenever its output changes, so records cached
+    by extraction_cache.py are parsed again.
+    """
+
+    VERSION = 1
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.records = []
+
+    def pop_records(self):
+        records, self.records = self.records, []
+        return records
+
+
+class ExhibitorNameParser(_RecordParser):
+    """
+    Emits one {'Company Name': ...} record per
+    <h2 data-dd-action-name="Exhibitor name"> element.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._text = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'h2' and ('data-dd-action-name', 'Exhibitor name') in attrs:
+            self._text = []
+
+    def handle_data(self, data):
+        if self._text is not None:
+            self._text.append(data)
+
+    def handle_endtag(self, tag):
+        if tag == 'h2' and self._text is not None:
+            self.records.append({'Company Name': ''.join(self._text).strip()})
+            self._text = None
+
+
+class RankedCompanyParser(_RecordParser):
+    """
+    Emits one {'Rank', 'Company Name', 'Website'} record per <tr class="company">.
+
+    Rank comes from <td class="rank"><div class="first-line">, the name and
+    website from the first <a> inside <td class="name">.
+    """
+
+    # 2: rows and cells left unclosed are ended by the next one
+    VERSION = 2
+
+    def __init__(self):
+        super().__init__()
+        self._row = None    # state of the <tr class="company"> being read
+        self._stack = []    # (tag, classes) of open elements inside that row
+
+    def _inside(self, tag, css_class):
+        return any(t == tag and css_class in c for t, c in self._stack)
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'tr' and self._row is not None:
+            # Scraped pages often leave </tr> out: a new row ends the open one
+            self._finish_row()
+        if self._row is None:
+            if tag == 'tr' and 'company' in _classes(attrs):
+                self._row = {'rank': None, 'name': None, 'href': None}
+                self._stack = []
+            return
+
+        if tag == 'td' and any(t == 'td' for t, _ in self._stack):
+            # Same for a missing </td>: the next cell closes it
+            self._close('td')
+
+        classes = _classes(attrs)
+        if tag not in VOID_TAGS:
+            self._stack.append((tag, classes))
+
+        if tag == 'div' and 'first-line' in classes and self._inside('td', 'rank') and self._row['rank'] is None:
+            self._row['rank'] = []
+        elif tag == 'a' and self._inside('td', 'name') and self._row['name'] is None:
+            self._row['name'] = []
+            self._row['href'] = dict(attrs).get('href')
+
+    def handle_data(self, data):
+        if self._row is None:
+            return
+        # get_text(strip=True) semantics: strip each piece, then join
+        piece = data.strip()
+        if not piece:
+            return
+        # 'rank' / 'name' are lists only while their element is still open
+        if isinstance(self._row['rank'], list):
+            self._row['rank'].append(piece)
+        if isinstance(self._row['name'], list):
+            self._row['name'].append(piece)
+
+    def handle_endtag(self, tag):
+        if self._row is None:
+            return
+        if tag == 'tr':
+            self._finish_row()
+            return
+        self._close(tag)
+
+    def _close(self, tag):
+        # Pop up to and including the matching open tag (tolerates sloppy HTML),
+        # finishing the rank / name of any element closed along the way
+        for i in range(len(self._stack) - 1, -1, -1):
+            if self._stack[i][0] == tag:
+                closed = self._stack[i:]
+                del self._stack[i:]
+                break
+        else:
+            return
+
+        for closed_tag, classes in closed:
+            if closed_tag == 'div' and 'first-line' in classes and isinstance(self._row['rank'], list):
+                self._row['rank'] = ''.join(self._row['rank'])
+            elif closed_tag == 'a' and isinstance(self._row['name'], list):
+                self._row['name'] = ''.join(self._row['name'])
+
+    def _finish_row(self):
+        row = self._row
+        self._row = None
+        self._stack = []
+        name = ''.join(row['name']) if isinstance(row['name'], list) else row['name']
+        rank = ''.join(row['rank']) if isinstance(row['rank'], list) else row['rank']
+        # Only add if we found a valid company name (avoid empty rows)
+        if name:
+            self.records.append({
+                'Rank': rank or "N/A",
+                'Company Name': name,
+                'Website': row['href']
+            })
+
+
+def iter_records(file_path, parser_class, chunk_size=CHUNK_SIZE):
+    """
+    Streams an HTML file through 'parser_class' and yields records as their elements close.
+
+    Args:
+        file_path (str): Path of the saved page.
+        parser_class: ExhibitorNameParser or RankedCompanyParser.
+        chunk_size (int): Characters read per step.
+    """
+    parser = parser_class()
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for chunk in iter(lambda: f.read(chunk_size), ''):
+            parser.feed(chunk)
+            yield from parser.pop_records()
+    parser.close()
+    yield from parser.pop_records()
+
+
+def parse_string(html_content, parser_class):
+    """Runs 'parser_class' over an HTML string and returns all records."""
+    parser = parser_class()
+    parser.feed(html_content)
+    parser.close()
+    return parser.pop_records()
@@ -1,23 +1,127 @@
-import pandas as pd
-from google import genai
+import argparse
+import json
+import os
+import re
+import sqlite3
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
 # --- Configuration ---
 # It's recommended to use an environment variable for security.
-API_KEY = "API KEYS" 
+API_KEY = os.environ.get('GEMINI_API_KEY', "API KEYS")
 INPUT_FILE = './extracted_companies.xlsx'
 OUTPUT_FILE = 'company_ratings.xlsx'
 COMPANY_COLUMN_NAME = 'Company Name'
 
+MODEL_NAME = "gemini-2.5-flash"
+# Bump this whenever the prompt changes so old cached ratings aren't reused
+# (2: batched JSON prompt)
+PROMPT_VERSION = 2
+CACHE_FILE = 'company_ratings_cache.sqlite3'
+MAX_CONCURRENT_REQUESTS = 8
+REQUESTS_PER_MINUTE = 60
+# Companies rated per request (1 = one request per company, the old behaviour)
+BATCH_SIZE = 20
+# A batch request that fails outright (quota, 429, network) is retried this
+# many times in all, waiting BATCH_RETRY_SECONDS, then twice that, ...
+BATCH_ATTEMPTS = 3
+BATCH_RETRY_SECONDS = 10
+
 # --- Setup Gemini API ---
-try:
-    client = genai.Client(api_key=API_KEY)
-    print("Successfully configured Gemini API.")
-except Exception as e:
-    print(f"Error configuring Gemini API: {e}")
-    exit()
+def create_client(api_key=API_KEY):
+    """
+    Creates the Gemini client, or returns None if it can't be configured.
+    """
+    try:
+        from google import genai
+        client = genai.Client(api_key=api_key)
+        print("Successfully configured Gemini API.")
+        return client
+    except Exception as e:
+        print(f"Error configuring Gemini API: {e}")
+        return None
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: allows short bursts of up to 'capacity'
+    requests while holding the average at 'rate_per_minute'.
+    """
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or max(1, min(rate_per_minute, MAX_CONCURRENT_REQUESTS))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+class RatingCache:
+    """
+    Persistent ratings keyed by (company, prompt version, model), so reruns
+    only call the API for companies that haven't been rated yet.
+    Only used from the main thread.
+    """
+
+    def __init__(self, path, prompt_version=PROMPT_VERSION, model=MODEL_NAME):
+        self.prompt_version = prompt_version
+        self.model = model
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS ratings (
+                company TEXT NOT NULL,
+                prompt_version INTEGER NOT NULL,
+                model TEXT NOT NULL,
+                rating TEXT,
+                explanation TEXT,
+                rated_at REAL,
+                PRIMARY KEY (company, prompt_version, model)
+            )
+        """)
+        self.conn.commit()
+
+    def get_many(self, companies):
+        """Returns {company: (rating, explanation)} for the companies already cached."""
+        found = {}
+        companies = list(companies)
+        # Stay under SQLite's bound-parameter limit
+        for start in range(0, len(companies), 500):
+            batch = companies[start:start + 500]
+            placeholders = ','.join('?' * len(batch))
+            rows = self.conn.execute(
+                f"SELECT company, rating, explanation FROM ratings "
+                f"WHERE prompt_version = ? AND model = ? AND company IN ({placeholders})",
+                [self.prompt_version, self.model] + batch
+            )
+            for company, rating, explanation in rows:
+                found[company] = (rating, explanation)
+        return found
+
+    def put(self, company, rating, explanation):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO ratings VALUES (?, ?, ?, ?, ?, ?)",
+            (company, self.prompt_version, self.model, rating, explanation, time.time())
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
 
 # --- Main Application Logic ---
-def get_company_rating(company_name):
+def get_company_rating(company_name, client, model=MODEL_NAME):
     """
     Asks Gemini to rate a single company and returns the response.
     """
@@ -27,9 +131,9 @@ def get_company_rating(company_name):
         "Respond with only the rating and a brief, one-sentence explanation. "
         "Your entire response must always be in the format: Rating: [number]/10. Explanation: [text with only one sentence]."
     )
-    
+
     try:
-        response = client.models.generate_content(model="gemini-2.5-flash", contents=prompt)
+        response = client.models.generate_content(model=model, contents=prompt)
         # Simple parsing based on the requested format
         parts = response.text.split('. Explanation: ')
         rating = parts[0].replace('Rating: ', '').strip()
@@ -39,43 +143,200 @@ def get_company_rating(company_name):
         print(f"  - Could not get rating for {company_name}. Error: {e}")
         return "Error", str(e)
 
-def main():
+def _strip_code_fence(text):
+    # Models often wrap JSON in ```json ... ``` even when asked not to
+    match = re.fullmatch(r'\s*```(?:json)?\s*(.*?)\s*```\s*', text, re.DOTALL)
+    return match.group(1) if match else text.strip()
+
+def parse_batch_response(text, companies):
+    """
+    Strictly parses a batch reply.
+
+    Args:
+        text (str): The model's reply, expected to be a JSON array of
+            {"company": str, "rating": int 1-10, "explanation": str} objects.
+        companies (list): The companies that were asked about.
+
+    Returns:
+        dict: {company: (rating, explanation)} for every well-formed item.
+        Companies that are missing, duplicated or malformed are left out.
+    """
+    try:
+        items = json.loads(_strip_code_fence(text))
+    except (TypeError, ValueError):
+        return {}
+    if not isinstance(items, list):
+        return {}
+
+    wanted = set(companies)
+    parsed = {}
+    seen = set()
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        company = item.get('company')
+        rating = item.get('rating')
+        explanation = item.get('explanation')
+        if company not in wanted:
+            continue
+        if company in seen:
+            # Two different answers for one company: trust neither
+            parsed.pop(company, None)
+            continue
+        seen.add(company)
+        if isinstance(rating, bool) or not isinstance(rating, int) or not 1 <= rating <= 10:
+            continue
+        if not isinstance(explanation, str) or not explanation.strip():
+            continue
+        # Same shape as get_company_rating's result
+        parsed[company] = (f"{rating}/10", explanation.strip())
+    return parsed
+
+def get_company_ratings_batch(companies, client, model=MODEL_NAME):
+    """
+    Asks Gemini to rate several companies in one request.
+
+    Returns:
+        dict or None: {company: (rating, explanation)} for the items that
+        parsed cleanly, or None if the request itself failed.
+    """
+    try:
+        # Built in here so one odd name fails this batch, not the whole run
+        prompt = (
+            "Rate each of the following companies for a software engineering career on a scale of 1 to 10. "
+            "Respond with only a JSON array containing one object per company, in the same order, "
+            'each with exactly these keys: "company" (the name exactly as given), '
+            '"rating" (an integer from 1 to 10) and "explanation" (one sentence).\n'
+            f"Companies: {json.dumps([str(company) for company in companies])}"
+        )
+        response = client.models.generate_content(
+            model=model,
+            contents=prompt,
+            config={'response_mime_type': 'application/json'}
+        )
+        return parse_batch_response(response.text, companies)
+    except Exception as e:
+        print(f"  - Batch request for {len(companies)} companies failed. Error: {e}")
+        return None
+
+def rate_companies(companies, client, cache=None, max_workers=MAX_CONCURRENT_REQUESTS, bucket=None, model=MODEL_NAME,
+                   batch_size=BATCH_SIZE, batch_attempts=BATCH_ATTEMPTS, retry_seconds=BATCH_RETRY_SECONDS):
+    """
+    Rates companies concurrently, skipping any that are already cached.
+
+    Args:
+        companies (list): Company names.
+        client: A genai.Client (or anything with .models.generate_content).
+        cache (RatingCache or None): Where to look up and store ratings.
+        max_workers (int): Max requests in flight at once.
+        bucket (TokenBucket or None): Rate limit shared by all requests.
+        batch_size (int): Companies per request. Items missing or malformed in
+            a batch reply are retried one company at a time.
+        batch_attempts (int): Tries for a batch request that fails outright;
+            after the last one its companies are marked "Error".
+        retry_seconds (float): Wait before the first retry, doubled each time.
+
+    Returns:
+        dict: {company: (rating, explanation)}
+    """
+    results = cache.get_many(companies) if cache else {}
+    todo = [company for company in companies if company not in results]
+    print(f"{len(results)} companies found in the cache, {len(todo)} to rate.")
+    if not todo:
+        return results
+
+    bucket = bucket or TokenBucket(REQUESTS_PER_MINUTE)
+
+    def rate(batch):
+        rated = {}
+        if len(batch) > 1:
+            for attempt in range(1, batch_attempts + 1):
+                bucket.acquire()
+                rated = get_company_ratings_batch(batch, client, model)
+                if rated is not None:
+                    break
+                if attempt < batch_attempts:
+                    time.sleep(retry_seconds * 2 ** (attempt - 1))
+            if rated is None:
+                # One request per company would only hit the same quota or outage harder
+                return {company: ("Error", f"Batch request failed {batch_attempts} times.") for company in batch}
+        # Fall back to one request per company for anything the reply left out or garbled
+        for company in batch:
+            if company not in rated:
+                bucket.acquire()
+                rated[company] = get_company_rating(company, client, model)
+        return rated
+
+    batch_size = max(1, batch_size)
+    batches = [todo[start:start + batch_size] for start in range(0, len(todo), batch_size)]
+    done = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(rate, batch) for batch in batches]
+        for future in as_completed(futures):
+            for company, (rating, explanation) in future.result().items():
+                done += 1
+                print(f"[{done}/{len(todo)}] Rated '{company}': {rating}")
+                results[company] = (rating, explanation)
+                # Errors aren't cached so they get retried on the next run
+                if cache and rating != "Error":
+                    cache.put(company, rating, explanation)
+    return results
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Rate companies with Gemini, reusing cached ratings.")
+    parser.add_argument('-i', '--input', default=INPUT_FILE, help="Excel file with the companies.")
+    parser.add_argument('-o', '--output', default=OUTPUT_FILE, help="Excel file to write the ratings to.")
+    parser.add_argument('--column', default=COMPANY_COLUMN_NAME, help="Column holding the company names.")
+    parser.add_argument('--model', default=MODEL_NAME, help="Gemini model to use.")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Companies per request.")
+    parser.add_argument('-j', '--workers', type=int, default=MAX_CONCURRENT_REQUESTS,
+                        help="Requests in flight at once.")
+    parser.add_argument('--cache', default=CACHE_FILE, help="Rating cache database.")
+    return parser.parse_args(argv)
+
+def main(argv=None, client=None):
     """
     Main function to read companies, get ratings, and save results.
     """
-    print(f"Reading companies from '{INPUT_FILE}'...")
+    args = parse_args(argv)
+    print(f"Reading companies from '{args.input}'...")
     try:
         # Reads the first sheet of the Excel file
-        df = pd.read_excel(INPUT_FILE, sheet_name=0) 
-        if COMPANY_COLUMN_NAME not in df.columns:
-            print(f"Error: Column '{COMPANY_COLUMN_NAME}' not found in the Excel file.")
+        df = pd.read_excel(args.input, sheet_name=0)
+        if args.column not in df.columns:
+            print(f"Error: Column '{args.column}' not found in the Excel file.")
             return
     except FileNotFoundError:
-        print(f"Error: The file '{INPUT_FILE}' was not found.")
+        print(f"Error: The file '{args.input}' was not found.")
         return
     except Exception as e:
         print(f"Error reading the Excel file: {e}")
         return
 
-    companies = df[COMPANY_COLUMN_NAME].dropna().unique().tolist()
+    companies = df[args.column].dropna().unique().tolist()
     print(f"Found {len(companies)} unique companies to rate.")
 
-    results = []
-    for i, company in enumerate(companies):
-        print(f"[{i+1}/{len(companies)}] Rating '{company}'...")
-        rating, explanation = get_company_rating(company)
-        results.append({
-            'Company': company,
-            'Rating': rating,
-            'Explanation': explanation
-        })
-        time.sleep(1) 
+    client = client or create_client()
+    if client is None:
+        return
+
+    cache = RatingCache(args.cache)
+    try:
+        ratings = rate_companies(companies, client, cache, max_workers=args.workers,
+                                 model=args.model, batch_size=args.batch_size)
+    finally:
+        cache.close()
+
+    results = [
+        {'Company': company, 'Rating': ratings[company][0], 'Explanation': ratings[company][1]}
+        for company in companies
+    ]
 
     print("\nAll companies have been rated. Saving results...")
     results_df = pd.DataFrame(results)
-    results_df.to_excel(OUTPUT_FILE, index=False)
-    print(f"✅ Success! Results saved to '{OUTPUT_FILE}'.")
+    results_df.to_excel(args.output, index=False)
+    print(f"✅ Success! Results saved to '{args.output}'.")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,250 @@
+import argparse
+import glob
+import io
+import os
+import re
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import extraction_cache
+import html_stream
+
+# --- Configuration ---
+DEFAULT_SOURCES = ['pages']          # directories, globs, files or http(s) URLs
+OUTPUT_EXCEL_FILE = 'scraped_companies.xlsx'
+COLUMN_NAMES = ['Rank', 'Company Name', 'Website', 'Source', 'Extractor']
+URL_TIMEOUT = 30  # seconds
+CACHE_FILE = extraction_cache.CACHE_FILE
+# ---------------------
+
+# Extractor name -> (parser class, pattern that identifies a page it can read).
+# Add an entry here to support a new page layout.
+EXTRACTORS = {
+    'exhibitor': (html_stream.ExhibitorNameParser, re.compile(r'data-dd-action-name\s*=\s*["\']Exhibitor name["\']')),
+    'ranked': (html_stream.RankedCompanyParser, re.compile(r'<tr\b[^>]*class\s*=\s*["\'][^"\']*\bcompany\b')),
+}
+
+
+def expand_sources(sources):
+    """
+    Turns directories, globs, file paths and URLs into a flat, ordered list of pages.
+    """
+    pages = []
+    for source in sources:
+        if _is_url(source):
+            pages.append(source)
+        elif os.path.isdir(source):
+            found = glob.glob(os.path.join(source, '*.htm')) + glob.glob(os.path.join(source, '*.html'))
+            pages.extend(sorted(found))
+        elif glob.has_magic(source):
+            pages.extend(sorted(glob.glob(source)))
+        else:
+            pages.append(source)
+
+    # Keep the first occurrence of each page
+    return list(dict.fromkeys(pages))
+
+
+def _is_url(page):
+    return page.startswith(('http://', 'https://'))
+
+
+def _open_page(page):
+    if _is_url(page):
+        response = urllib.request.urlopen(page, timeout=URL_TIMEOUT)
+        return io.TextIOWrapper(response, encoding='utf-8', errors='replace')
+    return open(page, 'r', encoding='utf-8')
+
+
+def scrape_page(page, extractor='auto'):
+    """
+    Streams one page through the matching extractor.
+    Runs in a worker process, so it only returns plain data.
+
+    Args:
+        page (str): File path or URL.
+        extractor (str): A key of EXTRACTORS, or 'auto' to pick one from the page content.
+
+    Returns:
+        (str, str or None, list, str or None): (page, extractor used, records, error)
+    """
+    try:
+        with _open_page(page) as stream:
+            buffered = []
+            chosen = None if extractor == 'auto' else extractor
+            chunk = ''
+            # Auto-detect: read until one extractor's marker shows up. The tail of
+            # the previous chunk is kept so a marker split across chunks still matches.
+            while chosen is None:
+                chunk = stream.read(html_stream.CHUNK_SIZE)
+                if not chunk:
+                    break
+                buffered.append(chunk)
+                window = (buffered[-2][-200:] if len(buffered) > 1 else '') + chunk
+                for name, (_, marker) in EXTRACTORS.items():
+                    if marker.search(window):
+                        chosen = name
+                        break
+            if chosen is None:
+                return page, None, [], "no known extractor matches this page"
+
+            parser = EXTRACTORS[chosen][0]()
+            records = []
+            for chunk in buffered:
+                parser.feed(chunk)
+                records.extend(parser.pop_records())
+            for chunk in iter(lambda: stream.read(html_stream.CHUNK_SIZE), ''):
+                parser.feed(chunk)
+                records.extend(parser.pop_records())
+            parser.close()
+            records.extend(parser.pop_records())
+            return page, chosen, records, None
+    except Exception as e:
+        return page, None, [], str(e)
+
+
+def cache_version(extractor='auto'):
+    """
+    Identifies everything that decides what 'extractor' returns for a page:
+    the parser versions and, for 'auto', every extractor's detection marker.
+    """
+    names = sorted(EXTRACTORS) if extractor == 'auto' else [extractor]
+    parts = [(name, extraction_cache.extractor_version(EXTRACTORS[name][0]), EXTRACTORS[name][1].pattern)
+             for name in names]
+    return extraction_cache.inputs_fingerprint(parts)[:16]
+
+
+def hash_pages(pages):
+    """
+    Returns {page: content hash} for the local pages that can be read.
+    URLs are left out: they'd have to be downloaded to be hashed.
+    """
+    hashes = {}
+    for page in pages:
+        if _is_url(page):
+            continue
+        try:
+            hashes[page] = extraction_cache.content_hash(page)
+        except OSError:
+            pass  # scrape_page reports the error
+    return hashes
+
+
+def scrape_pages(pages, extractor='auto', max_workers=None, cache=None, hashes=None):
+    """
+    Parses every page in a process pool and merges the results.
+
+    Args:
+        cache (ExtractionCache or None): Pages whose content was already
+            parsed by the same extractor version are taken from here
+            instead of being parsed again.
+        hashes (dict or None): {page: content hash}, see hash_pages().
+
+    Returns:
+        pd.DataFrame: One row per company, deduplicated by name (first page wins).
+    """
+    hashes = hashes or {}
+    version = cache_version(extractor)
+    results = {}
+    if cache:
+        for page, digest in hashes.items():
+            hit = cache.get(digest, extractor, version)
+            if hit is not None:
+                results[page] = (page, hit[0], hit[1], None)
+    todo = [page for page in pages if page not in results]
+    if cache:
+        print(f"{len(results)} pages unchanged since they were last parsed, {len(todo)} to parse.")
+
+    if todo:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            for result in pool.map(scrape_page, todo, [extractor] * len(todo)):
+                page, chosen, records, error = result
+                results[page] = result
+                # Failures aren't cached so they get retried on the next run
+                if cache and not error and page in hashes:
+                    cache.put(hashes[page], extractor, version, chosen, records)
+
+    frames = []
+    for page in pages:
+        page, chosen, records, error = results[page]
+        if error:
+            print(f"  [FAILED] {page}: {error}")
+            continue
+        print(f"  [{chosen}] {page}: {len(records)} companies")
+        if records:
+            frame = pd.DataFrame.from_records(records)
+            frame['Source'] = page
+            frame['Extractor'] = chosen
+            frames.append(frame)
+
+    if not frames:
+        return pd.DataFrame(columns=COLUMN_NAMES)
+
+    combined = pd.concat(frames, ignore_index=True).reindex(columns=COLUMN_NAMES)
+    # Same company on several pages (or twice on one) -> keep the first
+    key = combined['Company Name'].astype(str).str.strip().str.casefold()
+    return combined[~key.duplicated()].reset_index(drop=True)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Extract companies from many saved pages in parallel.")
+    parser.add_argument('sources', nargs='*', default=DEFAULT_SOURCES,
+                        help="Directories, globs, HTML files or http(s) URLs.")
+    parser.add_argument('-o', '--output', default=OUTPUT_EXCEL_FILE, help="Excel file to write.")
+    parser.add_argument('-e', '--extractor', default='auto', choices=['auto'] + sorted(EXTRACTORS),
+                        help="Force one extractor instead of detecting it per page.")
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help="Worker processes (default: one per CPU core).")
+    parser.add_argument('--cache', default=CACHE_FILE,
+                        help="Extraction cache database, so unchanged pages aren't parsed again.")
+    parser.add_argument('--no-cache', dest='cache', action='store_const', const=None,
+                        help="Parse every page and rewrite the output, ignoring the cache.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """
+    Main function to scrape every page, merge the results and save to Excel.
+    """
+    args = parse_args(argv)
+    pages = expand_sources(args.sources)
+    if not pages:
+        print(f"No pages found in: {', '.join(args.sources)}")
+        return
+
+    print(f"Scraping {len(pages)} pages...")
+    cache = extraction_cache.ExtractionCache(args.cache) if args.cache else None
+    try:
+        hashes = hash_pages(pages) if cache else {}
+        df = scrape_pages(pages, args.extractor, args.workers, cache, hashes)
+
+        if df.empty:
+            print("No company data found. The output file will be empty.")
+        else:
+            print(f"Successfully found {len(df)} unique companies.")
+
+        # Pages fetched from URLs can't be fingerprinted, so the output is always rewritten then
+        fingerprint = None
+        if cache and len(hashes) == len(pages):
+            fingerprint = extraction_cache.inputs_fingerprint(
+                [[page, hashes[page]] for page in pages] + [cache_version(args.extractor), COLUMN_NAMES]
+            )
+            if cache.output_is_current(args.output, fingerprint):
+                print(f"✅ '{args.output}' is already up to date.")
+                return
+
+        try:
+            df.to_excel(args.output, index=False)
+            if fingerprint:
+                cache.mark_output(args.output, fingerprint)
+            print(f"✅ Success! Data saved to '{args.output}'.")
+        except Exception as e:
+            print(f"An error occurred while saving the Excel file: {e}")
+    finally:
+        if cache:
+            cache.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import mimetypes
+import os
+import threading
+from email.message import MIMEPart
+
+
+class AttachmentCache:
+    """
+    Builds each attachment MIME part once and reuses it for every message.
+
+    The file is read, MIME-typed and base64-encoded the first time it's
+    requested. Later requests return the same encoded part as long as the
+    file's mtime and size haven't changed, so editing the resume mid-run
+    is still picked up.
+    """
+
+    def __init__(self):
+        self._parts = {}
+        self._lock = threading.Lock()
+
+    def get_part(self, path):
+        """
+        Returns the encoded attachment part for 'path', or None if the file doesn't exist.
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        stamp = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            cached = self._parts.get(path)
+            if cached is not None and cached[0] == stamp:
+                return cached[1]
+
+        part = _build_part(path)
+        with self._lock:
+            self._parts[path] = (stamp, part)
+        return part
+
+    def clear(self):
+        with self._lock:
+            self._parts.clear()
+
+
+def _build_part(path):
+    # Guess the MIME type
+    ctype, encoding = mimetypes.guess_type(path)
+    if ctype is None or encoding is not None:
+        ctype = 'application/octet-stream'  # Default if guess fails
+    maintype, subtype = ctype.split('/', 1)
+
+    with open(path, 'rb') as f:
+        data = f.read()
+
+    part = MIMEPart()
+    # set_content base64-encodes the data here, once
+    part.set_content(data, maintype=maintype, subtype=subtype,
+                     disposition='attachment', filename=os.path.basename(path))
+    return part
+
+
+# Shared by every message built in this process
+default_cache = AttachmentCache()
@@ -0,0 +1,74 @@
+import os
+import sqlite3
+import time
+
+# Only the standard library here: 'cli.py status' must start instantly,
+# without pandas.
+
+
+def summarize(journal_path, recent_seconds=24 * 3600, top_errors=5):
+    """
+    Reads campaign progress out of the send journal.
+
+    Returns:
+        dict or None: Counts, timings, common errors and live claims, or
+        None if there is no journal yet.
+    """
+    if not os.path.exists(journal_path):
+        return None
+    # Read-only, so a running campaign is never blocked
+    conn = sqlite3.connect(f"file:{journal_path}?mode=ro", uri=True, timeout=5)
+    try:
+        since = time.time() - recent_seconds
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM sends GROUP BY status").fetchall())
+        recent = dict(conn.execute(
+            "SELECT status, COUNT(*) FROM sends WHERE sent_at >= ? GROUP BY status", (since,)
+        ).fetchall())
+        first, last = conn.execute("SELECT MIN(sent_at), MAX(sent_at) FROM sends").fetchone()
+        errors = conn.execute("""
+            SELECT error, COUNT(*) AS n FROM sends
+            WHERE status = 'Failed' GROUP BY error ORDER BY n DESC LIMIT ?
+        """, (top_errors,)).fetchall()
+        claims = []
+        has_claims = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'claims'"
+        ).fetchone()
+        if has_claims:
+            claims = conn.execute("""
+                SELECT owner, COUNT(*), MAX(expires_at) FROM claims
+                WHERE expires_at >= ? GROUP BY owner ORDER BY owner
+            """, (time.time(),)).fetchall()
+    finally:
+        conn.close()
+    return {
+        'counts': counts,
+        'recent': recent,
+        'first_at': first,
+        'last_at': last,
+        'errors': errors,
+        'claims': claims,
+    }
+
+
+def _when(timestamp):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp)) if timestamp else '-'
+
+
+def print_status(journal_path):
+    summary = summarize(journal_path)
+    if summary is None:
+        print(f"No send journal at '{journal_path}' yet; nothing has been sent.")
+        return
+    counts, recent = summary['counts'], summary['recent']
+    print(f"Send journal: {journal_path}")
+    print(f"  Sent:   {counts.get('Sent', 0)} ({recent.get('Sent', 0)} in the last 24h)")
+    print(f"  Failed: {counts.get('Failed', 0)} ({recent.get('Failed', 0)} in the last 24h)")
+    print(f"  First send: {_when(summary['first_at'])}   Last send: {_when(summary['last_at'])}")
+    if summary['errors']:
+        print("  Most common errors:")
+        for error, count in summary['errors']:
+            print(f"    {count:>6}  {error}")
+    if summary['claims']:
+        print("  Senders holding claims:")
+        for owner, count, expires_at in summary['claims']:
+            print(f"    {owner}: {count} rows (lease until {_when(expires_at)})")
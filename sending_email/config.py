@@ -4,11 +4,34 @@ TEMPLATE_FOLDER = './sending_email/templates'
 
 
 IMAGE_FOLDER = './sending_email/assets/selfie'
+IMAGE_INDEX_REFRESH_SECONDS = 30  # Re-check IMAGE_FOLDER for new pictures this often (None = never)
+IMAGE_CACHE_MAX_MB = 64           # Memory cap for picture bytes kept between recipients
+# Pictures are downsized, stripped of EXIF and recompressed once into this folder (needs Pillow).
+# None embeds them exactly as they are in IMAGE_FOLDER.
+IMAGE_OPTIMIZE_DIR = './.image_cache'
+IMAGE_MAX_WIDTH = 1200            # Pixels; templates show the picture at 600px
+IMAGE_QUALITY = 80                # JPEG quality, 1-95
 ATTACHMENT_FILES = [
     './sending_email/assets/[Resume_Name.pdf]',
     './sending_email/assets/Certificates_Name.pdf'
 ]
 
+# How recipients are stored between runs: 'excel', 'parquet' (needs pyarrow) or 'sqlite'.
+# With 'parquet'/'sqlite' the sheet is imported once into RECIPIENT_CACHE_DIR and the
+# Excel file is only rewritten when you run 'python main.py --export-excel'.
+RECIPIENT_BACKEND = 'excel'
+RECIPIENT_CACHE_DIR = './.recipient_cache'
+STREAM_CHUNK_ROWS = 500  # 'python main.py --stream': rows read (from .xlsx or .csv) per chunk
+
+# Every send is logged here as it happens, so a crash never loses 'Sent' marks
+SEND_JOURNAL_FILE = './send_journal.sqlite3'
+FOLLOW_UP_AFTER_DAYS = 7  # 'python main.py --follow-up ...': wait this long after the first email
+
+# Rows with blank, malformed or duplicate (email, template) addresses are skipped
+# before sending. Optional extras:
+MX_CACHE_FILE = None          # JSON/CSV of known domains -> has MX (no network lookups)
+RECIPIENT_ISSUES_FILE = None  # e.g. './recipient_issues.csv' to list every skipped row
+
 
 # --- 2. Your Information ---
 SENDER_EMAIL = '[Your Email]'  
@@ -16,8 +39,40 @@ YOUR_NAME = '[Your Name]'
 YOUR_PHONE_NUMBER = '[Your Phone]'      
 YOUR_STATE_AND_CITY = '[Your city and State]'
 PASSWORD = '[Your Google App Email Password]'
+# Optional: one account per shard for 'python main.py --shard INDEX/COUNT'.
+# Shard N sends as SENDER_ACCOUNTS[N]; empty = every shard uses SENDER_EMAIL.
+# e.g. [{'email': 'me.one@gmail.com', 'password': '...'}, {'email': 'me.two@gmail.com', 'password': '...'}]
+SENDER_ACCOUNTS = []
 
 
 # --- 3. SMTP Server Settings (Using Gmail as default) ---
 SMTP_SERVER = 'smtp.gmail.com'
-SMTP_PORT = 465  # For SSL
\ No newline at end of file
+SMTP_PORT = 465  # For SSL
+SMTP_USE_SSL = True  # Set to False for a plain local test server
+# 'threads': one smtplib connection per thread, one round trip per SMTP command.
+# 'pipelined': asyncio connections using ESMTP PIPELINING, about one round trip
+# per message -- much faster when the server is far away.
+SMTP_TRANSPORT = 'threads'
+SMTP_PIPELINE_BATCH = 20      # 'pipelined': messages sent back to back per connection
+SMTP_KEEPALIVE_SECONDS = 30   # 'pipelined': NOOP an idle connection this often
+
+
+# --- 4. Sending Speed ---
+SMTP_POOL_SIZE = 3           # Number of logged-in connections sending in parallel
+MAX_EMAILS_PER_SECOND = 1    # Global limit across all connections (None = no limit)
+MAX_EMAILS_PER_MINUTE = 30   # Global limit across all connections (None = no limit)
+MAX_SEND_ATTEMPTS = 3        # Attempts per message, after a dropped connection or a temporary (4xx) refusal
+RETRY_BASE_SECONDS = 30      # Wait before retrying a 4xx; doubles with each attempt
+RETRY_MAX_SECONDS = 600      # Longest wait between retries
+# Limits per recipient domain, so one throttling provider doesn't hold up the rest.
+# A 4xx also pauses its domain for up to RETRY_BASE_SECONDS. ('threads' transport)
+DOMAIN_MAX_IN_FLIGHT = 2     # Concurrent sends to one domain (None = no limit)
+DOMAIN_MAX_PER_MINUTE = None # Sends to one domain per minute (None = no limit)
+DOMAIN_LIMITS = {}           # Overrides, e.g. {'gmail.com': {'max_in_flight': 3, 'per_minute': 60}}
+CLAIM_LEASE_SECONDS = 600    # With --shard: a dead sender's claimed rows are freed after this long
+
+
+# --- 5. Progress & Metrics ---
+PROGRESS_INTERVAL_SECONDS = 10  # Print a rate/ETA line this often while sending (None = off)
+METRICS_FILE = None             # e.g. './emailer.prom' for a node_exporter textfile collector
+METRICS_FORMAT = 'prometheus'   # 'prometheus' or 'json'
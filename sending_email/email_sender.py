@@ -1,19 +1,46 @@
 import smtplib
 import ssl
-import os
-import mimetypes
+import time
 from email.message import EmailMessage
 
-# --- login_to_server function (No changes needed) ---
-def login_to_server(smtp_server, port, sender_email, password):
+from sending_email import attachment_cache
+from sending_email import image_index
+from sending_email import image_optimizer
+from sending_email import metrics
+
+# --- login_to_server function ---
+def login_to_server(smtp_server, port, sender_email, password, use_ssl=True):
     """
     Logs into the SMTP server and returns the server object.
-    ...
+
+    Args:
+        smtp_server (str): Host name of the SMTP server.
+        port (int): Port of the SMTP server.
+        sender_email (str): Account used to log in.
+        password (str): Password / App Password. If empty, no login is attempted
+            (useful for a local stand-in server during testing).
+        use_ssl (bool): Use SMTP_SSL (True) or a plain SMTP connection (False),
+            upgraded with STARTTLS when the server offers it.
+
+    Returns:
+        smtplib.SMTP or None: The logged-in server, or None on error.
     """
-    context = ssl.create_default_context()
     try:
-        server = smtplib.SMTP_SSL(smtp_server, port, context=context)
-        server.login(sender_email, password)
+        context = ssl.create_default_context()
+        if use_ssl:
+            server = smtplib.SMTP_SSL(smtp_server, port, context=context)
+        else:
+            server = smtplib.SMTP(smtp_server, port)
+            server.ehlo()
+            if server.has_extn('starttls'):
+                server.starttls(context=context)
+                server.ehlo()
+            elif password:
+                server.quit()
+                print(f"Error: {smtp_server}:{port} offers no STARTTLS; refusing to send the password unencrypted.")
+                return None
+        if password:
+            server.login(sender_email, password)
         print("SMTP login successful.")
         return server
     except smtplib.SMTPAuthenticationError:
@@ -25,51 +52,78 @@ def login_to_server(smtp_server, port, sender_email, password):
         print(f"Error connecting to SMTP server: {e}")
         return None
 
-# --- CORRECTED FUNCTION ---
-def send_email(server, sender_email, recipient_email, subject, body, attachment_paths=None, inline_image_path=None):
+def build_message(sender_email, recipient_email, subject, body, attachment_paths=None, inline_image_path=None):
     """
-    Sends a single email using the active server connection.
-    ...
+    Builds the EmailMessage for a single recipient without sending it.
+
+    Returns:
+        EmailMessage: The ready-to-send message.
     """
-    try:
-        msg = EmailMessage()
-        msg['Subject'] = subject
-        msg['From'] = sender_email
-        msg['To'] = recipient_email
+    start = time.perf_counter()
+    msg = EmailMessage()
+    msg['Subject'] = subject
+    msg['From'] = sender_email
+    msg['To'] = recipient_email
 
-        
-        # 1. ADD INLINE IMAGE (RELATED) FIRST
-        if inline_image_path and os.path.exists(inline_image_path):
-            with open(inline_image_path, 'rb') as f:
-                img_data = f.read()
-            
-            img_subtype = mimetypes.guess_type(inline_image_path)[0].split('/')[1]
+    # 1. ADD INLINE IMAGE (RELATED) FIRST
+    # Bytes come from a shared, size-capped cache, so a picture used for
+    # several recipients is only read once. With optimization on, that's the
+    # downsized, EXIF-free copy instead of the phone original.
+    if inline_image_path:
+        img_data, img_subtype = image_index.image_cache.read(image_optimizer.optimized_path(inline_image_path))
+        if img_data is not None:
             msg.add_related(img_data, maintype='image', subtype=img_subtype, cid='my_dynamic_image')
-            
-        # 2. ADD HTML BODY (ALTERNATIVE) SECOND
-        msg.add_alternative(body, subtype='html')
 
-        # 3. ADD ATTACHMENTS (MIXED) LAST
-        if attachment_paths:
-            for path in attachment_paths:
-                if path and os.path.exists(path):
-                    # Guess the MIME type
-                    ctype, encoding = mimetypes.guess_type(path)
-                    if ctype is None or encoding is not None:
-                        ctype = 'application/octet-stream'  # Default if guess fails
-                    
-                    maintype, subtype = ctype.split('/', 1)
-                    
-                    with open(path, 'rb') as f:
-                        msg.add_attachment(f.read(),
-                                           maintype=maintype,
-                                           subtype=subtype,
-                                           filename=os.path.basename(path))
-                        
-        
+    # 2. ADD HTML BODY (ALTERNATIVE) SECOND
+    msg.add_alternative(body, subtype='html')
+
+    # 3. ADD ATTACHMENTS (MIXED) LAST
+    # Parts come pre-encoded from the cache, so each file is only read once per run
+    if attachment_paths:
+        for path in attachment_paths:
+            if not path:
+                continue
+            part = attachment_cache.default_cache.get_part(path)
+            if part is None:
+                continue
+            if msg.get_content_maintype() != 'multipart' or msg.get_content_subtype() != 'mixed':
+                msg.make_mixed()
+            msg.attach(part)
+
+    metrics.registry.observe('mime_build_seconds', time.perf_counter() - start)
+    return msg
 
-        server.send_message(msg)
+def smtp_reply_code(error):
+    """Returns the SMTP reply code behind a send error (e.g. 550), or None if the server gave none."""
+    code = getattr(error, 'smtp_code', None)
+    if code is None and isinstance(error, smtplib.SMTPRecipientsRefused) and error.recipients:
+        code = next(iter(error.recipients.values()))[0]
+    return code
+
+def smtp_error_code(error):
+    """
+    Returns the SMTP reply code behind a send error as a string ('550'),
+    or a short error class name when the server never answered with one.
+    """
+    code = smtp_reply_code(error)
+    if code is not None:
+        return str(code)
+    return type(error).__name__
+
+def send_email(server, sender_email, recipient_email, subject, body, attachment_paths=None, inline_image_path=None):
+    """
+    Sends a single email using the active server connection.
+    ...
+    """
+    try:
+        msg = build_message(sender_email, recipient_email, subject, body,
+                            attachment_paths=attachment_paths,
+                            inline_image_path=inline_image_path)
+        with metrics.registry.timer('smtp_seconds'):
+            server.send_message(msg)
+        metrics.registry.inc('emails_sent_total')
         return True
     except Exception as e:
+        metrics.registry.inc('emails_failed_total', {'code': smtp_error_code(e)})
         print(f"  [FAILED] to send to {recipient_email}: {e}")
-        return False
\ No newline at end of file
+        return False
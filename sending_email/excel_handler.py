@@ -1,15 +1,122 @@
+import glob
+import hashlib
+import importlib.util
+import json
+import os
+import sqlite3
+
 import pandas as pd
 
-def load_recipients(file_path):
+# 'excel' reads and writes the .xlsx directly. 'parquet' (needs pyarrow) and
+# 'sqlite' import the .xlsx once into a cache keyed by the file's hash and
+# serve later loads from there; the .xlsx is only rewritten on export.
+BACKENDS = ('excel', 'parquet', 'sqlite')
+DEFAULT_CACHE_DIR = './.recipient_cache'
+DEFAULT_CHUNK_ROWS = 500
+
+# Pragmatic address check: one '@', a sane local part and a dotted domain
+# with a letter TLD. Stricter than RFC 5322 on purpose -- quoted local parts
+# and IP literals are valid but never what a recruiter list means.
+EMAIL_PATTERN = (
+    r"[a-z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[a-z0-9!#$%&'*+/=?^_`{|}~-]+)*"
+    r"@(?:[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?\.)+[a-z]{2,63}"
+)
+
+# Reasons check_recipients() gives for skipping a row
+ISSUE_BLANK = 'blank email'
+ISSUE_INVALID = 'invalid email'
+ISSUE_NO_MX = 'domain has no MX'
+ISSUE_DUPLICATE = 'duplicate email+template'
+ISSUE_ALREADY_SENT = 'already sent from another row'
+
+def load_recipients(file_path, backend='excel', cache_dir=DEFAULT_CACHE_DIR):
     """
     Loads the recipients from the specified Excel file.
     
     Args:
         file_path (str): The path to the .xlsx file.
+        backend (str): One of BACKENDS.
+        cache_dir (str): Where the 'parquet' / 'sqlite' backends keep their cache.
         
     Returns:
         pd.DataFrame or None: A DataFrame with recipient data, or None on error.
     """
+    if backend not in BACKENDS:
+        print(f"Error: Unknown recipient backend '{backend}'. Use one of: {', '.join(BACKENDS)}.")
+        return None
+    if backend == 'excel':
+        return _read_excel(file_path)
+    if backend == 'parquet' and importlib.util.find_spec('pyarrow') is None:
+        # Otherwise the first read or save of the cache fails halfway through a run
+        print("Error: The 'parquet' recipient backend needs pyarrow (pip install pyarrow). "
+              "Install it, or set RECIPIENT_BACKEND to 'sqlite' or 'excel'.")
+        return None
+
+    try:
+        cache_path = _cache_path(file_path, backend, cache_dir)
+    except FileNotFoundError:
+        print(f"Error: Could not find the file '{file_path}'.")
+        print("Please make sure it's in the same directory.")
+        return None
+
+    if os.path.exists(cache_path):
+        try:
+            return _read_cache(cache_path, backend)
+        except Exception as e:
+            print(f"Warning: Recipient cache '{cache_path}' is unreadable ({e}). Re-importing '{file_path}'.")
+
+    df = _read_excel(file_path)
+    if df is not None:
+        carried = _carry_over_marks(df, file_path, backend, cache_dir)
+        if carried:
+            print(f"Carried {carried} 'Sent'/'Response' marks over from the cache of the previous '{file_path}'.")
+        try:
+            _write_cache(df, file_path, backend, cache_dir)
+        except Exception as e:
+            # The sheet itself loaded fine; only the next load pays for the import again
+            print(f"Warning: Could not write the recipient cache for '{file_path}' ({e}).")
+    return df
+
+def save_recipients(df, file_path, backend='excel', cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Saves the updated DataFrame back to the Excel file.
+    With the 'parquet' / 'sqlite' backends only the cache is updated;
+    call export_recipients to write the .xlsx.
+    
+    Args:
+        df (pd.DataFrame): The DataFrame to save.
+        file_path (str): The path to the .xlsx file.
+    """
+    if backend == 'excel':
+        _write_excel(df, file_path)
+        return
+    try:
+        _write_cache(df, file_path, backend, cache_dir)
+        print(f"\nSuccessfully updated the recipient cache for '{file_path}'.")
+        print("The Excel file itself is unchanged until you export it.")
+    except Exception as e:
+        print(f"Error saving to the recipient cache: {e}")
+
+def export_recipients(file_path, backend, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Writes the cached recipients back into the .xlsx file.
+
+    Returns:
+        bool: True if the Excel file was written.
+    """
+    if backend == 'excel':
+        print("Nothing to export: the 'excel' backend already saves to the Excel file.")
+        return False
+    df = load_recipients(file_path, backend, cache_dir)
+    if df is None:
+        return False
+    if not _write_excel(df, file_path):
+        return False
+    # The .xlsx hash just changed; re-key the cache so the next load still hits it
+    _write_cache(df, file_path, backend, cache_dir)
+    return True
+
+def _read_excel(file_path):
     try:
         column_types = {
             'Sent or Not': str
@@ -24,16 +131,402 @@ def load_recipients(file_path):
         print(f"Error reading Excel file: {e}")
         return None
 
-def save_recipients(df, file_path):
-    """
-    Saves the updated DataFrame back to the Excel file.
-    
-    Args:
-        df (pd.DataFrame): The DataFrame to save.
-        file_path (str): The path to the .xlsx file.
-    """
+def _write_excel(df, file_path):
     try:
         df.to_excel(file_path, index=False)
         print(f"\nSuccessfully updated '{file_path}'.")
+        return True
     except Exception as e:
-        print(f"Error saving to Excel: {e}")
\ No newline at end of file
+        print(f"Error saving to Excel: {e}")
+        return False
+
+# --- Streaming reader ---
+
+def iter_recipient_chunks(file_path, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Reads the recipients a chunk at a time, never holding the whole sheet.
+
+    .xlsx files go through openpyxl in read-only mode, which parses the
+    sheet XML as it goes; .csv files through pandas' chunked reader. Row
+    labels carry on across chunks (0, 1, 2, ...), as in load_recipients().
+
+    Yields:
+        pd.DataFrame: Up to 'chunk_rows' rows with the sheet's columns.
+    """
+    try:
+        if file_path.lower().endswith('.csv'):
+            yield from pd.read_csv(file_path, dtype={'Sent or Not': str}, chunksize=chunk_rows)
+            return
+        yield from _iter_xlsx_chunks(file_path, chunk_rows)
+    except FileNotFoundError:
+        print(f"Error: Could not find the file '{file_path}'.")
+        print("Please make sure it's in the same directory.")
+    except Exception as e:
+        print(f"Error reading Excel file: {e}")
+
+def _iter_xlsx_chunks(file_path, chunk_rows):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [f"Unnamed: {i}" if value is None else str(value) for i, value in enumerate(header)]
+        width = len(columns)
+
+        rows_buffer, blank_run, start = [], [], 0
+        for values in rows:
+            values = tuple(values[:width]) + (None,) * (width - len(values))
+            if all(value is None for value in values):
+                # Like read_excel, drop blank rows at the end but keep those in between
+                blank_run.append(values)
+                continue
+            rows_buffer.extend(blank_run)
+            blank_run = []
+            rows_buffer.append(values)
+            if len(rows_buffer) >= chunk_rows:
+                yield _chunk_frame(rows_buffer, columns, start)
+                start += len(rows_buffer)
+                rows_buffer = []
+        if rows_buffer:
+            yield _chunk_frame(rows_buffer, columns, start)
+    finally:
+        workbook.close()
+
+def _chunk_frame(rows, columns, start):
+    df = pd.DataFrame.from_records(rows, columns=columns, index=pd.RangeIndex(start, start + len(rows)))
+    if 'Sent or Not' in df.columns:
+        # Same as dtype=str in _read_excel: text where there's a value, NaN elsewhere
+        status = df['Sent or Not']
+        df['Sent or Not'] = status.astype(str).where(status.notna())
+    return df
+
+# --- Recipient cache ---
+
+def _file_hash(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _cache_prefix(file_path, cache_dir):
+    # The workbook's absolute path is part of the name so two sheets called
+    # 'contacts.xlsx' in different folders don't share a cache
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    path_id = hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()[:8]
+    return os.path.join(cache_dir, f"{stem}-{path_id}")
+
+def _cache_extension(backend):
+    return 'parquet' if backend == 'parquet' else 'sqlite3'
+
+def _cache_path(file_path, backend, cache_dir):
+    return f"{_cache_prefix(file_path, cache_dir)}-{_file_hash(file_path)[:16]}.{_cache_extension(backend)}"
+
+def _read_cache(cache_path, backend):
+    if backend == 'parquet':
+        return pd.read_parquet(cache_path)
+    conn = sqlite3.connect(cache_path)
+    try:
+        return pd.read_sql('SELECT * FROM recipients', conn)
+    finally:
+        conn.close()
+
+def _parquet_safe(df):
+    """
+    Parquet needs one type per column, but Excel columns are often mixed
+    (a Phone column with 1234567 and 'ext 5'). Those become text; missing
+    cells stay missing.
+    """
+    mixed = [column for column in df.columns
+             if df[column].dtype == object
+             and pd.api.types.infer_dtype(df[column], skipna=True) in ('mixed', 'mixed-integer')]
+    if not mixed:
+        return df
+    df = df.copy()
+    for column in mixed:
+        df[column] = df[column].astype(str).where(df[column].notna())
+    return df
+
+def _row_keys(df):
+    # (email, template, n-th such row), so duplicate rows pair up in order
+    emails = normalize_emails(df['Email']).str.lower()
+    templates = df['Template File'].fillna('').astype(str).str.strip() if 'Template File' in df.columns \
+        else pd.Series('', index=df.index)
+    keys = emails + '\x00' + templates
+    return keys + '\x00' + keys.groupby(keys).cumcount().astype(str)
+
+def _carry_over_marks(df, file_path, backend, cache_dir):
+    """
+    Copies the 'Sent or Not' marks of the cache of an older version of the
+    workbook onto the unmarked rows of a fresh import, matching rows on
+    (email, template). Marks saved to the cache but not yet exported would
+    otherwise be lost with the stale cache when the .xlsx is edited.
+
+    Returns:
+        int: How many rows got a mark.
+    """
+    pattern = glob.escape(_cache_prefix(file_path, cache_dir)) + '-*.' + _cache_extension(backend)
+    stale = sorted(glob.glob(pattern), key=os.path.getmtime)
+    if not stale or 'Email' not in df.columns:
+        return 0
+    try:
+        old = _read_cache(stale[-1], backend)
+    except Exception as e:
+        print(f"Warning: Could not read the previous recipient cache '{stale[-1]}' ({e}); its marks are not carried over.")
+        return 0
+    if 'Email' not in old.columns or 'Sent or Not' not in old.columns:
+        return 0
+
+    marked = ~pending_mask(old)
+    marks = dict(zip(_row_keys(old)[marked], old.loc[marked, 'Sent or Not']))
+    if not marks:
+        return 0
+    carried = _row_keys(df).map(marks)
+    fill = pending_mask(df) & carried.notna() & (normalize_emails(df['Email']) != '')
+    if fill.any():
+        if 'Sent or Not' not in df.columns:
+            df['Sent or Not'] = None
+        df.loc[fill, 'Sent or Not'] = carried[fill]
+    return int(fill.sum())
+
+def _write_cache(df, file_path, backend, cache_dir):
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_path = _cache_path(file_path, backend, cache_dir)
+    tmp_path = cache_path + '.tmp'
+    if backend == 'parquet':
+        _parquet_safe(df).to_parquet(tmp_path, index=False)
+    else:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        with sqlite3.connect(tmp_path) as conn:
+            df.to_sql('recipients', conn, index=False)
+        conn.close()
+    # Swap in atomically so a crash never leaves a half-written cache
+    os.replace(tmp_path, cache_path)
+
+    # Drop caches for older versions of this workbook
+    pattern = glob.escape(_cache_prefix(file_path, cache_dir)) + '-*.' + _cache_extension(backend)
+    for stale in glob.glob(pattern):
+        if stale != cache_path:
+            os.remove(stale)
+
+def pending_mask(df):
+    """
+    Finds the rows that still need an email, for the whole sheet at once.
+
+    Returns:
+        pd.Series: True for rows whose 'Sent or Not' is not 'Sent' or 'Response'.
+    """
+    if 'Sent or Not' not in df.columns:
+        return pd.Series(True, index=df.index)
+    status = df['Sent or Not'].fillna('').astype(str).str.strip().str.lower()
+    return ~status.isin(['sent', 'response'])
+
+def responded_emails(df):
+    """Returns the addresses of the rows marked 'Response', lowercased."""
+    if 'Email' not in df.columns or 'Sent or Not' not in df.columns:
+        return []
+    status = df['Sent or Not'].fillna('').astype(str).str.strip().str.lower()
+    emails = normalize_emails(df['Email']).str.lower()
+    return emails[(status == 'response') & (emails != '')].unique().tolist()
+
+def follow_up_rows(df, due_emails, template_file, follow_up_template):
+    """
+    Builds the rows to send a follow-up to, from the sheet rows of the
+    recipients send_journal.follow_ups_due() returned.
+
+    Each due address gets one row: the one it was sent 'template_file'
+    from if it's still there, else any row with that address. The copy
+    has 'follow_up_template' as its template and no 'Sent or Not' mark;
+    the sheet itself is not changed.
+
+    Returns:
+        pd.DataFrame: The follow-up rows, indexed like the sheet.
+    """
+    if 'Email' not in df.columns:
+        return df.iloc[0:0].copy()
+    emails = normalize_emails(df['Email']).str.lower()
+    candidates = emails[emails.isin(due_emails)]
+    templates = df['Template File'].fillna('').astype(str).str.strip() if 'Template File' in df.columns \
+        else pd.Series('', index=df.index)
+    # Rows of the original campaign first, then keep one row per address
+    other_template = (templates[candidates.index] != str(template_file).strip()).sort_values(kind='stable')
+    chosen = candidates[other_template.index].drop_duplicates(keep='first').index
+
+    rows = df.loc[chosen].copy()
+    rows['Template File'] = follow_up_template
+    rows['Sent or Not'] = None
+    missing = len(set(due_emails)) - len(rows)
+    if missing:
+        print(f"  [SKIPPED] {missing} follow-ups: the address is no longer in the sheet.")
+    return rows
+
+# --- Recipient checks ---
+
+def normalize_emails(emails):
+    """
+    Strips whitespace (and a 'mailto:' prefix) from a column of addresses.
+    Case is kept for sending; compare on .str.lower().
+
+    Returns:
+        pd.Series: Cleaned addresses, '' for blank cells.
+    """
+    emails = emails.fillna('').astype(str).str.strip()
+    return emails.str.replace(r'^mailto:', '', case=False, regex=True).str.strip()
+
+def load_mx_cache(path):
+    """
+    Loads a local cache of which domains accept mail.
+
+    The file is JSON ({"example.com": true, "typo.con": false}, or a list of
+    MX hosts per domain, empty = none) or a CSV with 'domain' and 'has_mx'
+    columns. Nothing is looked up on the network.
+
+    Returns:
+        dict or None: {domain: bool}, or None on error.
+    """
+    try:
+        if path.lower().endswith('.csv'):
+            table = pd.read_csv(path)
+            has_mx = table['has_mx'].astype(str).str.strip().str.lower().isin(['1', 'true', 'yes'])
+            return dict(zip(table['domain'].astype(str).str.strip().str.lower(), has_mx))
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return {str(domain).strip().lower(): bool(value) for domain, value in data.items()}
+    except (OSError, ValueError, KeyError, AttributeError) as e:
+        print(f"Error: Could not load MX cache '{path}': {e}")
+        return None
+
+def check_recipients(df, mx_cache=None):
+    """
+    Finds the pending rows that shouldn't be sent, for the whole sheet at once.
+
+    A pending row is skipped if its email is blank or malformed, if its
+    domain is known to have no MX record (only when 'mx_cache' is given),
+    or if another row has the same (email, template) -- already sent, or
+    an earlier pending row.
+
+    Args:
+        df (pd.DataFrame): The recipient sheet.
+        mx_cache (dict or None): {domain: has_mx} from load_mx_cache().
+            Domains not in the cache are assumed fine.
+
+    Returns:
+        pd.Series: The reason for each skipped row (one of the ISSUE_*
+        constants) and '' for rows that are fine or not pending.
+    """
+    issues = pd.Series('', index=df.index, dtype=object)
+    if 'Email' not in df.columns:
+        return issues
+    pending = pending_mask(df)
+    emails = normalize_emails(df['Email']).str.lower()
+    templates = df['Template File'].fillna('').astype(str).str.strip() if 'Template File' in df.columns \
+        else pd.Series('', index=df.index)
+
+    blank = emails == ''
+    invalid = ~blank & ~emails.str.fullmatch(EMAIL_PATTERN)
+    no_mx = pd.Series(False, index=df.index)
+    if mx_cache:
+        domains = emails.str.rpartition('@')[2]
+        no_mx = ~blank & ~invalid & (domains.map(mx_cache).fillna(True) == False)
+
+    keys = pd.MultiIndex.from_arrays([emails, templates])
+    sent_keys = keys[~pending]
+    already_sent = pd.Series(keys.isin(sent_keys), index=df.index) & ~blank
+    # Among pending rows, keep the first of each (email, template)
+    duplicate = pd.Series(False, index=df.index)
+    duplicate[pending] = keys[pending.to_numpy()].duplicated(keep='first')
+    duplicate &= ~blank
+
+    # Most specific reason wins
+    issues[duplicate] = ISSUE_DUPLICATE
+    issues[already_sent] = ISSUE_ALREADY_SENT
+    issues[no_mx] = ISSUE_NO_MX
+    issues[invalid] = ISSUE_INVALID
+    issues[blank] = ISSUE_BLANK
+    issues[~pending] = ''
+    return issues
+
+def _recipient_key_hashes(df):
+    emails = normalize_emails(df['Email']).str.lower()
+    templates = df['Template File'].fillna('').astype(str).str.strip() if 'Template File' in df.columns \
+        else pd.Series('', index=df.index)
+    return pd.Series(pd.util.hash_array((emails + '\x00' + templates).to_numpy(dtype=object)), index=df.index)
+
+class StreamingRecipientChecker:
+    """
+    check_recipients() for a sheet read with iter_recipient_chunks().
+
+    Each chunk is checked on its own and then against the chunks before it.
+    A pending row that repeats an earlier (email, template) is flagged as a
+    duplicate, or as already sent if the earlier row was. Only a 64-bit hash
+    of each key is kept, not the rows. Unlike the whole-sheet check, a row
+    is only compared with the rows above it.
+    """
+
+    def __init__(self, mx_cache=None):
+        self.mx_cache = mx_cache
+        self._sent = set()
+        self._pending = set()
+
+    def check(self, chunk):
+        """
+        Returns:
+            pd.Series: Same as check_recipients(), for this chunk.
+        """
+        issues = check_recipients(chunk, self.mx_cache)
+        if 'Email' not in chunk.columns:
+            return issues
+        pending = pending_mask(chunk)
+        keys = _recipient_key_hashes(chunk)
+        clean = issues == ''
+        earlier_sent = keys.map(lambda key: key in self._sent).astype(bool)
+        earlier_pending = keys.map(lambda key: key in self._pending).astype(bool)
+        issues[pending & clean & earlier_pending] = ISSUE_DUPLICATE
+        issues[pending & clean & earlier_sent] = ISSUE_ALREADY_SENT
+
+        has_email = normalize_emails(chunk['Email']) != ''
+        self._sent.update(keys[~pending & has_email].tolist())
+        self._pending.update(keys[pending & has_email].tolist())
+        return issues
+
+def report_issues(df, issues, examples=3, issues_file=None):
+    """
+    Prints how many rows check_recipients() flagged, per reason, with a few
+    example addresses. If 'issues_file' is set, every flagged row is also
+    written there as CSV with an 'Issue' column.
+    """
+    flagged = issues[issues != '']
+    if flagged.empty:
+        return
+    print(f"  [SKIPPED] {len(flagged)} rows failed the recipient checks:")
+    emails = df['Email'].fillna('').astype(str)
+    for reason, count in flagged.value_counts().items():
+        sample = ', '.join(repr(email) for email in emails[flagged.index[flagged == reason]].head(examples))
+        print(f"    {reason}: {count} (e.g. {sample})")
+    if issues_file and write_issues(df, flagged, issues_file):
+        print(f"    Flagged rows written to '{issues_file}'.")
+
+def write_issues(df, issues, issues_file, append=False):
+    """
+    Writes the flagged rows of 'df' as CSV with an 'Issue' column. With
+    'append', rows are added to the file (streaming writes one chunk at a time).
+
+    Returns:
+        bool: False if the file couldn't be written.
+    """
+    flagged = issues[issues != '']
+    if flagged.empty:
+        return True
+    header = not (append and os.path.exists(issues_file) and os.path.getsize(issues_file) > 0)
+    try:
+        df.loc[flagged.index].assign(Issue=flagged).to_csv(
+            issues_file, index=False, mode='a' if append else 'w', header=header
+        )
+        return True
+    except OSError as e:
+        print(f"Error writing '{issues_file}': {e}")
+        return False
@@ -0,0 +1,154 @@
+import mimetypes
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Checked in this order when several files share a name
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif')
+
+DEFAULT_REFRESH_SECONDS = 30
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class ImageIndex:
+    """
+    Case-insensitive index of the per-recipient pictures in one folder.
+
+    The folder is listed once; lookups are dictionary hits instead of up to
+    four os.path.exists calls per row. If 'refresh_seconds' is set, the
+    folder's mtime is re-checked at most that often and the index is rebuilt
+    when files were added or removed.
+
+    Files are named '{company}_{name}.<ext>', as in the original lookup.
+    """
+
+    def __init__(self, folder, refresh_seconds=DEFAULT_REFRESH_SECONDS):
+        self.folder = folder
+        self.refresh_seconds = refresh_seconds
+        self._paths = {}
+        self._folder_mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.scan()
+
+    def scan(self):
+        """(Re)builds the index from a single directory listing."""
+        paths = {}
+        try:
+            folder_mtime = os.stat(self.folder).st_mtime_ns
+            entries = list(os.scandir(self.folder))
+        except OSError:
+            folder_mtime, entries = None, []
+
+        ranked = {}
+        for entry in entries:
+            stem, ext = os.path.splitext(entry.name)
+            ext = ext.lower()
+            if ext not in IMAGE_EXTENSIONS or not entry.is_file():
+                continue
+            key = stem.casefold()
+            rank = IMAGE_EXTENSIONS.index(ext)
+            if key not in ranked or rank < ranked[key]:
+                ranked[key] = rank
+                paths[key] = entry.path
+
+        with self._lock:
+            self._paths = paths
+            self._folder_mtime = folder_mtime
+            self._checked_at = time.monotonic()
+
+    def _refresh_if_changed(self):
+        if not self.refresh_seconds:
+            return
+        if time.monotonic() - self._checked_at < self.refresh_seconds:
+            return
+        try:
+            folder_mtime = os.stat(self.folder).st_mtime_ns
+        except OSError:
+            folder_mtime = None
+        if folder_mtime != self._folder_mtime:
+            self.scan()
+        else:
+            self._checked_at = time.monotonic()
+
+    def find(self, company, name):
+        """Returns the picture path for (company, name), or None."""
+        self._refresh_if_changed()
+        return self._paths.get(f"{company}_{name}".casefold())
+
+    def __len__(self):
+        return len(self._paths)
+
+
+class ImageCache:
+    """
+    Thread-safe LRU cache of image bytes, capped by total size.
+    Entries are keyed by path, mtime and size, so an edited file is re-read.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def read(self, path):
+        """
+        Returns (data, subtype) for an image, e.g. (b'...', 'jpeg'),
+        or (None, None) if the file doesn't exist.
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None, None
+        key = (path, stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                return cached
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        ctype = mimetypes.guess_type(path)[0] or 'image/octet-stream'
+        value = (data, ctype.split('/', 1)[1])
+
+        with self._lock:
+            if key not in self._entries and len(data) <= self.max_bytes:
+                self._entries[key] = value
+                self._size += len(data)
+                while self._size > self.max_bytes:
+                    _, (old_data, _) = self._entries.popitem(last=False)
+                    self._size -= len(old_data)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+_refresh_seconds = DEFAULT_REFRESH_SECONDS
+
+# Shared by every message built in this process
+image_cache = ImageCache()
+
+
+def configure(refresh_seconds=DEFAULT_REFRESH_SECONDS, max_cache_bytes=DEFAULT_CACHE_BYTES):
+    """Sets the refresh interval for new indexes and the image cache size."""
+    global _refresh_seconds
+    _refresh_seconds = refresh_seconds
+    image_cache.max_bytes = max_cache_bytes
+
+
+def get_index(folder):
+    """Returns the shared ImageIndex for a folder, scanning it on first use."""
+    with _indexes_lock:
+        index = _indexes.get(folder)
+        if index is None:
+            index = _indexes[folder] = ImageIndex(folder, _refresh_seconds)
+        return index
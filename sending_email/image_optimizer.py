@@ -0,0 +1,178 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional: pictures are then embedded as they are
+    Image = ImageOps = None
+
+# Templates show the picture at max-width:600px; twice that stays sharp on HiDPI screens
+DEFAULT_MAX_WIDTH = 1200
+DEFAULT_QUALITY = 80
+
+
+class ImageOptimizer:
+    """
+    Downsizes and recompresses inline pictures once, for every later message
+    and run.
+
+    Each picture is rotated upright, shrunk to 'max_width', re-encoded
+    (JPEG, or PNG if it has transparency) without its EXIF data, and stored
+    in 'cache_dir' under a name derived from the source bytes and the
+    settings. Editing or replacing a picture gives it a new name; an
+    unchanged picture is found again by later runs and by render workers.
+
+    Pictures are optimized on first use; threads asking for the same
+    picture meanwhile wait for that one result. Animated GIFs and files Pillow
+    can't read are used as they are; a picture re-encoding wouldn't shrink
+    leaves a '.keep' marker so later runs don't re-encode it to find out.
+
+    Args:
+        cache_dir (str): Folder for the optimized copies.
+        max_width (int): Pictures wider than this are scaled down.
+        quality (int): JPEG quality, 1-95.
+    """
+
+    def __init__(self, cache_dir, max_width=DEFAULT_MAX_WIDTH, quality=DEFAULT_QUALITY):
+        self.cache_dir = cache_dir
+        self.max_width = max_width
+        self.quality = quality
+        # (path, mtime, size) -> path to embed, so the send loop only pays an os.stat
+        self._resolved = {}
+        # One lock per picture being optimized, so concurrent first uses don't each run Pillow
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def optimize(self, path):
+        """
+        Returns the path of the optimized copy of a picture, creating it if
+        needed, or 'path' itself if it can't or needn't be optimized.
+        """
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return path
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            resolved = self._resolved.get(key)
+            if resolved is not None:
+                return resolved
+            picture_lock = self._pending.setdefault(key, threading.Lock())
+
+        with picture_lock:
+            with self._lock:
+                resolved = self._resolved.get(key)
+            if resolved is None:
+                resolved = self._optimize_file(path)
+                with self._lock:
+                    self._resolved[key] = resolved
+                    self._pending.pop(key, None)
+        return resolved
+
+    def _optimize_file(self, path):
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError as e:
+            print(f"Error reading picture '{path}': {e}")
+            return path
+
+        digest = hashlib.sha256(data).hexdigest()[:32]
+        stem = f"{digest}-w{self.max_width}-q{self.quality}"
+        for ext in ('.jpg', '.png'):
+            cached_path = os.path.join(self.cache_dir, stem + ext)
+            if os.path.exists(cached_path):
+                return cached_path
+        keep_marker = os.path.join(self.cache_dir, stem + '.keep')
+        if os.path.exists(keep_marker):
+            return path
+
+        try:
+            optimized, ext = self._recompress(data)
+        except Exception as e:
+            print(f"Error optimizing picture '{path}', embedding it as is: {e}")
+            return path
+        if optimized is None:
+            # Remember the verdict, so the next run only hashes this picture
+            os.makedirs(self.cache_dir, exist_ok=True)
+            open(keep_marker, 'w').close()
+            return path
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        cached_path = os.path.join(self.cache_dir, stem + ext)
+        # Write-then-rename, so a render worker never embeds a half-written file
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(optimized)
+        os.replace(tmp_path, cached_path)
+        return cached_path
+
+    def _recompress(self, data):
+        """
+        Returns (bytes, extension) of the re-encoded picture, or (None, None)
+        to keep the original.
+        """
+        with Image.open(io.BytesIO(data)) as img:
+            # iPhone JPEGs open as multi-frame MPO; only the first frame is shown anyway
+            if getattr(img, 'is_animated', False) and img.format != 'MPO':
+                return None, None
+            had_exif = bool(img.info.get('exif'))
+            icc_profile = img.info.get('icc_profile')
+            # Phones store portrait shots sideways plus an EXIF rotation flag
+            img = ImageOps.exif_transpose(img)
+            if img.width > self.max_width:
+                height = max(1, round(img.height * self.max_width / img.width))
+                img = img.resize((self.max_width, height), Image.LANCZOS)
+
+            out = io.BytesIO()
+            has_alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+            if has_alpha:
+                img.save(out, format='PNG', optimize=True, icc_profile=icc_profile)
+                ext = '.png'
+            else:
+                img.convert('RGB').save(out, format='JPEG', quality=self.quality, optimize=True,
+                                        progressive=True, icc_profile=icc_profile)
+                ext = '.jpg'
+
+        optimized = out.getvalue()
+        # Re-encoding an already small picture can make it bigger; only worth
+        # it then if there was EXIF (location, device) to strip
+        if len(optimized) >= len(data) and not had_exif:
+            return None, None
+        return optimized, ext
+
+
+# Shared by every message built in this process; None = optimization off
+default_optimizer = None
+_warned_missing_pillow = False
+
+
+def configure(cache_dir, max_width=DEFAULT_MAX_WIDTH, quality=DEFAULT_QUALITY):
+    """
+    Turns optimization on for this process ('cache_dir' None turns it off).
+    Reconfiguring with the same settings keeps what was already resolved.
+    """
+    global default_optimizer, _warned_missing_pillow
+    if cache_dir and Image is None:
+        if not _warned_missing_pillow:
+            print("Note: Install Pillow (pip install Pillow) to shrink inline pictures. Embedding them as they are.")
+            _warned_missing_pillow = True
+        cache_dir = None
+    if not cache_dir:
+        default_optimizer = None
+        return
+    current = default_optimizer
+    if current is not None and (current.cache_dir, current.max_width, current.quality) == (cache_dir, max_width, quality):
+        return
+    default_optimizer = ImageOptimizer(cache_dir, max_width, quality)
+
+
+def optimized_path(path):
+    """The path to embed for a picture: its optimized copy, if optimization is on."""
+    if default_optimizer is None or not path:
+        return path
+    return default_optimizer.optimize(path)
+
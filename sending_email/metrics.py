@@ -0,0 +1,271 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+PREFIX = 'emailer_'
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def _format_labels(label_key, extra=None):
+    pairs = list(label_key) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}'
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile (None if empty)."""
+        if not self.count:
+            return None
+        target = q * self.count
+        running = 0
+        for bound, n in zip(self.buckets, self.counts):
+            running += n
+            if running >= target:
+                return bound
+        return float('inf')
+
+
+class Metrics:
+    """
+    Thread-safe counters and latency histograms for one process.
+
+    Names are plain strings ('smtp_seconds'); labels are an optional dict
+    ({'code': '550'}). Everything is kept in memory and exported on demand
+    as a Prometheus textfile or a JSON snapshot.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, labels=None, value=1):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, labels=None):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, name, labels=None):
+        """Observes how long the 'with' block took."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, labels)
+
+    def counter_total(self, name):
+        """Sum of a counter over all its label sets."""
+        with self._lock:
+            return sum(v for (n, _), v in self._counters.items() if n == name)
+
+    def histogram_totals(self, name):
+        """(count, sum) of a histogram over all its label sets."""
+        with self._lock:
+            count, total = 0, 0.0
+            for (n, _), histogram in self._histograms.items():
+                if n == name:
+                    count += histogram.count
+                    total += histogram.sum
+            return count, total
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    # --- Export ---
+
+    def to_prometheus(self):
+        """Renders everything in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            typed = set()
+            for (name, label_key), value in sorted(self._counters.items()):
+                full = PREFIX + name
+                if full not in typed:
+                    lines.append(f"# TYPE {full} counter")
+                    typed.add(full)
+                lines.append(f"{full}{_format_labels(label_key)} {value}")
+            for (name, label_key), histogram in sorted(self._histograms.items()):
+                full = PREFIX + name
+                if full not in typed:
+                    lines.append(f"# TYPE {full} histogram")
+                    typed.add(full)
+                running = 0
+                for bound, n in zip(histogram.buckets, histogram.counts):
+                    running += n
+                    lines.append(f"{full}_bucket{_format_labels(label_key, ('le', bound))} {running}")
+                lines.append(f"{full}_bucket{_format_labels(label_key, ('le', '+Inf'))} {histogram.count}")
+                lines.append(f"{full}_sum{_format_labels(label_key)} {histogram.sum:.6f}")
+                lines.append(f"{full}_count{_format_labels(label_key)} {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        """Returns everything as a JSON-friendly dict."""
+        with self._lock:
+            counters = {
+                name + _format_labels(label_key): value
+                for (name, label_key), value in sorted(self._counters.items())
+            }
+            histograms = {}
+            for (name, label_key), histogram in sorted(self._histograms.items()):
+                histograms[name + _format_labels(label_key)] = {
+                    'count': histogram.count,
+                    'sum': round(histogram.sum, 6),
+                    'mean': round(histogram.sum / histogram.count, 6) if histogram.count else None,
+                    'p50': histogram.quantile(0.5),
+                    'p95': histogram.quantile(0.95),
+                    'p99': histogram.quantile(0.99),
+                }
+        return {'timestamp': time.time(), 'counters': counters, 'histograms': histograms}
+
+    def write(self, path, fmt='prometheus'):
+        """
+        Writes the metrics to 'path' atomically ('prometheus' or 'json'), so a
+        node_exporter textfile collector never reads a half-written file.
+        """
+        if fmt == 'json':
+            content = json.dumps(self.snapshot(), indent=2)
+        else:
+            content = self.to_prometheus()
+        tmp_path = path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error writing metrics to '{path}': {e}")
+
+
+# Shared by every module in this process
+registry = Metrics()
+
+
+def _format_duration(seconds):
+    if seconds is None:
+        return '--'
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{hours}h{minutes:02d}m" if hours else f"{minutes}m{seconds:02d}s"
+
+
+class ProgressReporter:
+    """
+    Prints a progress line every 'interval' seconds while a campaign runs,
+    and keeps the metrics file up to date if one is configured.
+
+    Besides rate and ETA, the line shows where the time goes: average SMTP
+    round trip (server speed), average MIME build and process CPU use (our
+    own work), and time spent waiting on the rate limiter (our throttle).
+
+    Args:
+        total (int or None): Emails expected in this run (for the ETA);
+            None if unknown, e.g. while the sheet is still being read.
+        interval (float): Seconds between progress lines.
+        metrics_file (str or None): Path to rewrite on every tick.
+        metrics_format (str): 'prometheus' or 'json'.
+    """
+
+    def __init__(self, total, interval=10, metrics_file=None, metrics_format='prometheus', metrics=None):
+        self.total = total
+        self.interval = interval
+        self.metrics_file = metrics_file
+        self.metrics_format = metrics_format
+        self.metrics = metrics or registry
+        self._stop = threading.Event()
+        self._thread = None
+        self._first = None
+        self._last = None
+
+    def _done(self):
+        return self.metrics.counter_total('emails_sent_total') + self.metrics.counter_total('emails_failed_total')
+
+    def _sample(self):
+        return {
+            'wall': time.monotonic(),
+            'cpu': time.process_time(),
+            'done': self._done(),
+            'smtp': self.metrics.histogram_totals('smtp_seconds'),
+            'build': self.metrics.histogram_totals('mime_build_seconds'),
+            'throttle': self.metrics.histogram_totals('rate_limit_wait_seconds')[1],
+        }
+
+    def _line(self, last, now):
+        elapsed = max(now['wall'] - last['wall'], 1e-9)
+        rate = (now['done'] - last['done']) / elapsed
+        eta = None
+        if self.total is not None and rate > 0:
+            eta = max(self.total - now['done'], 0) / rate
+
+        def average_ms(key):
+            count = now[key][0] - last[key][0]
+            return (now[key][1] - last[key][1]) / count * 1000 if count else 0.0
+
+        cpu = (now['cpu'] - last['cpu']) / elapsed * 100
+        throttled = now['throttle'] - last['throttle']
+        total = '?' if self.total is None else self.total
+        return (f"{now['done']}/{total} | {rate:.1f}/s | ETA {_format_duration(eta)} | "
+                f"smtp {average_ms('smtp'):.0f}ms | build {average_ms('build'):.0f}ms | "
+                f"cpu {cpu:.0f}% | throttled {throttled:.1f}s")
+
+    def report(self):
+        """Prints one progress line covering the time since the last one."""
+        now = self._sample()
+        last, self._last = self._last, now
+        print(f"  [PROGRESS] {self._line(last, now)}")
+        if self.metrics_file:
+            self.metrics.write(self.metrics_file, self.metrics_format)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.report()
+
+    def start(self):
+        self._first = self._last = self._sample()
+        if self.interval:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops the periodic lines and prints a summary of the whole run."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        print(f"  [SUMMARY] {self._line(self._first, self._sample())}")
+        if self.metrics_file:
+            self.metrics.write(self.metrics_file, self.metrics_format)
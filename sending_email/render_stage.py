@@ -0,0 +1,144 @@
+import json
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from sending_email import email_sender
+from sending_email import image_optimizer
+from sending_email import excel_handler
+from sending_email import send_pool
+from sending_email import template_handler
+
+MANIFEST_FILE = 'manifest.jsonl'
+CHUNK_SIZE = 200
+
+# Picklable stand-in for the tuples prepare_recipients().itertuples() yields
+_Recipient = namedtuple('_Recipient', [
+    'Index', 'name', 'email', 'company', 'position', 'template_file',
+    'first_name', 'value_prop_sentence'
+])
+
+# Everything a worker process needs besides the rows. Passed explicitly
+# because worker processes don't see config changes made in the parent.
+RenderSettings = namedtuple('RenderSettings', [
+    'template_folder', 'image_folder', 'attachment_paths', 'sender_email',
+    'your_name', 'your_phone_number', 'your_city_and_state',
+    'image_optimize_dir', 'image_max_width', 'image_quality'
+])
+
+
+def _message_file_name(key):
+    return f"row-{key}.eml"
+
+
+def render_chunk(out_dir, settings, recipients):
+    """
+    Renders and writes one chunk of recipients. Runs in a worker process.
+
+    Returns:
+        list: One manifest entry (dict) per recipient; entries with an
+        'error' key were not written.
+    """
+    image_optimizer.configure(settings.image_optimize_dir, settings.image_max_width, settings.image_quality)
+    entries = []
+    for recipient in recipients:
+        # numpy ints -> plain ints so the key survives the JSON manifest
+        key = recipient.Index.item() if hasattr(recipient.Index, 'item') else recipient.Index
+        entry = {'key': key, 'email': recipient.email, 'template': recipient.template_file}
+        template = template_handler.get_compiled_template(settings.template_folder, recipient.template_file)
+        if template is None:
+            entry['error'] = "could not load template"
+            entries.append(entry)
+            continue
+        try:
+            subject, body, image_to_embed = template_handler.render_recipient(
+                template, recipient, settings.your_name, settings.your_phone_number,
+                settings.sender_email, settings.your_city_and_state, settings.image_folder
+            )
+            msg = email_sender.build_message(
+                settings.sender_email, recipient.email, subject, body,
+                attachment_paths=settings.attachment_paths,
+                inline_image_path=image_to_embed
+            )
+            file_name = _message_file_name(recipient.Index)
+            tmp_path = os.path.join(out_dir, file_name + '.tmp')
+            with open(tmp_path, 'wb') as f:
+                # CRLF line endings, as they go over the wire
+                f.write(msg.as_bytes(policy=msg.policy.clone(linesep='\r\n')))
+            os.replace(tmp_path, os.path.join(out_dir, file_name))
+            entry['file'] = file_name
+        except Exception as e:
+            entry['error'] = str(e)
+        entries.append(entry)
+    return entries
+
+
+def render_campaign(df, out_dir, settings, workers=None, chunk_size=CHUNK_SIZE):
+    """
+    Renders every pending row to '<out_dir>/row-<index>.eml' using a process
+    pool, and writes '<out_dir>/manifest.jsonl' listing what was rendered.
+
+    Returns:
+        int: Number of messages written.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    pending = excel_handler.pending_mask(df)
+    prepared = template_handler.prepare_recipients(df[pending])
+
+    recipients = []
+    for row in prepared.itertuples(name='Recipient'):
+        template_file = row.template_file
+        if pd.isna(template_file) or not str(template_file).strip():
+            print(f"  [SKIPPED] No template file specified for {row.name}.")
+            continue
+        recipients.append(_Recipient(*row))
+
+    chunks = [recipients[start:start + chunk_size] for start in range(0, len(recipients), chunk_size)]
+    print(f"Rendering {len(recipients)} emails into '{out_dir}'...")
+
+    written = 0
+    manifest_path = os.path.join(out_dir, MANIFEST_FILE)
+    with open(manifest_path, 'w', encoding='utf-8') as manifest, \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+        for entries in pool.map(render_chunk, [out_dir] * len(chunks), [settings] * len(chunks), chunks):
+            for entry in entries:
+                if 'error' in entry:
+                    print(f"  [SKIPPED] Could not render email for {entry['email']}: {entry['error']}")
+                    continue
+                manifest.write(json.dumps(entry, default=str) + '\n')
+                written += 1
+
+    print(f"Rendered {written} emails. Manifest: '{manifest_path}'.")
+    return written
+
+
+def iter_rendered_jobs(out_dir, df):
+    """
+    Yields a SendJob per message in a render_campaign output directory.
+
+    Messages whose row has been sent since rendering, or whose row no longer
+    has the same email address (the sheet was edited), are skipped.
+    """
+    manifest_path = os.path.join(out_dir, MANIFEST_FILE)
+    pending = excel_handler.pending_mask(df)
+    with open(manifest_path, 'r', encoding='utf-8') as manifest:
+        for line in manifest:
+            entry = json.loads(line)
+            key = entry['key']
+            if key not in df.index or str(df.at[key, 'Email']).strip() != str(entry['email']).strip():
+                print(f"  [SKIPPED] Row {key} changed since rendering; re-render to send to {entry['email']}.")
+                continue
+            if not pending[key]:
+                continue
+            yield send_pool.SendJob(
+                key=key,
+                recipient_email=entry['email'],
+                subject=None,
+                body=None,
+                attachment_paths=None,
+                inline_image_path=None,
+                message_file=os.path.join(out_dir, entry['file']),
+                template_file=entry['template']
+            )
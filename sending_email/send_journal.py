@@ -0,0 +1,182 @@
+import sqlite3
+import time
+
+import pandas as pd
+
+from sending_email import excel_handler
+
+
+def _recipient_key(email, template_file):
+    """Rows are matched by (email, template) so the journal survives re-sorted or edited sheets."""
+    return (str(email).strip().lower(), str(template_file).strip())
+
+
+class SendJournal:
+    """
+    Append-only log of send outcomes, written as each email goes out.
+
+    Backed by SQLite in WAL mode with synchronous=FULL, so every recorded
+    send is on disk before record() returns. A crash mid-run loses nothing:
+    on the next start, merge_into() puts the 'Sent' marks back into the
+    DataFrame and the Excel file is rewritten once from there.
+
+    Args:
+        path (str): Path of the journal database file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # Several sender processes may share one journal (see sharding.py)
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=FULL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS sends (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                row_key TEXT,
+                email TEXT NOT NULL,
+                template TEXT,
+                status TEXT NOT NULL,
+                error TEXT,
+                sent_at REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_sends_recipient ON sends (lower(email), template)")
+        # Follow-up queries: "who got template X before time T" is a range scan on this
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_sends_due ON sends (template, status, sent_at)")
+        # Addresses that answered (any template), copied from the sheet's 'Response' marks
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                email TEXT PRIMARY KEY,
+                noted_at REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+    def record(self, row_key, email, template_file, status, error=None):
+        """
+        Appends one send outcome and commits it immediately.
+
+        Args:
+            row_key: The row's index in the sheet (informational only).
+            email (str): Recipient address.
+            template_file (str): Template the email was rendered from.
+            status (str): 'Sent' or 'Failed'.
+            error (str or None): Error message for failed sends.
+        """
+        self.conn.execute(
+            "INSERT INTO sends (row_key, email, template, status, error, sent_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (str(row_key), str(email).strip(), str(template_file).strip(), status,
+             None if error is None else str(error), time.time())
+        )
+        self.conn.commit()
+
+    def sent_keys(self):
+        """Returns the set of (email, template) keys that have been sent successfully."""
+        rows = self.conn.execute("SELECT DISTINCT email, template FROM sends WHERE status = 'Sent'")
+        return {_recipient_key(email, template) for email, template in rows}
+
+    def merge_into(self, df, sent=None):
+        """
+        Marks every row the journal has a successful send for as 'Sent'.
+        Of rows repeating one (email, template), only the first is marked,
+        and none if another of them is already marked.
+
+        Args:
+            df (pd.DataFrame): The sheet, or one chunk of it.
+            sent (set or None): sent_keys(), if already read (saves a
+                query per chunk when streaming).
+
+        Returns:
+            int: Number of rows that were changed.
+        """
+        if 'Email' not in df.columns or 'Template File' not in df.columns:
+            return 0
+        if sent is None:
+            sent = self.sent_keys()
+        if not sent:
+            return 0
+
+        keys = pd.MultiIndex.from_arrays([
+            df['Email'].fillna('').astype(str).str.strip().str.lower(),
+            df['Template File'].fillna('').astype(str).str.strip()
+        ])
+        status = df['Sent or Not'] if 'Sent or Not' in df.columns else pd.Series('', index=df.index)
+        already = status.fillna('').astype(str).str.strip().str.lower().isin(['sent', 'response'])
+        # Only the row that was actually sent: check_recipients() sends the first
+        # pending row of each (email, template) and skips its duplicates
+        marked_keys = pd.Series(keys.isin(keys[already.to_numpy()]), index=df.index)
+        first_pending = pd.Series(False, index=df.index)
+        first_pending[~already] = ~keys[~already.to_numpy()].duplicated(keep='first')
+        to_mark = pd.Series(keys.isin(list(sent)), index=df.index) & first_pending & ~marked_keys
+
+        if to_mark.any():
+            df.loc[to_mark, 'Sent or Not'] = 'Sent'
+        return int(to_mark.sum())
+
+    def record_responses(self, emails):
+        """
+        Notes addresses that have responded, so follow_ups_due() skips them.
+
+        Returns:
+            int: Number of addresses that weren't known yet.
+        """
+        before = self.conn.total_changes
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO responses (email, noted_at) VALUES (?, ?)",
+            ((str(email).strip().lower(), time.time()) for email in emails)
+        )
+        self.conn.commit()
+        return self.conn.total_changes - before
+
+    def follow_ups_due(self, template_file, follow_up_template, older_than_days):
+        """
+        Finds who should get a follow-up: addresses sent 'template_file' at
+        least 'older_than_days' ago that haven't responded, haven't been sent
+        'template_file' again since, and haven't had 'follow_up_template' yet.
+
+        Runs on the indexes only, so it stays fast as the journal grows.
+
+        Returns:
+            dict: {lowercased email: time of the last 'template_file' send}.
+        """
+        cutoff = time.time() - older_than_days * 86400
+        _, template = _recipient_key('', template_file)
+        _, follow_up = _recipient_key('', follow_up_template)
+        # The per-recipient checks must look up one address, never scan a whole template
+        rows = self.conn.execute("""
+            SELECT lower(s.email), MAX(s.sent_at) FROM sends s
+            WHERE s.template = ? AND s.status = 'Sent' AND s.sent_at <= ?
+              AND NOT EXISTS (SELECT 1 FROM responses r WHERE r.email = lower(s.email))
+              AND NOT EXISTS (
+                  SELECT 1 FROM sends n INDEXED BY idx_sends_recipient
+                  WHERE lower(n.email) = lower(s.email) AND n.template = ? AND n.status = 'Sent' AND n.sent_at > ?
+              )
+              AND NOT EXISTS (
+                  SELECT 1 FROM sends f INDEXED BY idx_sends_recipient
+                  WHERE lower(f.email) = lower(s.email) AND f.template = ? AND f.status = 'Sent'
+              )
+            GROUP BY lower(s.email)
+        """, (template, cutoff, template, cutoff, follow_up))
+        return dict(rows)
+
+    def close(self):
+        self.conn.close()
+
+
+def compact(journal, excel_file, backend='excel', cache_dir=excel_handler.DEFAULT_CACHE_DIR):
+    """
+    Folds the journal into the recipient store in a single write.
+
+    Returns:
+        int or None: Number of rows updated, or None if the workbook couldn't be read.
+    """
+    df = excel_handler.load_recipients(excel_file, backend, cache_dir)
+    if df is None:
+        return None
+    merged = journal.merge_into(df)
+    if merged:
+        excel_handler.save_recipients(df, excel_file, backend, cache_dir)
+    else:
+        print(f"'{excel_file}' is already up to date with the send journal.")
+    return merged
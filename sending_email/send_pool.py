@@ -0,0 +1,432 @@
+import heapq
+import itertools
+import queue
+import random
+import smtplib
+import threading
+import time
+from collections import Counter, OrderedDict, deque, namedtuple
+
+from sending_email import email_sender
+from sending_email import metrics
+
+# One unit of work for the pool. 'key' is whatever the caller uses to find the
+# row again (the DataFrame index in main.py). If 'message_file' is set, the
+# pre-rendered .eml file is sent as-is and the other content fields are ignored.
+# 'template_file' is the row's template, for the journal and send claims.
+SendJob = namedtuple('SendJob', [
+    'key', 'recipient_email', 'subject', 'body',
+    'attachment_paths', 'inline_image_path', 'message_file', 'template_file'
+], defaults=[None, None])
+
+# What the pool hands back for every job it was given.
+SendResult = namedtuple('SendResult', ['job', 'success', 'error', 'attempts'])
+
+# Sentinel the feeder thread posts once every job has been queued.
+_FeedDone = namedtuple('_FeedDone', ['total'])
+
+DEFAULT_RETRY_BASE_SECONDS = 30
+DEFAULT_RETRY_MAX_SECONDS = 600
+
+
+class RateLimiter:
+    """
+    Sliding-window rate limiter shared by all worker threads.
+
+    Args:
+        per_second (int or None): Max sends in any 1-second window.
+        per_minute (int or None): Max sends in any 60-second window.
+    """
+
+    def __init__(self, per_second=None, per_minute=None):
+        self._windows = []
+        if per_second:
+            self._windows.append((per_second, 1.0, deque()))
+        if per_minute:
+            self._windows.append((per_minute, 60.0, deque()))
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        """
+        Takes a send slot if one is free right now.
+
+        Returns:
+            float: 0 if the send may go ahead, otherwise seconds until it may.
+        """
+        with self._lock:
+            now = time.monotonic()
+            wait = 0.0
+            for limit, period, stamps in self._windows:
+                while stamps and now - stamps[0] >= period:
+                    stamps.popleft()
+                if len(stamps) >= limit:
+                    wait = max(wait, period - (now - stamps[0]))
+            if wait <= 0:
+                for _, _, stamps in self._windows:
+                    stamps.append(now)
+                return 0.0
+            return wait
+
+    def acquire(self):
+        """Blocks until a send is allowed under every configured window."""
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+
+def _is_connection_drop(error):
+    """True if the error means the connection is gone rather than the message being rejected."""
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    # 421 = service not available, closing transmission channel. smtplib
+    # raises it as SMTPRecipientsRefused when it comes in reply to RCPT TO.
+    if email_sender.smtp_reply_code(error) == 421:
+        return True
+    if isinstance(error, smtplib.SMTPException):
+        return False
+    return isinstance(error, OSError)
+
+
+def is_transient(error):
+    """
+    True for a 4xx reply (mailbox busy, greylisting, 'try again later'):
+    the same message may go through later. 5xx replies and errors without
+    a reply code are permanent.
+    """
+    code = email_sender.smtp_reply_code(error)
+    return code is not None and 400 <= code < 500
+
+
+def backoff_delay(attempt, base=DEFAULT_RETRY_BASE_SECONDS, maximum=DEFAULT_RETRY_MAX_SECONDS):
+    """
+    Seconds to wait before attempt 'attempt + 1': base, 2x base, 4x base...
+    capped at 'maximum', with +-20% jitter so retries don't arrive together.
+    """
+    delay = min(maximum, base * 2 ** max(0, attempt - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+def recipient_domain(email):
+    return str(email).rsplit('@', 1)[-1].strip().lower()
+
+
+class SendScheduler:
+    """
+    Work queue between the feeder and the worker threads.
+
+    Jobs are handed out round-robin across recipient domains, and a domain
+    is skipped while it's at its concurrency limit, over its rate limit or
+    paused after a temporary refusal, so one slow or throttling domain never
+    holds up the others. Jobs that failed with a 4xx wait on a heap until
+    their retry time.
+
+    Args:
+        max_in_flight (int): Max jobs queued or being sent (deferred jobs
+            don't count, so a backed-off domain can't starve the feeder).
+        domain_max_in_flight (int or None): Default concurrent sends per domain.
+        domain_per_minute (int or None): Default sends per domain per minute.
+        domain_limits (dict or None): Per-domain overrides, e.g.
+            {'gmail.com': {'max_in_flight': 3, 'per_minute': 60}}.
+    """
+
+    def __init__(self, max_in_flight, domain_max_in_flight=None, domain_per_minute=None, domain_limits=None):
+        self.max_in_flight = max_in_flight
+        self.domain_max_in_flight = domain_max_in_flight
+        self.domain_per_minute = domain_per_minute
+        self.domain_limits = {domain.lower(): limits for domain, limits in (domain_limits or {}).items()}
+        self._ready = OrderedDict()     # domain -> deque of (job, attempt), in round-robin order
+        self._ready_count = 0
+        self._deferred = []             # heap of (due, seq, job, attempt)
+        self._seq = itertools.count()
+        self._active = Counter()        # domain -> jobs handed to a worker and not done yet
+        self._paused_until = {}
+        self._rates = {}
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def _limit(self, domain, name, default):
+        return self.domain_limits.get(domain, {}).get(name, default)
+
+    def _rate_limiter(self, domain):
+        limiter = self._rates.get(domain)
+        if limiter is None:
+            limiter = self._rates[domain] = RateLimiter(
+                per_minute=self._limit(domain, 'per_minute', self.domain_per_minute)
+            )
+        return limiter
+
+    def _domain_wait(self, domain, now):
+        """0 if the domain can take a send now, seconds until it can, or None (wait for a done())."""
+        max_in_flight = self._limit(domain, 'max_in_flight', self.domain_max_in_flight)
+        if max_in_flight and self._active[domain] >= max_in_flight:
+            return None
+        paused_until = self._paused_until.get(domain, 0)
+        if paused_until > now:
+            return paused_until - now
+        # Last, because a 0 here uses up one of the domain's sends
+        return self._rate_limiter(domain).try_acquire()
+
+    def _add_ready(self, job, attempt):
+        self._ready.setdefault(recipient_domain(job.recipient_email), deque()).append((job, attempt))
+        self._ready_count += 1
+
+    def put(self, job, attempt):
+        """Queues a job to be sent as soon as its domain allows."""
+        with self._cond:
+            self._add_ready(job, attempt)
+            self._cond.notify_all()
+
+    def defer(self, job, attempt, delay):
+        """Queues a job to be sent no earlier than 'delay' seconds from now."""
+        with self._cond:
+            heapq.heappush(self._deferred, (time.monotonic() + delay, next(self._seq), job, attempt))
+            self._cond.notify_all()
+
+    def pause_domain(self, domain, seconds):
+        """Holds back every send to 'domain' for 'seconds' (the server asked us to slow down)."""
+        with self._cond:
+            until = time.monotonic() + seconds
+            self._paused_until[domain] = max(self._paused_until.get(domain, 0), until)
+
+    def get(self):
+        """
+        Blocks until some job may be sent and hands it out.
+
+        Returns:
+            (SendJob, int) or None: (job, attempt), or None once closed.
+        """
+        with self._cond:
+            while True:
+                if self._closed:
+                    return None
+                now = time.monotonic()
+                while self._deferred and self._deferred[0][0] <= now:
+                    _, _, job, attempt = heapq.heappop(self._deferred)
+                    self._add_ready(job, attempt)
+
+                timeout = self._deferred[0][0] - now if self._deferred else None
+                for domain in list(self._ready):
+                    wait = self._domain_wait(domain, now)
+                    if wait == 0:
+                        jobs = self._ready[domain]
+                        job, attempt = jobs.popleft()
+                        if jobs:
+                            self._ready.move_to_end(domain)
+                        else:
+                            del self._ready[domain]
+                        self._ready_count -= 1
+                        self._active[domain] += 1
+                        return job, attempt
+                    if wait is not None:
+                        timeout = wait if timeout is None else min(timeout, wait)
+                self._cond.wait(timeout)
+
+    def done(self, job):
+        """Called by the worker once it's finished with a job it got from get()."""
+        with self._cond:
+            self._active[recipient_domain(job.recipient_email)] -= 1
+            self._cond.notify_all()
+
+    def wait_for_room(self, stop):
+        """
+        Blocks the feeder while 'max_in_flight' jobs are queued or being sent.
+
+        Returns:
+            bool: False if 'stop' was set while waiting.
+        """
+        with self._cond:
+            while self._ready_count + sum(self._active.values()) >= self.max_in_flight:
+                if stop.is_set():
+                    return False
+                self._cond.wait(0.1)
+        return not stop.is_set()
+
+    def close(self):
+        """Makes every blocked and future get() return None."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+
+class SmtpSenderPool:
+    """
+    Sends messages over a pool of logged-in SMTP connections.
+
+    Each worker thread owns one connection (created with 'connect') and takes
+    jobs from a SendScheduler. If a connection drops, the worker logs in again
+    and the message goes back to the scheduler so any worker can pick it up.
+    A temporary (4xx) refusal pauses the recipient's domain and retries the
+    message later with exponential backoff; a permanent (5xx) one fails it.
+
+    Args:
+        connect (callable): Zero-argument function returning a logged-in
+            server object, or None if the login failed.
+        sender_email (str): The 'From' address for every message.
+        size (int): Number of connections / worker threads.
+        rate_limiter (RateLimiter or None): Global send rate limit.
+        max_attempts (int): Attempts per message before giving up.
+        max_in_flight (int or None): Max jobs queued ahead of the workers.
+            Keeps memory flat when 'jobs' is a large generator.
+        retry_base_seconds (float): Wait before the first 4xx retry; doubles
+            with each attempt, up to 'retry_max_seconds'.
+        retry_max_seconds (float): Longest wait between retries.
+        domain_max_in_flight (int or None): Concurrent sends per recipient domain.
+        domain_per_minute (int or None): Sends per recipient domain per minute.
+        domain_limits (dict or None): Per-domain overrides of the two above.
+    """
+
+    def __init__(self, connect, sender_email, size=3, rate_limiter=None, max_attempts=3, max_in_flight=None,
+                 retry_base_seconds=DEFAULT_RETRY_BASE_SECONDS, retry_max_seconds=DEFAULT_RETRY_MAX_SECONDS,
+                 domain_max_in_flight=None, domain_per_minute=None, domain_limits=None):
+        self.connect = connect
+        self.sender_email = sender_email
+        self.size = max(1, int(size))
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.max_attempts = max_attempts
+        self.max_in_flight = max_in_flight or self.size * 4
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.domain_max_in_flight = domain_max_in_flight
+        self.domain_per_minute = domain_per_minute
+        self.domain_limits = domain_limits
+
+    def send_all(self, jobs):
+        """
+        Sends every job and yields a SendResult for each one as it finishes.
+
+        Results are yielded in completion order, not submission order. The
+        generator runs in the caller's thread, so it's safe to update a
+        DataFrame from the loop body.
+        """
+        scheduler = SendScheduler(self.max_in_flight, self.domain_max_in_flight,
+                                  self.domain_per_minute, self.domain_limits)
+        results = queue.Queue()
+        stop = threading.Event()
+
+        feeder = threading.Thread(target=self._feed, args=(jobs, scheduler, results, stop), daemon=True)
+        workers = [
+            threading.Thread(target=self._work, args=(scheduler, results, stop), daemon=True)
+            for _ in range(self.size)
+        ]
+        feeder.start()
+        for worker in workers:
+            worker.start()
+
+        try:
+            total = None
+            received = 0
+            while total is None or received < total:
+                item = results.get()
+                if isinstance(item, _FeedDone):
+                    total = item.total
+                    continue
+                if isinstance(item, BaseException):
+                    raise item
+                received += 1
+                yield item
+        finally:
+            stop.set()
+            scheduler.close()
+            for worker in workers:
+                worker.join()
+
+    def _feed(self, jobs, scheduler, results, stop):
+        total = 0
+        try:
+            for job in jobs:
+                if not scheduler.wait_for_room(stop):
+                    return
+                scheduler.put(job, 1)
+                total += 1
+        except Exception as e:
+            # Surface errors from the job generator in the caller's thread
+            results.put(e)
+            return
+        results.put(_FeedDone(total))
+
+    def _work(self, scheduler, results, stop):
+        server = None
+        try:
+            while True:
+                item = scheduler.get()
+                if item is None or stop.is_set():
+                    return
+                job, attempt = item
+                try:
+                    server = self._send(server, scheduler, results, job, attempt)
+                finally:
+                    scheduler.done(job)
+        finally:
+            if server is not None:
+                _close_quietly(server)
+
+    def _send(self, server, scheduler, results, job, attempt):
+        """Sends one job; returns the connection to use for the next one (None after a drop)."""
+        if server is None:
+            server = self.connect()
+            if server is None:
+                self._retry_or_fail(scheduler, results, job, attempt, ConnectionError("could not connect to SMTP server"))
+                # Don't spin on a server that is refusing us
+                time.sleep(min(2 ** attempt, 30))
+                return None
+
+        try:
+            if job.message_file:
+                with open(job.message_file, 'rb') as f:
+                    msg = f.read()
+            else:
+                msg = email_sender.build_message(
+                    self.sender_email, job.recipient_email, job.subject, job.body,
+                    attachment_paths=job.attachment_paths,
+                    inline_image_path=job.inline_image_path
+                )
+        except Exception as e:
+            results.put(SendResult(job, False, e, attempt))
+            return server
+
+        # Time spent here is our own throttle, not the server's
+        with metrics.registry.timer('rate_limit_wait_seconds'):
+            self.rate_limiter.acquire()
+        try:
+            with metrics.registry.timer('smtp_seconds'):
+                if job.message_file:
+                    # Pre-built bytes: no parsing or re-serializing on the send path
+                    server.sendmail(self.sender_email, [job.recipient_email], msg)
+                else:
+                    server.send_message(msg)
+            results.put(SendResult(job, True, None, attempt))
+        except Exception as e:
+            if _is_connection_drop(e):
+                print(f"  [RECONNECT] Connection dropped while sending to {job.recipient_email}: {e}")
+                metrics.registry.inc('smtp_reconnects_total', {'code': email_sender.smtp_error_code(e)})
+                _close_quietly(server)
+                self._retry_or_fail(scheduler, results, job, attempt, e)
+                return None
+            if is_transient(e) and attempt < self.max_attempts:
+                delay = backoff_delay(attempt, self.retry_base_seconds, self.retry_max_seconds)
+                domain = recipient_domain(job.recipient_email)
+                # The server is pushing back: hold the whole domain, not just this message
+                scheduler.pause_domain(domain, min(delay, self.retry_base_seconds))
+                print(f"  [DEFERRED] {job.recipient_email}: {e} (retrying in {delay:.0f}s)")
+                metrics.registry.inc('smtp_retries_total')
+                metrics.registry.inc('smtp_deferred_total', {'code': email_sender.smtp_error_code(e)})
+                scheduler.defer(job, attempt + 1, delay)
+            else:
+                results.put(SendResult(job, False, e, attempt))
+        return server
+
+    def _retry_or_fail(self, scheduler, results, job, attempt, error):
+        if attempt < self.max_attempts:
+            metrics.registry.inc('smtp_retries_total')
+            scheduler.put(job, attempt + 1)
+        else:
+            results.put(SendResult(job, False, error, attempt))
+
+
+def _close_quietly(server):
+    try:
+        server.quit()
+    except Exception:
+        pass
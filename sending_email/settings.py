@@ -0,0 +1,157 @@
+import json
+import os
+
+# Settings are looked up in this order, later ones winning:
+#   1. the literals in config.py
+#   2. a config file (JSON, or TOML on Python 3.11+)
+#   3. environment variables named ENV_PREFIX + setting, e.g. EMAILER_SMTP_PORT=587
+#   4. '--set NAME=VALUE' on the command line
+ENV_PREFIX = 'EMAILER_'
+ENV_CONFIG_FILE = 'EMAILER_CONFIG'
+DEFAULT_CONFIG_FILES = ('emailer.toml', 'emailer.json')
+
+
+def setting_names(config):
+    """Every overridable setting: the upper-case names defined in config.py."""
+    return sorted(name for name in vars(config) if name.isupper() and not name.startswith('_'))
+
+
+def parse_value(text, default):
+    """
+    Turns a string from the environment or command line into the type of the
+    setting's default: 'true'/'false' for booleans, numbers for numbers, JSON
+    for lists and dicts, 'none' for None. Anything else stays a string.
+    """
+    stripped = text.strip()
+    if stripped.lower() in ('none', 'null'):
+        return None
+    if isinstance(default, bool):
+        if stripped.lower() in ('1', 'true', 'yes', 'on'):
+            return True
+        if stripped.lower() in ('0', 'false', 'no', 'off'):
+            return False
+        raise ValueError(f"expected true/false, got '{text}'")
+    if isinstance(default, int):
+        # An int default doesn't make the setting integer-only (e.g. MAX_EMAILS_PER_SECOND = 0.5)
+        try:
+            return int(stripped)
+        except ValueError:
+            return float(stripped)
+    if isinstance(default, float):
+        return float(stripped)
+    if isinstance(default, (list, dict)) or (default is None and stripped[:1] in ('[', '{')):
+        return json.loads(stripped)
+    if default is None:
+        # No type to go by (e.g. METRICS_FILE = None): numbers stay numbers
+        for convert in (int, float):
+            try:
+                return convert(stripped)
+            except ValueError:
+                pass
+    return text
+
+
+def load_config_file(path):
+    """
+    Reads a JSON or TOML settings file into a dict.
+
+    Returns:
+        dict or None: None if the file can't be read or parsed.
+    """
+    try:
+        if path.lower().endswith('.toml'):
+            try:
+                import tomllib
+            except ImportError:
+                print(f"Error: Reading '{path}' needs Python 3.11+ (tomllib). Use a .json file instead.")
+                return None
+            with open(path, 'rb') as f:
+                return tomllib.load(f)
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Error: Could not read config file '{path}': {e}")
+        return None
+
+
+def apply(config, config_file=None, environ=None, pairs=()):
+    """
+    Layers the config file, environment and '--set' pairs over config.py.
+    Values are set on the config module itself, so every 'config.NAME'
+    lookup in the program sees them.
+
+    Args:
+        config (module): The sending_email.config module.
+        config_file (str or None): Explicit file; otherwise $EMAILER_CONFIG,
+            then the first of DEFAULT_CONFIG_FILES that exists.
+        environ (dict or None): Defaults to os.environ.
+        pairs (iterable): 'NAME=VALUE' strings from the command line.
+
+    Returns:
+        dict or None: {setting: source} for every overridden setting, or
+        None if something couldn't be applied.
+    """
+    environ = os.environ if environ is None else environ
+    names = set(setting_names(config))
+    sources = {}
+
+    if config_file is None:
+        config_file = environ.get(ENV_CONFIG_FILE)
+    if config_file is None:
+        config_file = next((path for path in DEFAULT_CONFIG_FILES if os.path.exists(path)), None)
+    if config_file:
+        values = load_config_file(config_file)
+        if values is None:
+            return None
+        for name, value in values.items():
+            name = name.upper()
+            if name not in names:
+                print(f"Error: Unknown setting '{name}' in '{config_file}'.")
+                return None
+            setattr(config, name, value)
+            sources[name] = config_file
+
+    for key, text in environ.items():
+        if not key.startswith(ENV_PREFIX) or key == ENV_CONFIG_FILE:
+            continue
+        name = key[len(ENV_PREFIX):]
+        if name not in names:
+            continue
+        try:
+            setattr(config, name, parse_value(text, getattr(config, name)))
+        except ValueError as e:
+            print(f"Error: Bad value for {key}: {e}")
+            return None
+        sources[name] = f"${key}"
+
+    for pair in pairs:
+        name, sep, text = pair.partition('=')
+        name = name.strip().upper()
+        if not sep or name not in names:
+            print(f"Error: '--set {pair}' must be NAME=VALUE with NAME one of the settings in config.py.")
+            return None
+        try:
+            setattr(config, name, parse_value(text, getattr(config, name)))
+        except ValueError as e:
+            print(f"Error: Bad value for {name}: {e}")
+            return None
+        sources[name] = '--set'
+
+    return sources
+
+
+def apply_once(config, config_file=None, environ=None, pairs=()):
+    """
+    apply(), unless it already ran in this process: cli.py applies the
+    layers (with its --config / --set) before handing over to main.main(),
+    which must not apply them again over the '--set' values.
+
+    Returns:
+        dict or None: As apply(), from the first call.
+    """
+    sources = getattr(config, '_applied_sources', None)
+    if sources is None:
+        sources = apply(config, config_file, environ, pairs)
+        if sources is not None:
+            config._applied_sources = sources
+    return sources
@@ -0,0 +1,185 @@
+import os
+import socket
+import sqlite3
+import threading
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from sending_email import send_journal
+
+SHARD_MODES = ('email', 'row')
+DEFAULT_LEASE_SECONDS = 600
+
+
+def parse_shard_spec(spec):
+    """
+    Parses a shard spec like '0/3' (shard 0 of 3).
+
+    Returns:
+        (int, int) or None: (index, count), or None if the spec is invalid.
+    """
+    try:
+        index, count = (int(part) for part in str(spec).split('/'))
+    except ValueError:
+        print(f"Error: Invalid shard '{spec}'. Use INDEX/COUNT, e.g. 0/3.")
+        return None
+    if count < 1 or not 0 <= index < count:
+        print(f"Error: Invalid shard '{spec}'. INDEX must be between 0 and COUNT-1.")
+        return None
+    return index, count
+
+
+def shard_mask(df, index, count, mode='email', offset=0):
+    """
+    Marks the rows that belong to one shard.
+
+    'email' hashes the address, so a recipient stays on the same shard when
+    the sheet is re-sorted or rows are added; 'row' splits by position.
+    'offset' is the position of df's first row when df is one chunk of the sheet.
+
+    Returns:
+        pd.Series: Boolean mask aligned with df.
+    """
+    if mode == 'row':
+        return pd.Series((np.arange(len(df)) + offset) % count == index, index=df.index)
+    emails = df['Email'].fillna('').astype(str).str.strip().str.lower()
+    # crc32 rather than hash(): it has to agree across processes and hosts
+    buckets = emails.map(lambda email: zlib.crc32(email.encode('utf-8')) % count)
+    return buckets == index
+
+
+def default_owner(index=None):
+    """Identifies this process in the claim store: 'host:pid[:shard]'."""
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    return owner if index is None else f"{owner}:shard{index}"
+
+
+class ClaimStore:
+    """
+    Row claims shared by every sender process working on one workbook.
+
+    Claims live next to the 'sends' table in the send journal database, so a
+    claim is refused both while another process holds a live lease on the
+    recipient and once the journal has a successful send for it. A process
+    that dies stops renewing its leases; after 'lease_seconds' its rows can
+    be claimed again.
+
+    Safe to use from several threads (the pool's feeder thread claims, the
+    main thread releases).
+
+    Args:
+        path (str): Path of the send journal database.
+        owner (str): This process's id (see default_owner()).
+        lease_seconds (float): How long a claim lasts without renewal.
+    """
+
+    def __init__(self, path, owner, lease_seconds=DEFAULT_LEASE_SECONDS):
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        # Autocommit mode, so claim() can open its own IMMEDIATE transaction
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS claims (
+                email TEXT NOT NULL,
+                template TEXT NOT NULL,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (email, template)
+            )
+        """)
+
+    def claim(self, email, template_file):
+        """
+        Tries to take the lease on one recipient.
+
+        Returns:
+            bool: True if this process now owns the row and should send it.
+        """
+        email, template = send_journal._recipient_key(email, template_file)
+        now = time.time()
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                sent = self.conn.execute(
+                    "SELECT 1 FROM sends WHERE lower(email) = ? AND template = ? AND status = 'Sent' LIMIT 1",
+                    (email, template)
+                ).fetchone()
+                if sent:
+                    self.conn.execute("COMMIT")
+                    return False
+                cursor = self.conn.execute("""
+                    INSERT INTO claims (email, template, owner, expires_at) VALUES (?, ?, ?, ?)
+                    ON CONFLICT (email, template) DO UPDATE
+                        SET owner = excluded.owner, expires_at = excluded.expires_at
+                        WHERE claims.expires_at < ? OR claims.owner = excluded.owner
+                """, (email, template, self.owner, now + self.lease_seconds, now))
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return cursor.rowcount == 1
+
+    def release(self, email, template_file):
+        """Drops this process's claim on a recipient (after it was sent or failed)."""
+        email, template = send_journal._recipient_key(email, template_file)
+        with self._lock:
+            self.conn.execute(
+                "DELETE FROM claims WHERE email = ? AND template = ? AND owner = ?",
+                (email, template, self.owner)
+            )
+
+    def release_all(self):
+        """Drops every claim this process still holds (e.g. jobs that were never sent)."""
+        with self._lock:
+            self.conn.execute("DELETE FROM claims WHERE owner = ?", (self.owner,))
+
+    def renew(self):
+        """Extends the lease on every claim this process holds."""
+        with self._lock:
+            self.conn.execute(
+                "UPDATE claims SET expires_at = ? WHERE owner = ?",
+                (time.time() + self.lease_seconds, self.owner)
+            )
+
+    def claimed_jobs(self, jobs):
+        """Passes through only the jobs (SendJobs) this process managed to claim."""
+        for job in jobs:
+            if self.claim(job.recipient_email, job.template_file):
+                yield job
+            else:
+                print(f"  [SKIPPED] {job.recipient_email} is claimed or already sent by another sender.")
+
+    def close(self):
+        self.conn.close()
+
+
+class LeaseKeeper:
+    """
+    Background thread that renews a ClaimStore's leases every third of the
+    lease time, so claims only expire when this process is gone.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.store.lease_seconds / 3):
+            try:
+                self.store.renew()
+            except sqlite3.Error as e:
+                print(f"Error renewing send claims: {e}")
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
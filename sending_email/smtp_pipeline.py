@@ -0,0 +1,465 @@
+import asyncio
+import base64
+import queue
+import re
+import smtplib
+import socket
+import ssl
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sending_email import email_sender
+from sending_email import metrics
+from sending_email.send_pool import (
+    DEFAULT_RETRY_BASE_SECONDS, DEFAULT_RETRY_MAX_SECONDS, RateLimiter, SendResult, _FeedDone,
+    _is_connection_drop, backoff_delay, is_transient
+)
+
+DEFAULT_BATCH_SIZE = 20
+DEFAULT_KEEPALIVE_SECONDS = 30
+DEFAULT_TIMEOUT = 60
+
+# send_many() outcome for messages it never got to because the connection broke
+NOT_ATTEMPTED = object()
+
+_LINE_ENDINGS = re.compile(rb'\r\n|\r|\n')
+_LEADING_DOT = re.compile(rb'^\.', re.MULTILINE)
+
+
+def _dot_stuff(data):
+    """CRLF line endings and doubled leading dots, ready to follow DATA."""
+    data = _LEADING_DOT.sub(b'..', _LINE_ENDINGS.sub(b'\r\n', data))
+    if not data.endswith(b'\r\n'):
+        data += b'\r\n'
+    return data + b'.\r\n'
+
+
+def message_bytes(msg):
+    """Serializes an EmailMessage the way it goes over the wire (no Bcc, CRLF)."""
+    del msg['Bcc']
+    return msg.as_bytes(policy=msg.policy.clone(linesep='\r\n'))
+
+
+class PipelinedConnection:
+    """
+    One asyncio SMTP connection that uses ESMTP PIPELINING (RFC 2920).
+
+    For each message, MAIL FROM, RCPT TO and DATA go out in a single write,
+    and the next message's commands are written right after the previous
+    message's final '.', without waiting for its reply. A message costs about
+    one round trip instead of four. Servers that don't offer PIPELINING get
+    the plain one-command-at-a-time exchange. Every batch after the first
+    starts with an RSET, pipelined with its first message.
+
+    Args:
+        host (str), port (int): The SMTP server.
+        sender_email (str), password (str): Login; no AUTH if password is empty.
+        use_ssl (bool): Implicit TLS (port 465), or a plain connection that is
+            upgraded with STARTTLS when the server offers it. The password is
+            never sent over a connection that isn't encrypted.
+        timeout (float): Seconds to wait for any single reply.
+    """
+
+    def __init__(self, host, port, sender_email, password, use_ssl=True, timeout=DEFAULT_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.sender_email = sender_email
+        self.password = password
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+        self.extensions = set()
+        self.encrypted = False
+        self.batches_sent = 0
+        self.reader = None
+        self.writer = None
+        self.last_used = time.monotonic()
+
+    @property
+    def pipelining(self):
+        return 'PIPELINING' in self.extensions
+
+    async def _reply(self):
+        """Reads one (possibly multi-line) reply and returns (code, text)."""
+        lines = []
+        while True:
+            try:
+                line = await asyncio.wait_for(self.reader.readline(), self.timeout)
+            except asyncio.TimeoutError:
+                raise smtplib.SMTPServerDisconnected("timed out waiting for the SMTP server")
+            if not line:
+                raise smtplib.SMTPServerDisconnected("connection closed by the SMTP server")
+            lines.append(line[4:].strip().decode('utf-8', 'replace'))
+            if line[3:4] != b'-':
+                break
+        try:
+            code = int(line[:3])
+        except ValueError:
+            raise smtplib.SMTPServerDisconnected(f"malformed reply: {line!r}")
+        if code == 421:
+            raise smtplib.SMTPResponseException(code, '\n'.join(lines))
+        return code, '\n'.join(lines)
+
+    async def _command(self, line):
+        self.writer.write(line.encode('utf-8') + b'\r\n')
+        await self.writer.drain()
+        return await self._reply()
+
+    async def _ehlo(self):
+        code, text = await self._command('EHLO localhost')
+        if code != 250:
+            raise smtplib.SMTPHeloError(code, text)
+        self.extensions = {line.split()[0].upper() for line in text.splitlines()[1:] if line.split()}
+
+    async def open(self):
+        """
+        Connects, says EHLO, switches to TLS if needed and logs in.
+        Raises an smtplib exception on failure.
+        """
+        context = ssl.create_default_context() if self.use_ssl else None
+        try:
+            self.reader, self.writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port, ssl=context), self.timeout
+            )
+        except asyncio.TimeoutError:
+            raise smtplib.SMTPServerDisconnected(f"timed out connecting to {self.host}:{self.port}")
+        sock = self.writer.get_extra_info('socket')
+        if sock is not None:
+            # Pipelined command groups are small writes behind unacknowledged
+            # data; with Nagle on they'd wait for the server's delayed ACK
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        code, text = await self._reply()
+        if code != 220:
+            raise smtplib.SMTPConnectError(code, text)
+        self.encrypted = self.use_ssl
+        await self._ehlo()
+
+        if not self.encrypted and 'STARTTLS' in self.extensions:
+            code, text = await self._command('STARTTLS')
+            if code != 220:
+                raise smtplib.SMTPResponseException(code, text)
+            await self.writer.start_tls(ssl.create_default_context(), server_hostname=self.host)
+            self.encrypted = True
+            # The server forgets everything said before the handshake (RFC 3207)
+            await self._ehlo()
+
+        if self.password:
+            if not self.encrypted:
+                raise smtplib.SMTPNotSupportedError(
+                    f"{self.host}:{self.port} offers no STARTTLS; refusing to send the password unencrypted"
+                )
+            token = base64.b64encode(f"\0{self.sender_email}\0{self.password}".encode('utf-8')).decode('ascii')
+            code, text = await self._command(f"AUTH PLAIN {token}")
+            if code != 235:
+                raise smtplib.SMTPAuthenticationError(code, text)
+        self.last_used = time.monotonic()
+
+    async def send_many(self, envelopes):
+        """
+        Sends several messages back to back.
+
+        Args:
+            envelopes (list): (recipients list, message bytes) per message.
+
+        Returns:
+            list: None for each delivered message, or the smtplib exception
+            that message failed with. If the connection breaks, the messages
+            in progress get the connection error and later ones NOT_ATTEMPTED.
+        """
+        outcomes = [None] * len(envelopes)
+        waiting_dot = None  # index of the message whose final '.' reply is still unread
+        current = 0
+        try:
+            for current, (recipients, data) in enumerate(envelopes):
+                commands = [f"MAIL FROM:<{self.sender_email}>"]
+                commands += [f"RCPT TO:<{recipient}>" for recipient in recipients]
+                commands.append("DATA")
+                reset = current == 0 and self.batches_sent > 0
+                if reset:
+                    # Clean transaction state between batches, at no extra round trip when pipelining
+                    commands.insert(0, "RSET")
+
+                if self.pipelining:
+                    self.writer.write(''.join(c + '\r\n' for c in commands).encode('utf-8'))
+                    await self.writer.drain()
+                    if waiting_dot is not None:
+                        code, text = await self._reply()
+                        if code != 250:
+                            outcomes[waiting_dot] = smtplib.SMTPDataError(code, text)
+                        waiting_dot = None
+                    replies = [await self._reply() for _ in commands]
+                else:
+                    replies = []
+                    for command in commands:
+                        replies.append(await self._command(command))
+
+                if reset:
+                    code, text = replies.pop(0)
+                    if code != 250:
+                        raise smtplib.SMTPServerDisconnected(f"RSET refused: {code} {text}")
+                mail_reply, rcpt_replies, data_reply = replies[0], replies[1:-1], replies[-1]
+                error = None
+                if mail_reply[0] != 250:
+                    error = smtplib.SMTPSenderRefused(mail_reply[0], mail_reply[1], self.sender_email)
+                elif any(code not in (250, 251) for code, _ in rcpt_replies):
+                    error = smtplib.SMTPRecipientsRefused({
+                        recipient: reply for recipient, reply in zip(recipients, rcpt_replies)
+                        if reply[0] not in (250, 251)
+                    })
+                elif data_reply[0] != 354:
+                    error = smtplib.SMTPDataError(data_reply[0], data_reply[1])
+
+                if error is not None:
+                    outcomes[current] = error
+                    if data_reply[0] == 354:
+                        # The server wants a body anyway; send an empty one and ignore the reply
+                        self.writer.write(b'.\r\n')
+                        await self.writer.drain()
+                        await self._reply()
+                    await self._command('RSET')
+                    continue
+
+                self.writer.write(_dot_stuff(data))
+                await self.writer.drain()
+                if self.pipelining:
+                    waiting_dot = current
+                else:
+                    code, text = await self._reply()
+                    if code != 250:
+                        outcomes[current] = smtplib.SMTPDataError(code, text)
+
+            if waiting_dot is not None:
+                code, text = await self._reply()
+                if code != 250:
+                    outcomes[waiting_dot] = smtplib.SMTPDataError(code, text)
+        except (smtplib.SMTPException, OSError) as e:
+            if waiting_dot is not None:
+                outcomes[waiting_dot] = e
+            outcomes[current] = e
+            for i in range(current + 1, len(envelopes)):
+                outcomes[i] = NOT_ATTEMPTED
+            await self.close()
+        self.batches_sent += 1
+        self.last_used = time.monotonic()
+        return outcomes
+
+    async def noop(self):
+        """Keepalive. Returns False if the connection is gone."""
+        try:
+            code, _ = await self._command('NOOP')
+        except (smtplib.SMTPException, OSError):
+            await self.close()
+            return False
+        self.last_used = time.monotonic()
+        return code == 250
+
+    @property
+    def is_open(self):
+        return self.writer is not None and not self.writer.is_closing()
+
+    async def close(self, quit=False):
+        if self.writer is None:
+            return
+        try:
+            if quit and not self.writer.is_closing():
+                await asyncio.wait_for(self._command('QUIT'), 5)
+            self.writer.close()
+        except Exception:
+            pass
+        self.writer = self.reader = None
+
+
+class PipelinedSenderPool:
+    """
+    Drop-in alternative to send_pool.SmtpSenderPool that sends over a few
+    pipelined asyncio connections instead of one thread per connection.
+
+    Each connection takes up to 'batch_size' queued messages at a time and
+    sends them with send_many(). Idle connections get a NOOP every
+    'keepalive_seconds'; a 421 reply or timeout drops the connection, the
+    worker logs in again and the unsent messages go back on the queue.
+    Messages refused with a 4xx go back on the queue after an exponential
+    backoff. Per-domain limits are not applied on this transport.
+
+    send_all() has the same contract as SmtpSenderPool.send_all(): results
+    come back in completion order, in the caller's thread.
+    """
+
+    def __init__(self, host, port, sender_email, password, use_ssl=True, size=3,
+                 batch_size=DEFAULT_BATCH_SIZE, rate_limiter=None, max_attempts=3,
+                 keepalive_seconds=DEFAULT_KEEPALIVE_SECONDS, max_in_flight=None,
+                 retry_base_seconds=DEFAULT_RETRY_BASE_SECONDS, retry_max_seconds=DEFAULT_RETRY_MAX_SECONDS):
+        self.host = host
+        self.port = port
+        self.sender_email = sender_email
+        self.password = password
+        self.use_ssl = use_ssl
+        self.size = max(1, int(size))
+        self.batch_size = max(1, int(batch_size))
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.max_attempts = max_attempts
+        self.keepalive_seconds = keepalive_seconds
+        self.max_in_flight = max_in_flight or self.size * self.batch_size * 2
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+
+    def send_all(self, jobs):
+        results = queue.Queue()
+        stop = threading.Event()
+        thread = threading.Thread(target=lambda: asyncio.run(self._run(jobs, results, stop)), daemon=True)
+        thread.start()
+        try:
+            total = None
+            received = 0
+            while total is None or received < total:
+                item = results.get()
+                if isinstance(item, _FeedDone):
+                    total = item.total
+                    continue
+                if isinstance(item, BaseException):
+                    raise item
+                received += 1
+                yield item
+        finally:
+            stop.set()
+            thread.join()
+
+    # --- Event loop side ---
+
+    def _prepare(self, job):
+        """Returns the message bytes for a job. Runs on the helper thread."""
+        if job.message_file:
+            with open(job.message_file, 'rb') as f:
+                return f.read()
+        msg = email_sender.build_message(
+            self.sender_email, job.recipient_email, job.subject, job.body,
+            attachment_paths=job.attachment_paths,
+            inline_image_path=job.inline_image_path
+        )
+        return message_bytes(msg)
+
+    async def _run(self, jobs, results, stop):
+        loop = asyncio.get_running_loop()
+        work = asyncio.Queue()
+        # Bounds how many messages are built ahead of the connections; a slot
+        # is freed when a message gets its final result, not when it's retried
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        # One thread walks the job generator and builds messages, so the
+        # event loop only does network I/O
+        with ThreadPoolExecutor(max_workers=1) as builder:
+            workers = [asyncio.create_task(self._work(work, results, stop)) for _ in range(self.size)]
+            try:
+                await self._feed(jobs, work, results, builder, loop, stop)
+                while not stop.is_set():
+                    await asyncio.sleep(0.1)
+            finally:
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+
+    async def _feed(self, jobs, work, results, builder, loop, stop):
+        total = 0
+        iterator = iter(jobs)
+        done = object()
+        try:
+            while not stop.is_set():
+                await self._slots.acquire()
+                job = await loop.run_in_executor(builder, next, iterator, done)
+                if job is done:
+                    break
+                try:
+                    data = await loop.run_in_executor(builder, self._prepare, job)
+                except Exception as e:
+                    self._finish(results, SendResult(job, False, e, 1))
+                    total += 1
+                    continue
+                await work.put((job, 1, data))
+                total += 1
+        except Exception as e:
+            # Surface errors from the job generator in the caller's thread
+            results.put(e)
+            return
+        results.put(_FeedDone(total))
+
+    async def _connect(self):
+        connection = PipelinedConnection(self.host, self.port, self.sender_email, self.password, self.use_ssl)
+        try:
+            await connection.open()
+        except (smtplib.SMTPException, OSError) as e:
+            await connection.close()
+            return None, e
+        return connection, None
+
+    async def _work(self, work, results, stop):
+        loop = asyncio.get_running_loop()
+        connection = None
+        try:
+            while not stop.is_set():
+                try:
+                    first = await asyncio.wait_for(work.get(), self.keepalive_seconds)
+                except asyncio.TimeoutError:
+                    # Idle: keep the session alive so the next batch doesn't pay for a new login
+                    if connection is not None and not await connection.noop():
+                        connection = None
+                    continue
+                batch = [first]
+                while len(batch) < self.batch_size and not work.empty():
+                    batch.append(work.get_nowait())
+
+                if connection is None or not connection.is_open:
+                    connection, error = await self._connect()
+                    if connection is None:
+                        for job, attempt, data in batch:
+                            self._retry_or_fail(work, results, job, attempt, data, error)
+                        # Don't spin on a server that is refusing us
+                        await asyncio.sleep(min(2 ** batch[0][1], 30))
+                        continue
+
+                for _ in batch:
+                    with metrics.registry.timer('rate_limit_wait_seconds'):
+                        await loop.run_in_executor(None, self.rate_limiter.acquire)
+
+                start = time.perf_counter()
+                outcomes = await connection.send_many([([job.recipient_email], data) for job, _, data in batch])
+                per_message = (time.perf_counter() - start) / len(batch)
+
+                for (job, attempt, data), error in zip(batch, outcomes):
+                    if error is NOT_ATTEMPTED:
+                        # Not this message's fault; back on the queue without using up an attempt
+                        work.put_nowait((job, attempt, data))
+                        continue
+                    metrics.registry.observe('smtp_seconds', per_message)
+                    if error is None:
+                        self._finish(results, SendResult(job, True, None, attempt))
+                    elif _is_connection_drop(error):
+                        self._retry_or_fail(work, results, job, attempt, data, error)
+                    elif is_transient(error) and attempt < self.max_attempts:
+                        delay = backoff_delay(attempt, self.retry_base_seconds, self.retry_max_seconds)
+                        print(f"  [DEFERRED] {job.recipient_email}: {error} (retrying in {delay:.0f}s)")
+                        metrics.registry.inc('smtp_retries_total')
+                        metrics.registry.inc('smtp_deferred_total', {'code': email_sender.smtp_error_code(error)})
+                        # Keeps its slot while waiting, so the feeder can't run ahead of the retries
+                        loop.call_later(delay, work.put_nowait, (job, attempt + 1, data))
+                    else:
+                        self._finish(results, SendResult(job, False, error, attempt))
+                if not connection.is_open:
+                    drop = next((e for e in outcomes
+                                 if e is not None and e is not NOT_ATTEMPTED and _is_connection_drop(e)), None)
+                    if drop is not None:
+                        print(f"  [RECONNECT] Connection dropped during a batch of {len(batch)}: {drop}")
+                        metrics.registry.inc('smtp_reconnects_total', {'code': email_sender.smtp_error_code(drop)})
+                    connection = None
+        finally:
+            if connection is not None:
+                await connection.close(quit=True)
+
+    def _finish(self, results, result):
+        self._slots.release()
+        results.put(result)
+
+    def _retry_or_fail(self, work, results, job, attempt, data, error):
+        if attempt < self.max_attempts:
+            metrics.registry.inc('smtp_retries_total')
+            work.put_nowait((job, attempt + 1, data))
+        else:
+            self._finish(results, SendResult(job, False, error, attempt))
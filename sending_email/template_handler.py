@@ -1,5 +1,34 @@
 import os
 import re
+import string
+import time
+from functools import lru_cache
+
+import pandas as pd
+
+from sending_email import image_index
+from sending_email import metrics
+
+# Every placeholder personalize_template / render_template can fill in
+KNOWN_FIELDS = frozenset({
+    'name', 'first_name', 'company', 'position', 'value_prop_sentence',
+    'your_name', 'your_phone_number', 'your_email', 'your_city_and_state',
+    'dynamic_image_tag'
+})
+
+_FORMATTER = string.Formatter()
+
+DEFAULT_VALUE_PROP = "I'm very interested in this role and believe my skills are a strong match."
+
+# Sheet column -> attribute name on the tuples yielded by prepare_recipients
+RECIPIENT_COLUMNS = {
+    'Name': 'name',
+    'Email': 'email',
+    'Companies': 'company',
+    'Positions': 'position',
+    'Template File': 'template_file',
+}
+
 def load_template(template_folder, template_file):
     """
     Loads a template file and splits it into subject and body.
@@ -41,7 +70,7 @@ def create_value_prop(framework_type, strength, audience_value):
     
     # Handle empty or invalid data
     if not all([framework_type, strength, audience_value]):
-        return "I'm very interested in this role and believe my skills are a strong match."
+        return DEFAULT_VALUE_PROP
 
     framework_type = str(framework_type).lower()
     strength = str(strength)
@@ -57,36 +86,36 @@ def create_value_prop(framework_type, strength, audience_value):
         # A fallback in case the 'Framework' column is empty or has a typo
         return f"My experience in {strength} can help achieve {audience_value}."
 
-def personalize_template(subject_template, body_template, row_data, your_name, your_phone_number, your_email, your_city_and_state, image_assets_folder, template_file_name):
+def find_dynamic_image(company, name, image_assets_folder, template_file_name):
     """
-    Replaces all placeholders in the subject and body with data from the row.
-    
-    Args:
-        subject_template (str): The raw subject line (e.g., "Subject for {company}")
-        body_template (str): The raw body text.
-        row_data (pd.Series): A row from the DataFrame.
-        your_name (str): The sender's name.
-        
+    Looks for a per-recipient picture named '{company}_{name}.<ext>'
+    (any case, .png/.jpg/.jpeg/.gif).
+
     Returns:
-        (str, str): A tuple of (personalized_subject, personalized_body,image_assets_folder).
+        (str or None, str): The image path and the <img> tag to put in the body.
+    """
+    if template_file_name == 'template_shpe_2025_with_picture.html':
+        if company and name and image_assets_folder:
+            # One directory scan per folder, then case-insensitive dictionary lookups
+            file_path = image_index.get_index(image_assets_folder).find(company, name)
+            if file_path:
+                # This 'cid' MUST match the 'cid' in email_sender.py
+                dynamic_image_tag = f'<img src="cid:my_dynamic_image" alt="{company} Meeting Summary" style="width:100%; max-width:600px;">'
+                return file_path, dynamic_image_tag
+    return None, ""
+
+def build_replacements(row_data, your_name, your_phone_number, your_email, your_city_and_state, image_assets_folder, template_file_name):
+    """
+    Builds the placeholder values for one row.
+
+    Returns:
+        (dict, str or None): The replacements and the path of the image to embed (if any).
     """
     # --- 1. Find the dynamic image ---
-    image_to_embed = None
-    dynamic_image_tag = ""
     company = row_data.get('Companies', '')
     name = row_data.get('Name', '')
+    image_to_embed, dynamic_image_tag = find_dynamic_image(company, name, image_assets_folder, template_file_name)
 
-    if template_file_name == 'template_shpe_2025_with_picture.html':
-        if company and name and image_assets_folder:
-            base_filename = f"{company}_{name}"
-            for ext in ['.png', '.jpg', '.jpeg', '.gif']:
-                file_path = os.path.join(image_assets_folder, base_filename + ext)
-                if os.path.exists(file_path):
-                    image_to_embed = file_path
-                    # This 'cid' MUST match the 'cid' in email_sender.py
-                    dynamic_image_tag = f'<img src="cid:my_dynamic_image" alt="{company} Meeting Summary" style="width:100%; max-width:600px;">'
-                    break
-    
     # Create the value prop sentence
     value_prop = create_value_prop(
         row_data.get('Framework'),
@@ -111,9 +140,243 @@ def personalize_template(subject_template, body_template, row_data, your_name, y
         'your_city_and_state': your_city_and_state,
         'dynamic_image_tag': dynamic_image_tag
     }
+    return replacements, image_to_embed
+
+def personalize_template(subject_template, body_template, row_data, your_name, your_phone_number, your_email, your_city_and_state, image_assets_folder, template_file_name):
+    """
+    Replaces all placeholders in the subject and body with data from the row.
     
+    Args:
+        subject_template (str): The raw subject line (e.g., "Subject for {company}")
+        body_template (str): The raw body text.
+        row_data (pd.Series): A row from the DataFrame.
+        your_name (str): The sender's name.
+        
+    Returns:
+        (str, str): A tuple of (personalized_subject, personalized_body,image_assets_folder).
+    """
+    replacements, image_to_embed = build_replacements(
+        row_data, your_name, your_phone_number, your_email,
+        your_city_and_state, image_assets_folder, template_file_name
+    )
     
     final_subject = subject_template.format_map(replacements)
     final_body = body_template.format_map(replacements)
     
-    return final_subject, final_body, image_to_embed
\ No newline at end of file
+    return final_subject, final_body, image_to_embed
+
+# --- Compiled templates ---
+
+def _compile_text(text):
+    """
+    Pre-parses a format string into (literal, field, fmt) segments.
+    'fmt' is only set for placeholders that need full str.format handling
+    (conversions, format specs, attribute/index access).
+    """
+    segments = []
+    for literal, field, spec, conversion in _FORMATTER.parse(text):
+        if field is None:
+            segments.append((literal, None, None))
+            continue
+        fmt = None
+        if spec or conversion or not field.isidentifier():
+            fmt = '{' + field + ('!' + conversion if conversion else '') + (':' + spec if spec else '') + '}'
+        segments.append((literal, field, fmt))
+    return tuple(segments)
+
+def _render_segments(segments, replacements):
+    out = []
+    for literal, field, fmt in segments:
+        out.append(literal)
+        if field is None:
+            continue
+        if fmt is None:
+            out.append(str(replacements[field]))
+        else:
+            out.append(fmt.format_map(replacements))
+    return ''.join(out)
+
+def _field_root(field):
+    # 'company.name' / 'rows[0]' -> 'company' / 'rows'
+    return re.split(r'[.\[]', field, 1)[0]
+
+class CompiledTemplate:
+    """
+    A template whose subject and body have been parsed once.
+
+    Attributes:
+        file_name (str): The template's file name (e.g., 'template.txt').
+        subject (str): The raw subject line.
+        body (str): The raw body text.
+        fields (frozenset): Every placeholder used in the subject or body.
+    """
+
+    def __init__(self, file_name, subject, body):
+        self.file_name = file_name
+        self.subject = subject
+        self.body = body
+        self._subject_segments = _compile_text(subject)
+        self._body_segments = _compile_text(body)
+        self.fields = frozenset(
+            _field_root(field)
+            for _, field, _ in self._subject_segments + self._body_segments
+            if field is not None
+        )
+
+    def render(self, replacements):
+        """Returns (subject, body) with the placeholders filled in."""
+        return (_render_segments(self._subject_segments, replacements),
+                _render_segments(self._body_segments, replacements))
+
+@lru_cache(maxsize=64)
+def _compile_template(template_folder, template_file, mtime_ns):
+    # mtime_ns is only part of the cache key, so an edited file gets recompiled
+    metrics.registry.inc('template_compiles_total')
+    subject, body = load_template(template_folder, template_file)
+    if subject is None:
+        return None
+    try:
+        template = CompiledTemplate(template_file, subject, body)
+    except ValueError as e:
+        print(f"Error: Template '{template_file}' has a malformed placeholder: {e}")
+        return None
+
+    missing = template.fields - KNOWN_FIELDS
+    if missing:
+        print(f"Error: Template '{template_file}' uses unknown placeholders: {', '.join(sorted(missing))}")
+        print(f"Available placeholders are: {', '.join(sorted(KNOWN_FIELDS))}")
+        return None
+    return template
+
+def get_compiled_template(template_folder, template_file):
+    """
+    Returns the CompiledTemplate for a template file, parsing it only when
+    it's new or has changed on disk.
+
+    Returns:
+        CompiledTemplate or None: None if the file is missing or invalid.
+    """
+    template_path = os.path.join(template_folder, template_file)
+    try:
+        mtime_ns = os.stat(template_path).st_mtime_ns
+    except OSError:
+        print(f"Error: Template file not found: {template_path}")
+        return None
+    return _compile_template(template_folder, template_file, mtime_ns)
+
+def render_template(template, row_data, your_name, your_phone_number, your_email, your_city_and_state, image_assets_folder):
+    """
+    Personalizes a CompiledTemplate for one row.
+
+    Returns:
+        (str, str, str or None): (subject, body, image_to_embed)
+    """
+    start = time.perf_counter()
+    replacements, image_to_embed = build_replacements(
+        row_data, your_name, your_phone_number, your_email,
+        your_city_and_state, image_assets_folder, template.file_name
+    )
+    subject, body = template.render(replacements)
+    metrics.registry.observe('render_seconds', time.perf_counter() - start)
+    return subject, body, image_to_embed
+
+def render_recipient(template, recipient, your_name, your_phone_number, your_email, your_city_and_state, image_assets_folder):
+    """
+    Personalizes a CompiledTemplate for one tuple from prepare_recipients.
+
+    Returns:
+        (str, str, str or None): (subject, body, image_to_embed)
+    """
+    start = time.perf_counter()
+    image_to_embed, dynamic_image_tag = find_dynamic_image(
+        recipient.company, recipient.name, image_assets_folder, template.file_name
+    )
+    replacements = {
+        'name': your_name,
+        'first_name': recipient.first_name,
+        'company': recipient.company,
+        'position': recipient.position,
+        'value_prop_sentence': recipient.value_prop_sentence,
+        'your_name': your_name,
+        'your_phone_number': your_phone_number,
+        'your_email': your_email,
+        'your_city_and_state': your_city_and_state,
+        'dynamic_image_tag': dynamic_image_tag
+    }
+    subject, body = template.render(replacements)
+    metrics.registry.observe('render_seconds', time.perf_counter() - start)
+    return subject, body, image_to_embed
+
+def render_batch(template, rows, your_name, your_phone_number, your_email, your_city_and_state, image_assets_folder=None):
+    """
+    Personalizes a CompiledTemplate for every row of a DataFrame slice.
+
+    Args:
+        template (CompiledTemplate): The template to render.
+        rows (pd.DataFrame): The rows to render, e.g. df[df['Template File'] == name].
+
+    Returns:
+        list: One (subject, body, image_to_embed) tuple per row, in row order.
+    """
+    return [
+        render_recipient(template, recipient, your_name, your_phone_number, your_email,
+                         your_city_and_state, image_assets_folder)
+        for recipient in prepare_recipients(rows).itertuples(name='Recipient')
+    ]
+
+# --- Vectorized personalization ---
+
+def _text_column(df, column):
+    """Returns the column as stripped strings with blanks/NaN as '', or all '' if it's missing."""
+    if column not in df.columns:
+        return pd.Series('', index=df.index, dtype=object)
+    return df[column].fillna('').astype(str).str.strip()
+
+def create_value_prop_column(framework_type, strength, audience_value):
+    """
+    Vectorized create_value_prop for whole columns.
+    Blank and NaN cells count as missing, so they get the default sentence.
+
+    Returns:
+        pd.Series: One value prop sentence per row.
+    """
+    framework_type = framework_type.fillna('').astype(str).str.strip().str.lower()
+    strength = strength.fillna('').astype(str).str.strip()
+    audience_value = audience_value.fillna('').astype(str).str.strip()
+    achieve = ' to achieve ' + audience_value + '.'
+
+    # A fallback in case the 'Framework' column has a typo
+    sentences = 'My experience in ' + strength + ' can help achieve ' + audience_value + '.'
+    sentences = sentences.mask(framework_type == 'passion', "I'm passionate about " + strength + achieve)
+    sentences = sentences.mask(framework_type == 'known_for', "I'm known for my " + strength + achieve)
+    sentences = sentences.mask(framework_type == 'mission', "I'm on a mission to " + strength + achieve)
+
+    missing = (framework_type == '') | (strength == '') | (audience_value == '')
+    return sentences.mask(missing, DEFAULT_VALUE_PROP).astype(object)
+
+def prepare_recipients(df):
+    """
+    Computes everything personalization needs for all rows at once.
+
+    Args:
+        df (pd.DataFrame): Recipient rows, as loaded from the sheet.
+
+    Returns:
+        pd.DataFrame: Same index as df, with columns name, email, company,
+        position, template_file, first_name and value_prop_sentence. Iterate
+        it with .itertuples() rather than .iterrows().
+    """
+    prepared = pd.DataFrame(index=df.index)
+    for column, attribute in RECIPIENT_COLUMNS.items():
+        prepared[attribute] = df[column] if column in df.columns else ''
+
+    # Get first name, fallback to "there"
+    names = _text_column(df, 'Name')
+    prepared['first_name'] = names.str.split().str[0].fillna('there').astype(object)
+
+    prepared['value_prop_sentence'] = create_value_prop_column(
+        _text_column(df, 'Framework'),
+        _text_column(df, 'my strength'),
+        _text_column(df, 'something my target audience values')
+    )
+    return prepared
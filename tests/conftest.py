@@ -0,0 +1,10 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The package modules import as 'sending_email.x'; the scraper scripts
+# import each other as top-level modules, like cli.py sets up
+for path in (ROOT, os.path.join(ROOT, 'scrapping-companies')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,44 @@
+import base64
+import os
+
+from sending_email import attachment_cache
+
+
+def payload(part):
+    return base64.b64decode(part.get_payload())
+
+
+def test_part_is_built_once_and_reused(tmp_path):
+    resume = tmp_path / 'resume.pdf'
+    resume.write_bytes(b'%PDF-1.4 first')
+    cache = attachment_cache.AttachmentCache()
+    part = cache.get_part(str(resume))
+    assert part.get_content_type() == 'application/pdf'
+    assert part.get_filename() == 'resume.pdf'
+    assert payload(part) == b'%PDF-1.4 first'
+    assert cache.get_part(str(resume)) is part
+
+
+def test_part_is_rebuilt_when_the_file_changes(tmp_path):
+    resume = tmp_path / 'resume.pdf'
+    resume.write_bytes(b'%PDF-1.4 first')
+    cache = attachment_cache.AttachmentCache()
+    first = cache.get_part(str(resume))
+
+    # Same size, new mtime
+    resume.write_bytes(b'%PDF-1.4 secnd')
+    stat = os.stat(resume)
+    os.utime(resume, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    second = cache.get_part(str(resume))
+    assert second is not first
+    assert payload(second) == b'%PDF-1.4 secnd'
+
+    # Same mtime, new size
+    mtime_ns = os.stat(resume).st_mtime_ns
+    resume.write_bytes(b'%PDF-1.4 third, longer')
+    os.utime(resume, ns=(mtime_ns, mtime_ns))
+    assert payload(cache.get_part(str(resume))) == b'%PDF-1.4 third, longer'
+
+
+def test_missing_file_gives_no_part(tmp_path):
+    assert attachment_cache.AttachmentCache().get_part(str(tmp_path / 'nope.pdf')) is None
@@ -0,0 +1,54 @@
+import pandas as pd
+import pytest
+
+import company_master
+
+
+@pytest.fixture
+def master(tmp_path):
+    master = company_master.CompanyMaster(str(tmp_path / 'master.sqlite3'))
+    yield master
+    master.close()
+
+
+def write_source(path, companies, ranks):
+    pd.DataFrame({'Company Name': companies, 'Rank': ranks}).to_excel(path, index=False)
+    return str(path)
+
+
+def by_company(master):
+    return master.to_dataframe().set_index('Company Name')
+
+
+def test_an_unchanged_source_is_skipped(tmp_path, master):
+    source = write_source(tmp_path / 'fortune.xlsx', ['Acme Corp', 'Globex'], [1, 2])
+    assert master.update_source(source) == 'added'
+    assert master.update_source(source) == 'unchanged'
+    assert by_company(master)['Rank (fortune)'].to_dict() == {'Acme Corp': 1, 'Globex': 2}
+
+
+def test_a_changed_source_replaces_only_its_own_rows(tmp_path, master):
+    fortune = write_source(tmp_path / 'fortune.xlsx', ['Acme Corp', 'Globex', 'Initech'], [1, 2, 3])
+    shpe = write_source(tmp_path / 'shpe.xlsx', ['Acme Corporation', 'Umbrella'], [10, 20])
+    assert master.update_sources([fortune, shpe]) == {fortune: 'added', shpe: 'added'}
+    ids_before = dict(master.conn.execute("SELECT name, company_id FROM companies"))
+
+    # Globex moves up, Initech drops off the list, Hooli is new
+    write_source(fortune, ['Acme Corp', 'Globex', 'Hooli'], [1, 1, 3])
+    assert master.update_sources([fortune, shpe]) == {fortune: 'updated', shpe: 'unchanged'}
+
+    table = by_company(master)
+    assert table['Rank (fortune)'].dropna().to_dict() == {'Acme Corp': 1, 'Globex': 1, 'Hooli': 3}
+    assert table['Rank (shpe)'].dropna().to_dict() == {'Acme Corp': 10, 'Umbrella': 20}
+    assert table.loc['Acme Corp', 'Sources'] == 2
+    assert 'Initech' not in table.index
+    # Companies that were already known keep their ids
+    ids_after = dict(master.conn.execute("SELECT name, company_id FROM companies"))
+    assert all(ids_after[name] == company_id for name, company_id in ids_before.items())
+
+
+def test_a_source_without_the_match_column_is_an_error(tmp_path, master):
+    path = tmp_path / 'bad.xlsx'
+    pd.DataFrame({'Name': ['Acme']}).to_excel(path, index=False)
+    assert master.update_source(str(path)) == 'error'
+    assert master.update_source(str(tmp_path / 'missing.xlsx')) == 'error'
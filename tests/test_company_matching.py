@@ -0,0 +1,21 @@
+import company_matching
+
+
+def score(a, b):
+    return company_matching.similarity(company_matching.normalize_name(a), company_matching.normalize_name(b))
+
+
+def test_one_shared_word_is_not_a_match():
+    assert score('Capital', 'Capital One') < company_matching.DEFAULT_THRESHOLD
+    assert score('Apple', 'Apple Hospitality') < company_matching.DEFAULT_THRESHOLD
+
+
+def test_longer_name_containing_two_words_matches():
+    assert score('Jane Street', 'Jane Street Capital') >= company_matching.DEFAULT_THRESHOLD
+
+
+def test_fuzzy_match_skips_single_word_containment():
+    matches = company_matching.fuzzy_match(['Capital', 'Apple', 'Google LLC'],
+                                           ['Capital One', 'Apple Hospitality', 'Google'])
+    assert matches['right_position'].isna().tolist() == [True, True, False]
+    assert matches.loc[2, 'right_position'] == 2
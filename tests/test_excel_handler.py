@@ -0,0 +1,204 @@
+import os
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+from sending_email import excel_handler
+
+COLUMNS = ['Email', 'Name', 'Template File', 'Sent or Not']
+
+
+def write_sheet(path, rows, trailing_blank_rows=0):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(COLUMNS)
+    for row in rows:
+        sheet.append(row)
+    # Blank but formatted cells, as left behind when rows are cleared in Excel
+    for offset in range(trailing_blank_rows):
+        sheet.cell(row=len(rows) + 2 + offset, column=1).number_format = '0.00'
+    workbook.save(path)
+    return str(path)
+
+
+def sample_rows(count):
+    rows = []
+    for i in range(count):
+        status = 'Sent' if i % 3 == 0 else (1 if i % 3 == 1 else None)
+        rows.append([f"user{i}@example.com", f"User {i}", 't.html', status])
+    return rows
+
+
+# --- Streaming reader ---
+
+@pytest.mark.parametrize('chunk_rows', [1, 7, 1000])
+def test_chunks_add_up_to_read_excel(tmp_path, chunk_rows):
+    path = write_sheet(tmp_path / 'r.xlsx', sample_rows(23))
+    chunks = list(excel_handler.iter_recipient_chunks(path, chunk_rows=chunk_rows))
+    assert all(len(chunk) <= chunk_rows for chunk in chunks)
+    streamed, whole = pd.concat(chunks), pd.read_excel(path, dtype={'Sent or Not': str})
+    pd.testing.assert_frame_equal(streamed, whole, check_dtype=False)
+    assert streamed['Sent or Not'].dtype == whole['Sent or Not'].dtype
+
+
+def test_chunk_labels_carry_on_across_chunks(tmp_path):
+    path = write_sheet(tmp_path / 'r.xlsx', sample_rows(10))
+    chunks = list(excel_handler.iter_recipient_chunks(path, chunk_rows=4))
+    assert [chunk.index.tolist() for chunk in chunks] == [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+
+
+def test_trailing_blank_rows_are_dropped_but_inner_ones_kept(tmp_path):
+    rows = sample_rows(3) + [[None, None, None, None]] + sample_rows(2)
+    path = write_sheet(tmp_path / 'r.xlsx', rows, trailing_blank_rows=5)
+    streamed = pd.concat(excel_handler.iter_recipient_chunks(path, chunk_rows=2))
+    assert len(streamed) == len(pd.read_excel(path)) == 6
+    assert streamed['Email'].isna().tolist() == [False, False, False, True, False, False]
+
+
+def test_sent_or_not_is_text_or_missing(tmp_path):
+    path = write_sheet(tmp_path / 'r.xlsx', sample_rows(3))
+    chunk = next(excel_handler.iter_recipient_chunks(path))
+    assert chunk['Sent or Not'].tolist()[:2] == ['Sent', '1']
+    assert pd.isna(chunk['Sent or Not'].iloc[2])
+    assert excel_handler.pending_mask(chunk).tolist() == [False, True, True]
+
+
+def test_csv_is_read_in_chunks_too(tmp_path):
+    path = tmp_path / 'r.csv'
+    pd.DataFrame(sample_rows(5), columns=COLUMNS).to_csv(path, index=False)
+    chunks = list(excel_handler.iter_recipient_chunks(str(path), chunk_rows=2))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert pd.concat(chunks)['Sent or Not'].tolist()[:2] == ['Sent', '1']
+
+
+# --- Recipient checks ---
+
+MX_CACHE = {'example.com': True, 'typo.con': False}
+
+CHECK_CASES = [
+    # (email, template, sent or not, expected issue)
+    pytest.param('ok@example.com', 't.html', None, '', id='fine'),
+    pytest.param('  ', 't.html', None, excel_handler.ISSUE_BLANK, id='blank'),
+    pytest.param(None, 't.html', None, excel_handler.ISSUE_BLANK, id='missing'),
+    pytest.param('not-an-address', 't.html', None, excel_handler.ISSUE_INVALID, id='invalid'),
+    pytest.param('a@b@example.com', 't.html', None, excel_handler.ISSUE_INVALID, id='two-ats'),
+    pytest.param('mailto:ok@example.com', 'other.html', None, '', id='mailto-prefix'),
+    pytest.param('user@typo.con', 't.html', None, excel_handler.ISSUE_NO_MX, id='no-mx'),
+    pytest.param('user@unknown.org', 't.html', None, '', id='domain-not-in-cache'),
+    pytest.param('bad address', 't.html', 'Sent', '', id='not-pending'),
+]
+
+
+@pytest.mark.parametrize('email, template, status, expected', CHECK_CASES)
+def test_check_recipients_flags_a_single_row(email, template, status, expected):
+    df = pd.DataFrame({'Email': [email], 'Template File': [template], 'Sent or Not': [status]})
+    assert excel_handler.check_recipients(df, MX_CACHE).tolist() == [expected]
+
+
+def test_check_recipients_flags_duplicates_and_rows_already_sent():
+    df = pd.DataFrame({
+        'Email': ['a@example.com', 'A@Example.com ', 'a@example.com', 'b@example.com', 'b@example.com'],
+        'Template File': ['t.html', 't.html', 'other.html', 't.html', 't.html'],
+        'Sent or Not': [None, None, None, 'Sent', None],
+    })
+    assert excel_handler.check_recipients(df).tolist() == [
+        '', excel_handler.ISSUE_DUPLICATE, '', '', excel_handler.ISSUE_ALREADY_SENT,
+    ]
+
+
+def test_no_mx_is_only_checked_with_a_cache():
+    df = pd.DataFrame({'Email': ['user@typo.con'], 'Template File': ['t.html'], 'Sent or Not': [None]})
+    assert excel_handler.check_recipients(df).tolist() == ['']
+
+
+def test_streaming_checker_finds_duplicates_across_chunks():
+    df = pd.DataFrame({
+        'Email': ['a@example.com', 'b@example.com', 'c@example.com', 'A@example.com', 'b@example.com', 'x'],
+        'Template File': ['t.html'] * 6,
+        'Sent or Not': [None, 'Sent', None, None, None, None],
+    })
+    checker = excel_handler.StreamingRecipientChecker(MX_CACHE)
+    issues = pd.concat([checker.check(df.iloc[:3]), checker.check(df.iloc[3:])])
+    assert issues.tolist() == [
+        '', '', '', excel_handler.ISSUE_DUPLICATE, excel_handler.ISSUE_ALREADY_SENT, excel_handler.ISSUE_INVALID,
+    ]
+    # Same answer as checking the whole sheet when every duplicate comes after its original
+    assert issues.tolist() == excel_handler.check_recipients(df, MX_CACHE).tolist()
+
+
+def test_load_mx_cache_reads_json_and_csv(tmp_path):
+    json_path = tmp_path / 'mx.json'
+    json_path.write_text('{"Example.com": ["mx1.example.com"], "typo.con": []}')
+    csv_path = tmp_path / 'mx.csv'
+    csv_path.write_text('domain,has_mx\nexample.com,yes\ntypo.con,0\n')
+    for path in (json_path, csv_path):
+        assert excel_handler.load_mx_cache(str(path)) == MX_CACHE
+
+
+# --- Recipient cache ---
+
+@pytest.fixture
+def sheet(tmp_path):
+    return write_sheet(tmp_path / 'r.xlsx', [
+        ['a@example.com', 'Ann', 't.html', None],
+        ['b@example.com', 'Bob', 't.html', 'Sent'],
+        ['c@example.com', 'Cy', 't.html', None],
+    ])
+
+
+def add_phone_column(path, phones):
+    # Each cell keeps its own type in the .xlsx, so read_excel gives an object column of ints and text
+    df = pd.read_excel(path)
+    df['Phone'] = pd.Series(phones, dtype=object)
+    df.to_excel(path, index=False)
+
+
+def test_parquet_cache_takes_mixed_type_columns(tmp_path, sheet):
+    pytest.importorskip('pyarrow')
+    add_phone_column(sheet, [1234567, 'ext 5', None])
+    cache_dir = str(tmp_path / 'cache')
+    df = excel_handler.load_recipients(sheet, 'parquet', cache_dir)
+    assert df is not None
+    cached = excel_handler.load_recipients(sheet, 'parquet', cache_dir)
+    assert cached['Phone'].tolist()[:2] == ['1234567', 'ext 5']
+    assert pd.isna(cached['Phone'].iloc[2])
+
+
+def test_a_failed_cache_write_still_returns_the_sheet(tmp_path, sheet, monkeypatch):
+    def broken(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(excel_handler, '_write_cache', broken)
+    df = excel_handler.load_recipients(sheet, 'sqlite', str(tmp_path / 'cache'))
+    assert df['Email'].tolist() == ['a@example.com', 'b@example.com', 'c@example.com']
+
+
+@pytest.mark.parametrize('backend', ['sqlite', 'parquet'])
+def test_editing_the_workbook_keeps_unexported_marks(tmp_path, sheet, backend):
+    if backend == 'parquet':
+        pytest.importorskip('pyarrow')
+    cache_dir = str(tmp_path / 'cache')
+    df = excel_handler.load_recipients(sheet, backend, cache_dir)
+    df.loc[2, 'Sent or Not'] = 'Sent'
+    excel_handler.save_recipients(df, sheet, backend, cache_dir)
+
+    # The .xlsx is edited (a row inserted above) before anyone ran --export-excel
+    edited = pd.read_excel(sheet, dtype={'Sent or Not': str})
+    edited = pd.concat([edited.iloc[:1], pd.DataFrame({'Email': ['new@example.com'], 'Template File': ['t.html']}),
+                        edited.iloc[1:]], ignore_index=True)
+    edited.to_excel(sheet, index=False)
+
+    reloaded = excel_handler.load_recipients(sheet, backend, cache_dir)
+    assert reloaded.set_index('Email')['Sent or Not'].fillna('').to_dict() == {
+        'a@example.com': '', 'new@example.com': '', 'b@example.com': 'Sent', 'c@example.com': 'Sent',
+    }
+    assert len(os.listdir(cache_dir)) == 1
+
+
+# --- Pending rows ---
+
+def test_pending_mask_ignores_case_and_whitespace():
+    df = pd.DataFrame({'Sent or Not': ['Sent', ' response ', 'SENT', None, 'Failed', '']})
+    assert excel_handler.pending_mask(df).tolist() == [False, False, False, True, True, True]
+    assert excel_handler.pending_mask(pd.DataFrame({'Email': ['a@example.com']})).tolist() == [True]
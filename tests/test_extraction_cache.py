@@ -0,0 +1,89 @@
+import os
+
+import pytest
+
+import extraction_cache
+import html_stream
+import scrape_pages
+
+RANKED_PAGE = (
+    '<table><tr class="company"><td class="rank"><div class="first-line">{rank}</div></td>'
+    '<td class="name"><a href="https://acme.example">Acme</a></td></tr></table>'
+)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = extraction_cache.ExtractionCache(str(tmp_path / 'cache.sqlite3'))
+    yield cache
+    cache.close()
+
+
+def count_parses(monkeypatch):
+    calls = []
+    iter_records = html_stream.iter_records
+
+    def counting(*args, **kwargs):
+        calls.append(args[0])
+        return iter_records(*args, **kwargs)
+
+    monkeypatch.setattr(html_stream, 'iter_records', counting)
+    return calls
+
+
+def test_cached_records_hit_until_the_content_changes(tmp_path, cache, monkeypatch):
+    page = tmp_path / 'page.html'
+    page.write_text(RANKED_PAGE.format(rank=1), encoding='utf-8')
+    calls = count_parses(monkeypatch)
+
+    records, digest, cached = extraction_cache.cached_records(str(page), html_stream.RankedCompanyParser, cache)
+    assert (records[0]['Rank'], cached) == ('1', False)
+    records, same_digest, cached = extraction_cache.cached_records(str(page), html_stream.RankedCompanyParser, cache)
+    assert (records[0]['Rank'], same_digest, cached) == ('1', digest, True)
+    assert len(calls) == 1
+
+    page.write_text(RANKED_PAGE.format(rank=2), encoding='utf-8')
+    records, new_digest, cached = extraction_cache.cached_records(str(page), html_stream.RankedCompanyParser, cache)
+    assert (records[0]['Rank'], cached) == ('2', False)
+    assert new_digest != digest
+    assert len(calls) == 2
+
+
+def test_a_new_parser_version_misses(tmp_path, cache, monkeypatch):
+    page = tmp_path / 'page.html'
+    page.write_text(RANKED_PAGE.format(rank=1), encoding='utf-8')
+    extraction_cache.cached_records(str(page), html_stream.RankedCompanyParser, cache)
+    monkeypatch.setattr(html_stream.RankedCompanyParser, 'VERSION', html_stream.RankedCompanyParser.VERSION + 1)
+    assert extraction_cache.cached_records(str(page), html_stream.RankedCompanyParser, cache)[2] is False
+
+
+def test_output_is_current_until_inputs_or_file_change(tmp_path, cache):
+    output = tmp_path / 'out.xlsx'
+    output.write_bytes(b'written')
+    cache.mark_output(str(output), 'inputs-1')
+    assert cache.output_is_current(str(output), 'inputs-1')
+    assert not cache.output_is_current(str(output), 'inputs-2')
+
+    # Someone edited the output by hand
+    output.write_bytes(b'edited by hand')
+    assert not cache.output_is_current(str(output), 'inputs-1')
+    os.remove(output)
+    assert not cache.output_is_current(str(output), 'inputs-1')
+
+
+def test_scrape_pages_reuses_cached_pages(tmp_path, cache, monkeypatch):
+    first, second = tmp_path / 'a.html', tmp_path / 'b.html'
+    first.write_text(RANKED_PAGE.format(rank=1), encoding='utf-8')
+    second.write_text(RANKED_PAGE.format(rank=1).replace('Acme', 'Globex'), encoding='utf-8')
+    pages = [str(first), str(second)]
+    df = scrape_pages.scrape_pages(pages, max_workers=1, cache=cache, hashes=scrape_pages.hash_pages(pages))
+    assert df['Company Name'].tolist() == ['Acme', 'Globex']
+
+    def parse_again(*args):
+        raise AssertionError("page was parsed again")
+
+    # Saved again with the same bytes: new mtime, same content, still a hit
+    second.write_text(RANKED_PAGE.format(rank=1).replace('Acme', 'Globex'), encoding='utf-8')
+    monkeypatch.setattr(scrape_pages, 'scrape_page', parse_again)
+    again = scrape_pages.scrape_pages(pages, max_workers=1, cache=cache, hashes=scrape_pages.hash_pages(pages))
+    assert again.equals(df)
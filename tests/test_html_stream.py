@@ -0,0 +1,30 @@
+import html_stream
+
+UNCLOSED_ROWS = (
+    '<table>'
+    '<tr class="company"><td class="rank"><div class="first-line">1</div></td>'
+    '<td class="name"><a href="https://alpha.example">Alpha</a></td>'
+    '<tr class="company"><td class="rank"><div class="first-line">2</div>'
+    '<td class="name"><a href="https://beta.example">Beta</a></td></tr>'
+    '</table>'
+)
+
+
+def test_unclosed_row_is_ended_by_the_next_one():
+    records = html_stream.parse_string(UNCLOSED_ROWS, html_stream.RankedCompanyParser)
+    assert records == [
+        {'Rank': '1', 'Company Name': 'Alpha', 'Website': 'https://alpha.example'},
+        {'Rank': '2', 'Company Name': 'Beta', 'Website': 'https://beta.example'},
+    ]
+
+
+def test_records_survive_chunk_boundaries(tmp_path):
+    page = tmp_path / 'page.html'
+    page.write_text(UNCLOSED_ROWS, encoding='utf-8')
+    records = list(html_stream.iter_records(str(page), html_stream.RankedCompanyParser, chunk_size=7))
+    assert [record['Company Name'] for record in records] == ['Alpha', 'Beta']
+
+
+def test_exhibitor_names():
+    html = '<h2 data-dd-action-name="Exhibitor name"> Acme &amp; Co </h2><h2>Other</h2>'
+    assert html_stream.parse_string(html, html_stream.ExhibitorNameParser) == [{'Company Name': 'Acme & Co'}]
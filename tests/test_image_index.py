@@ -0,0 +1,51 @@
+import os
+import time
+
+from sending_email import image_index
+
+
+def touch(folder, name, data=b'img'):
+    path = folder / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_lookup_ignores_case_and_prefers_png(tmp_path):
+    png = touch(tmp_path, 'Acme_Ann Lee.PNG')
+    touch(tmp_path, 'acme_ann lee.jpg')
+    touch(tmp_path, 'Acme_Ann Lee.txt')
+    index = image_index.ImageIndex(str(tmp_path), refresh_seconds=0)
+    assert index.find('ACME', 'ann lee') == png
+    assert index.find('Acme', 'Bob') is None
+    assert len(index) == 1
+
+
+def test_index_picks_up_new_files_after_refresh(tmp_path):
+    index = image_index.ImageIndex(str(tmp_path), refresh_seconds=0.01)
+    assert index.find('Acme', 'Ann') is None
+    path = touch(tmp_path, 'Acme_Ann.jpg')
+    # Make sure the folder's mtime moves even on coarse-grained filesystems
+    stat = os.stat(tmp_path)
+    os.utime(tmp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    time.sleep(0.02)
+    assert index.find('Acme', 'Ann') == path
+
+
+def test_missing_folder_gives_an_empty_index(tmp_path):
+    assert len(image_index.ImageIndex(str(tmp_path / 'nope'))) == 0
+
+
+def test_image_cache_rereads_edited_files_and_respects_its_cap(tmp_path):
+    cache = image_index.ImageCache(max_bytes=10)
+    path = touch(tmp_path, 'a.jpg', b'12345')
+    assert cache.read(path) == (b'12345', 'jpeg')
+
+    stat = os.stat(path)
+    touch(tmp_path, 'a.jpg', b'54321')
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert cache.read(path) == (b'54321', 'jpeg')
+
+    other = touch(tmp_path, 'b.png', b'abcdefgh')
+    assert cache.read(other) == (b'abcdefgh', 'png')
+    assert cache._size <= 10
+    assert cache.read(str(tmp_path / 'missing.png')) == (None, None)
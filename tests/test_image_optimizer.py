@@ -0,0 +1,70 @@
+import os
+import threading
+
+import pytest
+
+from sending_email import image_optimizer
+
+Image = pytest.importorskip('PIL.Image')
+
+
+def save_photo(path, width=2400, height=1600):
+    Image.new('RGB', (width, height), (200, 120, 40)).save(path, format='JPEG', quality=95)
+    return str(path)
+
+
+def count_recompress(monkeypatch):
+    calls = []
+    recompress = image_optimizer.ImageOptimizer._recompress
+
+    def counting(self, data):
+        calls.append(1)
+        return recompress(self, data)
+
+    monkeypatch.setattr(image_optimizer.ImageOptimizer, '_recompress', counting)
+    return calls
+
+
+def test_large_photo_is_shrunk_and_cached(tmp_path, monkeypatch):
+    photo = save_photo(tmp_path / 'photo.jpg')
+    calls = count_recompress(monkeypatch)
+    optimizer = image_optimizer.ImageOptimizer(str(tmp_path / 'cache'), max_width=600)
+    optimized = optimizer.optimize(photo)
+    assert optimized != photo
+    with Image.open(optimized) as img:
+        assert img.width == 600
+    # A later run finds the copy by content, without re-encoding
+    again = image_optimizer.ImageOptimizer(str(tmp_path / 'cache'), max_width=600)
+    assert again.optimize(photo) == optimized
+    assert len(calls) == 1
+
+
+def test_concurrent_first_uses_optimize_once(tmp_path, monkeypatch):
+    photo = save_photo(tmp_path / 'photo.jpg')
+    calls = count_recompress(monkeypatch)
+    optimizer = image_optimizer.ImageOptimizer(str(tmp_path / 'cache'), max_width=600)
+    start = threading.Barrier(8)
+    results = []
+
+    def use():
+        start.wait()
+        results.append(optimizer.optimize(photo))
+
+    threads = [threading.Thread(target=use) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert len(set(results)) == 1
+
+
+def test_picture_not_worth_reencoding_is_kept_with_a_marker(tmp_path, monkeypatch):
+    photo = tmp_path / 'tiny.png'
+    Image.new('RGB', (8, 8), (0, 0, 0)).save(photo, format='PNG', optimize=True)
+    calls = count_recompress(monkeypatch)
+    cache_dir = tmp_path / 'cache'
+    assert image_optimizer.ImageOptimizer(str(cache_dir)).optimize(str(photo)) == str(photo)
+    assert [name.endswith('.keep') for name in os.listdir(cache_dir)] == [True]
+    assert image_optimizer.ImageOptimizer(str(cache_dir)).optimize(str(photo)) == str(photo)
+    assert len(calls) == 1
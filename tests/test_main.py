@@ -0,0 +1,32 @@
+import pandas as pd
+import pytest
+
+import main
+from sending_email import config
+
+
+@pytest.fixture
+def template_folder(tmp_path, monkeypatch):
+    (tmp_path / 'good.html').write_text("Subject: {position} at {company} ---\n<p>Dear {first_name},</p>")
+    (tmp_path / 'bad.html').write_text("Subject: Hi ---\n<p>{not_a_placeholder}</p>")
+    monkeypatch.setattr(config, 'TEMPLATE_FOLDER', str(tmp_path))
+    monkeypatch.setattr(config, 'IMAGE_FOLDER', str(tmp_path / 'images'))
+    return tmp_path
+
+
+def test_select_recipients_counts_only_rows_that_get_an_email(template_folder):
+    df = pd.DataFrame({
+        'Name': ['Ann Lee', 'Bob Ray', 'Cy Dee', 'Di Fox', 'Ed Gee'],
+        'Email': [f"{name}@example.com" for name in 'abcde'],
+        'Companies': ['Acme'] * 5,
+        'Positions': ['Engineer'] * 5,
+        'Template File': ['good.html', None, 'bad.html', 'missing.html', 'good.html'],
+        'Sent or Not': [None, None, None, None, 'Sent'],
+    })
+    recipients, templates = main.select_recipients(df)
+    assert recipients.index.tolist() == [0]
+
+    jobs = list(main.personalize_jobs(recipients, templates))
+    assert len(jobs) == len(recipients)
+    assert (jobs[0].key, jobs[0].subject) == (0, 'Engineer at Acme')
+    assert [job.key for job in main.build_send_jobs(df)] == [0]
@@ -0,0 +1,159 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import rating_companies
+
+COMPANIES = ['Acme', 'Globex', 'Initech']
+
+
+def reply(items):
+    return json.dumps(items)
+
+
+class StubClient:
+    """Stands in for genai.Client: answers batches with 'batch_reply', single prompts in the text format."""
+
+    def __init__(self, batch_reply=None):
+        self.batch_reply = batch_reply
+        self.prompts = []
+        self.models = SimpleNamespace(generate_content=self.generate_content)
+
+    def generate_content(self, model, contents, config=None):
+        self.prompts.append(contents)
+        if config is not None:
+            return SimpleNamespace(text=self.batch_reply(contents))
+        return SimpleNamespace(text="Rating: 5/10. Explanation: Asked alone.")
+
+
+def fast_bucket():
+    return rating_companies.TokenBucket(6000)
+
+
+def test_rate_companies_caches_ratings(tmp_path):
+    client = StubClient()
+    cache = rating_companies.RatingCache(str(tmp_path / 'ratings.sqlite3'))
+    try:
+        ratings = rating_companies.rate_companies(COMPANIES, client, cache, bucket=fast_bucket(), batch_size=1)
+        assert ratings == {company: ('5/10', 'Asked alone.') for company in COMPANIES}
+        assert len(client.prompts) == 3
+
+        # A rerun is served from the cache without any request
+        rerun = StubClient()
+        assert rating_companies.rate_companies(COMPANIES, rerun, cache, bucket=fast_bucket(), batch_size=1) == ratings
+        assert rerun.prompts == []
+    finally:
+        cache.close()
+
+
+def test_errors_are_not_cached(tmp_path):
+    class FailingClient(StubClient):
+        def generate_content(self, model, contents, config=None):
+            raise RuntimeError("network down")
+
+    cache = rating_companies.RatingCache(str(tmp_path / 'ratings.sqlite3'))
+    try:
+        ratings = rating_companies.rate_companies(['Acme'], FailingClient(), cache, bucket=fast_bucket(), batch_size=1)
+        assert ratings['Acme'][0] == 'Error'
+        assert cache.get_many(['Acme']) == {}
+    finally:
+        cache.close()
+
+
+def test_cache_is_keyed_by_prompt_version(tmp_path):
+    path = str(tmp_path / 'ratings.sqlite3')
+    old = rating_companies.RatingCache(path, prompt_version=1)
+    old.put('Acme', '3/10', 'Old prompt.')
+    old.close()
+    cache = rating_companies.RatingCache(path, prompt_version=2)
+    try:
+        assert cache.get_many(['Acme']) == {}
+    finally:
+        cache.close()
+
+
+# --- Batch replies ---
+
+def test_parses_a_full_reply():
+    text = reply([{'company': c, 'rating': 7, 'explanation': f"{c} is fine."} for c in COMPANIES])
+    assert rating_companies.parse_batch_response(text, COMPANIES) == {
+        c: ('7/10', f"{c} is fine.") for c in COMPANIES
+    }
+
+
+def test_accepts_a_code_fence():
+    text = "```json\n" + reply([{'company': 'Acme', 'rating': 9, 'explanation': 'Good.'}]) + "\n```"
+    assert rating_companies.parse_batch_response(text, COMPANIES) == {'Acme': ('9/10', 'Good.')}
+
+
+@pytest.mark.parametrize('text', ['', 'Rating: 7/10', '{"company": "Acme"}', '[1, 2', 'null'])
+def test_malformed_replies_give_nothing(text):
+    assert rating_companies.parse_batch_response(text, COMPANIES) == {}
+
+
+def test_keeps_only_well_formed_items():
+    text = reply([
+        {'company': 'Acme', 'rating': 8, 'explanation': 'Solid.'},
+        {'company': 'Globex', 'rating': 11, 'explanation': 'Out of range.'},
+        {'company': 'Initech', 'rating': True, 'explanation': 'Not a number.'},
+        {'company': 'Umbrella', 'rating': 5, 'explanation': 'Not asked about.'},
+        'not an object',
+    ])
+    assert rating_companies.parse_batch_response(text, COMPANIES) == {'Acme': ('8/10', 'Solid.')}
+
+
+def test_drops_a_company_answered_twice():
+    text = reply([
+        {'company': 'Acme', 'rating': 8, 'explanation': 'Solid.'},
+        {'company': 'Acme', 'rating': 2, 'explanation': 'Weak.'},
+        {'company': 'Globex', 'rating': 6, 'explanation': 'Fine.'},
+    ])
+    assert rating_companies.parse_batch_response(text, COMPANIES) == {'Globex': ('6/10', 'Fine.')}
+
+
+def test_missing_items_are_asked_about_alone():
+    # The batch reply leaves out Initech
+    client = StubClient(lambda prompt: reply([
+        {'company': 'Acme', 'rating': 8, 'explanation': 'Solid.'},
+        {'company': 'Globex', 'rating': 6, 'explanation': 'Fine.'},
+    ]))
+    ratings = rating_companies.rate_companies(COMPANIES, client, bucket=fast_bucket(), batch_size=3)
+    assert ratings == {
+        'Acme': ('8/10', 'Solid.'),
+        'Globex': ('6/10', 'Fine.'),
+        'Initech': ('5/10', 'Asked alone.'),
+    }
+    assert len(client.prompts) == 2
+
+
+def test_a_failed_batch_request_is_retried_not_split():
+    calls = []
+
+    def flaky(prompt):
+        calls.append(prompt)
+        if len(calls) < 2:
+            raise RuntimeError("429 quota exceeded")
+        return reply([{'company': c, 'rating': 7, 'explanation': 'Fine.'} for c in COMPANIES])
+
+    client = StubClient(flaky)
+    ratings = rating_companies.rate_companies(COMPANIES, client, bucket=fast_bucket(), batch_size=3, retry_seconds=0)
+    assert ratings == {c: ('7/10', 'Fine.') for c in COMPANIES}
+    # Two batch requests, no single-company ones
+    assert len(client.prompts) == 2
+
+
+def test_a_batch_that_keeps_failing_is_marked_error(tmp_path):
+    def down(prompt):
+        raise RuntimeError("429 quota exceeded")
+
+    client = StubClient(down)
+    cache = rating_companies.RatingCache(str(tmp_path / 'ratings.sqlite3'))
+    try:
+        ratings = rating_companies.rate_companies(COMPANIES, client, cache, bucket=fast_bucket(), batch_size=3,
+                                                  batch_attempts=3, retry_seconds=0)
+        assert {rating for rating, _ in ratings.values()} == {'Error'}
+        assert len(client.prompts) == 3
+        assert cache.get_many(COMPANIES) == {}
+    finally:
+        cache.close()
@@ -0,0 +1,66 @@
+import email
+import email.policy
+
+import pandas as pd
+import pytest
+
+from benchmarks.smtp_sink import SmtpSink
+from sending_email import email_sender
+from sending_email import render_stage
+from sending_email import send_pool
+
+SENDER = 'me@example.com'
+
+
+@pytest.fixture
+def settings(tmp_path):
+    templates = tmp_path / 'templates'
+    templates.mkdir()
+    (templates / 't.html').write_text("Subject: {position} at {company} ---\n<p>Dear {first_name},</p>")
+    resume = tmp_path / 'resume.pdf'
+    resume.write_bytes(b'%PDF-1.4 resume')
+    return render_stage.RenderSettings(
+        template_folder=str(templates), image_folder=str(tmp_path / 'images'), attachment_paths=[str(resume)],
+        sender_email=SENDER, your_name='Me', your_phone_number='555-0100', your_city_and_state='Austin, TX',
+        image_optimize_dir=None, image_max_width=1200, image_quality=80
+    )
+
+
+@pytest.fixture
+def sheet():
+    return pd.DataFrame({
+        'Name': ['Ann Lee', 'Bob Ray', 'Cy Dee', 'Di Fox', 'Ed Gee'],
+        'Email': ['a@example.com', 'b@example.com', 'c@example.com', 'd@example.com', 'e@example.com'],
+        'Companies': ['Acme', 'Globex', 'Initech', 'Hooli', 'Umbrella'],
+        'Positions': ['Engineer'] * 5,
+        'Template File': ['t.html', 't.html', 'missing.html', None, 't.html'],
+        'Sent or Not': [None, None, None, None, 'Sent'],
+    })
+
+
+def test_rendered_messages_round_trip(tmp_path, settings, sheet):
+    out_dir = str(tmp_path / 'rendered')
+    assert render_stage.render_campaign(sheet, out_dir, settings, workers=2, chunk_size=1) == 2
+
+    jobs = list(render_stage.iter_rendered_jobs(out_dir, sheet))
+    assert [job.key for job in jobs] == [0, 1]
+    with open(jobs[1].message_file, 'rb') as f:
+        msg = email.message_from_binary_file(f, policy=email.policy.default)
+    assert (msg['To'], msg['Subject']) == ('b@example.com', 'Engineer at Globex')
+    assert 'Dear Bob,' in msg.get_body(('html',)).get_content()
+    assert [part.get_filename() for part in msg.iter_attachments()] == ['resume.pdf']
+
+    with SmtpSink() as sink:
+        def connect():
+            return email_sender.login_to_server('127.0.0.1', sink.port, SENDER, '', use_ssl=False)
+        results = list(send_pool.SmtpSenderPool(connect, SENDER, size=2).send_all(jobs))
+    assert all(result.success for result in results)
+    assert sink.messages == 2
+
+
+def test_rows_sent_or_edited_since_rendering_are_skipped(tmp_path, settings, sheet):
+    out_dir = str(tmp_path / 'rendered')
+    render_stage.render_campaign(sheet, out_dir, settings, workers=1)
+    sheet.loc[0, 'Sent or Not'] = 'Sent'
+    sheet.loc[1, 'Email'] = 'bob@example.com'
+    assert list(render_stage.iter_rendered_jobs(out_dir, sheet)) == []
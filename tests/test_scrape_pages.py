@@ -0,0 +1,72 @@
+import functools
+import http.server
+import os
+import threading
+
+import pytest
+
+import scrape_pages
+
+EXHIBITOR_PAGE = (
+    '<div><h2 data-dd-action-name="Exhibitor name">Acme</h2>'
+    '<h2 data-dd-action-name="Exhibitor name">Hooli</h2></div>'
+)
+RANKED_PAGE = (
+    '<table>'
+    '<tr class="company"><td class="rank"><div class="first-line">1</div></td>'
+    '<td class="name"><a href="https://globex.example">Globex</a></td></tr>'
+    '<tr class="company"><td class="rank"><div class="first-line">2</div></td>'
+    '<td class="name"><a href="https://acme.example">ACME</a></td></tr>'
+    '</table>'
+)
+
+
+@pytest.fixture
+def pages(tmp_path):
+    (tmp_path / 'expo.html').write_text(EXHIBITOR_PAGE, encoding='utf-8')
+    (tmp_path / 'ranked.htm').write_text(RANKED_PAGE, encoding='utf-8')
+    (tmp_path / 'other.html').write_text('<p>No companies here</p>', encoding='utf-8')
+    (tmp_path / 'notes.txt').write_text('not a page', encoding='utf-8')
+    return tmp_path
+
+
+@pytest.fixture
+def server(pages):
+    handler = functools.partial(http.server.SimpleHTTPRequestHandler, directory=str(pages))
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_expand_sources_finds_pages_once(pages):
+    expo, ranked = str(pages / 'expo.html'), str(pages / 'ranked.htm')
+    found = scrape_pages.expand_sources([str(pages), os.path.join(str(pages), 'expo.*'), 'https://x.example/p'])
+    assert found == [expo, str(pages / 'other.html'), ranked, 'https://x.example/p']
+
+
+def test_each_page_gets_its_extractor(pages):
+    assert scrape_pages.scrape_page(str(pages / 'expo.html'))[1:] == (
+        'exhibitor', [{'Company Name': 'Acme'}, {'Company Name': 'Hooli'}], None
+    )
+    page, chosen, records, error = scrape_pages.scrape_page(str(pages / 'ranked.htm'))
+    assert (chosen, [record['Rank'] for record in records], error) == ('ranked', ['1', '2'], None)
+    assert scrape_pages.scrape_page(str(pages / 'other.html'))[3] == "no known extractor matches this page"
+
+
+def test_pages_are_merged_and_deduplicated(pages):
+    sources = scrape_pages.expand_sources([str(pages)])
+    df = scrape_pages.scrape_pages(sources, max_workers=2)
+    assert df.columns.tolist() == scrape_pages.COLUMN_NAMES
+    # 'ACME' on the ranked page repeats the exhibitor page's 'Acme'; the first page wins
+    assert df['Company Name'].tolist() == ['Acme', 'Hooli', 'Globex']
+    assert df['Extractor'].tolist() == ['exhibitor', 'exhibitor', 'ranked']
+
+
+def test_urls_from_a_local_server(server):
+    urls = [f"{server}/ranked.htm", f"{server}/expo.html", f"{server}/missing.html"]
+    df = scrape_pages.scrape_pages(urls, max_workers=2)
+    assert df['Company Name'].tolist() == ['Globex', 'ACME', 'Hooli']
+    assert df['Source'].tolist() == [urls[0], urls[0], urls[1]]
@@ -0,0 +1,62 @@
+import time
+
+import pandas as pd
+import pytest
+
+from sending_email import send_journal
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = send_journal.SendJournal(str(tmp_path / 'journal.sqlite3'))
+    yield journal
+    journal.close()
+
+
+def test_merge_marks_sent_rows(journal):
+    journal.record(0, 'a@example.com', 't.html', 'Sent')
+    journal.record(1, 'b@example.com', 't.html', 'Failed', 'boom')
+    df = pd.DataFrame({'Email': ['A@example.com ', 'b@example.com'], 'Template File': ['t.html', 't.html'],
+                       'Sent or Not': [None, None]})
+    assert journal.merge_into(df) == 1
+    assert df['Sent or Not'].tolist() == ['Sent', None]
+
+
+def test_merge_marks_only_the_first_duplicate_row(journal):
+    journal.record(0, 'a@example.com', 't.html', 'Sent')
+    df = pd.DataFrame({'Email': ['a@example.com', 'a@example.com', 'a@example.com'],
+                       'Template File': ['t.html', 't.html', 'other.html'],
+                       'Sent or Not': [None, None, None]})
+    assert journal.merge_into(df) == 1
+    assert df['Sent or Not'].tolist() == ['Sent', None, None]
+
+
+def test_merge_leaves_duplicates_of_a_marked_row(journal):
+    journal.record(0, 'a@example.com', 't.html', 'Sent')
+    df = pd.DataFrame({'Email': ['a@example.com', 'a@example.com'], 'Template File': ['t.html', 't.html'],
+                       'Sent or Not': ['Sent', None]})
+    assert journal.merge_into(df) == 0
+
+
+def _backdate(journal, days):
+    journal.conn.execute("UPDATE sends SET sent_at = ?", (time.time() - days * 86400,))
+    journal.conn.commit()
+
+
+def test_follow_ups_due(journal):
+    for email in ('old@example.com', 'replied@example.com', 'done@example.com', 'failed@example.com'):
+        journal.record(0, email, 'first.html', 'Sent' if email != 'failed@example.com' else 'Failed')
+    _backdate(journal, 10)
+    journal.record(0, 'new@example.com', 'first.html', 'Sent')
+    journal.record(0, 'done@example.com', 'follow.html', 'Sent')
+    journal.record_responses(['Replied@Example.com'])
+
+    due = journal.follow_ups_due('first.html', 'follow.html', 7)
+    assert set(due) == {'old@example.com'}
+
+
+def test_follow_up_waits_after_a_resend(journal):
+    journal.record(0, 'a@example.com', 'first.html', 'Sent')
+    _backdate(journal, 10)
+    journal.record(0, 'a@example.com', 'first.html', 'Sent')
+    assert journal.follow_ups_due('first.html', 'follow.html', 7) == {}
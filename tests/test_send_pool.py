@@ -0,0 +1,250 @@
+import asyncio
+import smtplib
+import threading
+import time
+
+import pytest
+
+from benchmarks.smtp_sink import SmtpSink
+from sending_email import email_sender
+from sending_email import send_pool
+from sending_email import smtp_pipeline
+
+SENDER = 'me@example.com'
+
+
+def job(email, key=None):
+    return send_pool.SendJob(key=key if key is not None else email, recipient_email=email,
+                             subject='Hello', body='<p>Hi</p>', attachment_paths=[],
+                             inline_image_path=None, template_file='t.html')
+
+
+def take(scheduler, timeout=2.0):
+    """scheduler.get(), but fails the test instead of hanging."""
+    result = []
+    thread = threading.Thread(target=lambda: result.append(scheduler.get()), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        scheduler.close()
+        thread.join()
+        pytest.fail("get() blocked")
+    return result[0]
+
+
+# --- SendScheduler ---
+
+def test_scheduler_round_robins_domains():
+    scheduler = send_pool.SendScheduler(max_in_flight=10)
+    for email in ('1@a.com', '2@a.com', '3@a.com', '1@b.com'):
+        scheduler.put(job(email), 1)
+    order = [take(scheduler)[0].recipient_email for _ in range(4)]
+    assert order == ['1@a.com', '1@b.com', '2@a.com', '3@a.com']
+
+
+def test_scheduler_holds_a_domain_at_its_concurrency_limit():
+    scheduler = send_pool.SendScheduler(max_in_flight=10, domain_max_in_flight=1)
+    for email in ('1@a.com', '2@a.com', '1@b.com'):
+        scheduler.put(job(email), 1)
+    first, _ = take(scheduler)
+    assert first.recipient_email == '1@a.com'
+    assert take(scheduler)[0].recipient_email == '1@b.com'
+
+    # '2@a.com' waits until the send to a.com finishes
+    threading.Timer(0.2, scheduler.done, args=(first,)).start()
+    start = time.monotonic()
+    assert take(scheduler)[0].recipient_email == '2@a.com'
+    assert time.monotonic() - start >= 0.15
+
+
+def test_scheduler_applies_per_domain_rate_overrides():
+    scheduler = send_pool.SendScheduler(max_in_flight=10, domain_limits={'A.com': {'per_minute': 1}})
+    for email in ('1@a.com', '2@a.com'):
+        scheduler.put(job(email), 1)
+    first, _ = take(scheduler)
+    scheduler.done(first)
+    # The second a.com send is a minute away; close() must still release get()
+    threading.Timer(0.2, scheduler.close).start()
+    assert take(scheduler) is None
+
+
+def test_scheduler_defers_retries_until_due():
+    scheduler = send_pool.SendScheduler(max_in_flight=10)
+    scheduler.defer(job('1@a.com'), 2, 0.3)
+    start = time.monotonic()
+    deferred, attempt = take(scheduler)
+    assert (deferred.recipient_email, attempt) == ('1@a.com', 2)
+    assert time.monotonic() - start >= 0.25
+
+
+def test_scheduler_skips_a_paused_domain():
+    scheduler = send_pool.SendScheduler(max_in_flight=10)
+    scheduler.pause_domain('a.com', 0.3)
+    scheduler.put(job('1@a.com'), 1)
+    scheduler.put(job('1@b.com'), 1)
+    start = time.monotonic()
+    assert take(scheduler)[0].recipient_email == '1@b.com'
+    assert take(scheduler)[0].recipient_email == '1@a.com'
+    assert time.monotonic() - start >= 0.25
+
+
+def refused(code):
+    return smtplib.SMTPRecipientsRefused({'x@a.com': (code, b'refused')})
+
+
+def test_transient_errors_are_4xx_only():
+    assert send_pool.is_transient(refused(451))
+    assert not send_pool.is_transient(refused(550))
+    assert not send_pool.is_transient(OSError("reset"))
+
+
+def test_421_is_a_connection_drop():
+    assert send_pool._is_connection_drop(refused(421))
+    assert send_pool._is_connection_drop(smtplib.SMTPSenderRefused(421, b'closing', 'me@example.com'))
+    assert not send_pool._is_connection_drop(refused(451))
+
+
+# --- Pools against the local SMTP sink ---
+
+def smtp_pool(sink, **kwargs):
+    def connect():
+        return email_sender.login_to_server('127.0.0.1', sink.port, SENDER, '', use_ssl=False)
+    return send_pool.SmtpSenderPool(connect, SENDER, retry_base_seconds=0.05, retry_max_seconds=0.1, **kwargs)
+
+
+def pipelined_pool(sink, **kwargs):
+    return smtp_pipeline.PipelinedSenderPool('127.0.0.1', sink.port, SENDER, '', use_ssl=False,
+                                             retry_base_seconds=0.05, retry_max_seconds=0.1, **kwargs)
+
+
+POOLS = [pytest.param(smtp_pool, id='threads'), pytest.param(pipelined_pool, id='pipelined')]
+
+
+def send(pool, emails):
+    results = {result.job.recipient_email: result for result in pool.send_all(job(email) for email in emails)}
+    assert len(results) == len(emails)
+    return results
+
+
+@pytest.mark.parametrize('make_pool', POOLS)
+def test_pool_delivers_every_message(make_pool):
+    emails = [f"user{i}@domain{i % 3}.com" for i in range(30)]
+    with SmtpSink() as sink:
+        results = send(make_pool(sink, size=3), emails)
+    assert all(result.success for result in results.values())
+    assert sink.messages == 30
+
+
+@pytest.mark.parametrize('make_pool', POOLS)
+def test_pool_retries_a_4xx_refusal(make_pool):
+    with SmtpSink(rcpt_replies={'busy@a.com': ['451 4.7.1 Try again later']}) as sink:
+        results = send(make_pool(sink, size=2), ['busy@a.com', 'ok@b.com'])
+    assert results['busy@a.com'].success
+    assert results['busy@a.com'].attempts == 2
+    assert results['ok@b.com'].attempts == 1
+    assert sink.messages == 2
+
+
+@pytest.mark.parametrize('make_pool', POOLS)
+def test_pool_gives_up_after_max_attempts(make_pool):
+    with SmtpSink(rcpt_replies={'busy@a.com': ['451 4.7.1 Try again later'] * 5}) as sink:
+        results = send(make_pool(sink, size=1, max_attempts=3), ['busy@a.com'])
+    assert not results['busy@a.com'].success
+    assert results['busy@a.com'].attempts == 3
+    assert sink.messages == 0
+
+
+@pytest.mark.parametrize('make_pool', POOLS)
+def test_pool_fails_a_5xx_refusal_at_once(make_pool):
+    with SmtpSink(rcpt_replies={'gone@a.com': ['550 5.1.1 No such user']}) as sink:
+        results = send(make_pool(sink, size=1), ['gone@a.com', 'ok@a.com'])
+    assert not results['gone@a.com'].success
+    assert results['gone@a.com'].attempts == 1
+    assert email_sender.smtp_reply_code(results['gone@a.com'].error) == 550
+    assert results['ok@a.com'].success
+
+
+@pytest.mark.parametrize('make_pool', POOLS)
+def test_pool_reconnects_after_421(make_pool):
+    with SmtpSink(rcpt_replies={'drop@a.com': ['421 4.3.2 Closing connection']}) as sink:
+        results = send(make_pool(sink, size=1), ['drop@a.com', 'next@a.com'])
+    assert results['drop@a.com'].success
+    assert results['drop@a.com'].attempts == 2
+    # Sent on the new connection, not tried first on the closed one
+    assert results['next@a.com'].success
+    assert results['next@a.com'].attempts == 1
+    assert sink.messages == 2
+
+
+def test_pool_caps_sends_in_flight_per_domain():
+    peak = {}
+    active = {}
+    lock = threading.Lock()
+
+    class CountingServer:
+        # Wraps a real connection to record concurrent sends per domain
+        def __init__(self, server):
+            self.server = server
+
+        def send_message(self, msg):
+            domain = send_pool.recipient_domain(msg['To'])
+            with lock:
+                active[domain] = active.get(domain, 0) + 1
+                peak[domain] = max(peak.get(domain, 0), active[domain])
+            try:
+                time.sleep(0.02)
+                return self.server.send_message(msg)
+            finally:
+                with lock:
+                    active[domain] -= 1
+
+        def quit(self):
+            return self.server.quit()
+
+    emails = [f"user{i}@{'big' if i % 4 else 'small'}.com" for i in range(24)]
+    with SmtpSink() as sink:
+        def connect():
+            return CountingServer(email_sender.login_to_server('127.0.0.1', sink.port, SENDER, '', use_ssl=False))
+        pool = send_pool.SmtpSenderPool(connect, SENDER, size=6, domain_max_in_flight=2,
+                                        domain_limits={'small.com': {'max_in_flight': 1}})
+        results = send(pool, emails)
+    assert all(result.success for result in results.values())
+    assert peak == {'big.com': 2, 'small.com': 1}
+
+
+# --- Pipelined connection ---
+
+def run_connection(sink, password, batches):
+    async def go():
+        connection = smtp_pipeline.PipelinedConnection('127.0.0.1', sink.port, SENDER, password, use_ssl=False)
+        await connection.open()
+        try:
+            return [await connection.send_many(batch) for batch in batches]
+        finally:
+            await connection.close(quit=True)
+    return asyncio.run(go())
+
+
+def test_pipelined_connection_resets_between_batches():
+    envelope = (['to@example.com'], b'Subject: Hi\r\n\r\nHello')
+    with SmtpSink() as sink:
+        outcomes = run_connection(sink, '', [[envelope] * 3, [envelope] * 2, [envelope]])
+    assert outcomes == [[None] * 3, [None] * 2, [None]]
+    assert sink.messages == 6
+    assert sink.commands['RSET'] == 2
+
+
+def test_pipelined_connection_never_sends_a_password_in_cleartext():
+    # The sink offers no STARTTLS
+    with SmtpSink() as sink:
+        with pytest.raises(smtplib.SMTPNotSupportedError):
+            run_connection(sink, 'secret', [])
+    assert sink.commands['AUTH'] == 0
+
+
+# --- Login ---
+
+def test_login_never_sends_a_password_in_cleartext():
+    with SmtpSink() as sink:
+        assert email_sender.login_to_server('127.0.0.1', sink.port, SENDER, 'secret', use_ssl=False) is None
+    assert sink.commands['AUTH'] == 0
@@ -0,0 +1,56 @@
+import types
+
+import pytest
+
+from sending_email import settings
+
+
+def make_config():
+    return types.SimpleNamespace(SMTP_PORT=465, SMTP_USE_SSL=True, METRICS_FILE=None)
+
+
+def test_environment_overrides_config():
+    config = make_config()
+    sources = settings.apply(config, environ={'EMAILER_SMTP_PORT': '587', 'EMAILER_SMTP_USE_SSL': 'false'})
+    assert (config.SMTP_PORT, config.SMTP_USE_SSL) == (587, False)
+    assert sources == {'SMTP_PORT': '$EMAILER_SMTP_PORT', 'SMTP_USE_SSL': '$EMAILER_SMTP_USE_SSL'}
+
+
+def test_set_beats_environment():
+    config = make_config()
+    settings.apply(config, environ={'EMAILER_SMTP_PORT': '587'}, pairs=['SMTP_PORT=2525'])
+    assert config.SMTP_PORT == 2525
+
+
+def test_apply_once_keeps_the_first_layering():
+    # cli.py applies --set, then main.main() applies again without it
+    config = make_config()
+    environ = {'EMAILER_SMTP_PORT': '587'}
+    settings.apply_once(config, environ=environ, pairs=['SMTP_PORT=2525'])
+    sources = settings.apply_once(config, environ=environ)
+    assert config.SMTP_PORT == 2525
+    assert sources['SMTP_PORT'] == '--set'
+
+
+@pytest.mark.parametrize('text, default, expected', [
+    ('2', 1, 2),
+    ('0.5', 1, 0.5),
+    ('3', 1.5, 3.0),
+    ('off', True, False),
+    ('["a", "b"]', [], ['a', 'b']),
+    ('none', 1, None),
+    ('42', None, 42),
+    ('out.json', None, 'out.json'),
+])
+def test_parse_value_follows_the_default_type(text, default, expected):
+    value = settings.parse_value(text, default)
+    assert value == expected and type(value) is type(expected)
+
+
+def test_parse_value_rejects_text_for_a_number():
+    with pytest.raises(ValueError):
+        settings.parse_value('fast', 1)
+
+
+def test_unknown_set_name_is_rejected():
+    assert settings.apply(make_config(), environ={}, pairs=['NOT_A_SETTING=1']) is None
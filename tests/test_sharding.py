@@ -0,0 +1,109 @@
+import threading
+import time
+
+import pytest
+
+from sending_email import send_journal
+from sending_email import send_pool
+from sending_email import sharding
+
+EMAILS = [f"user{i}@example.com" for i in range(50)]
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = str(tmp_path / 'journal.sqlite3')
+    # The claim store reads the journal's 'sends' table
+    send_journal.SendJournal(path).close()
+    return path
+
+
+@pytest.fixture
+def stores(path):
+    opened = []
+
+    def open_store(owner, lease_seconds=60):
+        store = sharding.ClaimStore(path, owner, lease_seconds=lease_seconds)
+        opened.append(store)
+        return store
+
+    yield open_store
+    for store in opened:
+        store.close()
+
+
+def test_racing_owners_never_claim_the_same_row(stores):
+    owners = [stores('a'), stores('b')]
+    won = {store.owner: [] for store in owners}
+    start = threading.Barrier(len(owners))
+
+    def race(store):
+        start.wait()
+        for email in EMAILS:
+            if store.claim(email, 't.html'):
+                won[store.owner].append(email)
+
+    threads = [threading.Thread(target=race, args=(store,)) for store in owners]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(won['a'] + won['b']) == sorted(EMAILS)
+    assert not set(won['a']) & set(won['b'])
+
+
+def test_claims_match_email_case_insensitively(stores):
+    a, b = stores('a'), stores('b')
+    assert a.claim('User@Example.com ', 't.html')
+    assert not b.claim('user@example.com', 't.html')
+
+
+def test_an_expired_lease_can_be_reclaimed(stores):
+    a, b = stores('a', lease_seconds=0.2), stores('b', lease_seconds=0.2)
+    assert a.claim(EMAILS[0], 't.html')
+    assert not b.claim(EMAILS[0], 't.html')
+    time.sleep(0.3)
+    assert b.claim(EMAILS[0], 't.html')
+    assert not a.claim(EMAILS[0], 't.html')
+
+
+def test_renewal_keeps_a_claim_alive(stores):
+    a, b = stores('a', lease_seconds=0.3), stores('b', lease_seconds=0.3)
+    assert a.claim(EMAILS[0], 't.html')
+    keeper = sharding.LeaseKeeper(a).start()
+    try:
+        time.sleep(0.6)
+        assert not b.claim(EMAILS[0], 't.html')
+    finally:
+        keeper.stop()
+
+
+def test_released_claims_are_free_again(stores):
+    a, b = stores('a'), stores('b')
+    assert a.claim(EMAILS[0], 't.html')
+    assert a.claim(EMAILS[1], 't.html')
+    a.release(EMAILS[0], 't.html')
+    assert b.claim(EMAILS[0], 't.html')
+    a.release_all()
+    assert b.claim(EMAILS[1], 't.html')
+
+
+def test_rows_the_journal_shows_sent_are_refused(path, stores):
+    journal = send_journal.SendJournal(path)
+    journal.record(0, EMAILS[0], 't.html', 'Sent')
+    journal.record(1, EMAILS[1], 't.html', 'Failed', 'boom')
+    journal.close()
+    a = stores('a')
+    assert not a.claim(EMAILS[0], 't.html')
+    assert a.claim(EMAILS[1], 't.html')
+    # A different template is a different send
+    assert a.claim(EMAILS[0], 'other.html')
+
+
+def test_claimed_jobs_skips_rows_claimed_elsewhere(stores):
+    a, b = stores('a'), stores('b')
+    jobs = [send_pool.SendJob(key=i, recipient_email=email, subject='Hello', body='<p>Hi</p>', attachment_paths=[],
+                              inline_image_path=None, template_file='t.html')
+            for i, email in enumerate(EMAILS[:4])]
+    assert b.claim(EMAILS[1], 't.html')
+    assert [job.recipient_email for job in a.claimed_jobs(jobs)] == [EMAILS[0], EMAILS[2], EMAILS[3]]
@@ -0,0 +1,96 @@
+import os
+
+import pandas as pd
+
+from sending_email import template_handler
+
+SENDER = ('Me Myself', '555-0100', 'me@example.com', 'Austin, TX')
+
+
+def write_template(folder, name, text, mtime_ns=None):
+    path = folder / name
+    path.write_text(text)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+    return name
+
+
+# --- Compiled templates ---
+
+def test_compiled_template_is_reused_until_the_file_changes(tmp_path):
+    name = write_template(tmp_path, 't.html', "Subject: Hi {first_name} ---\n<p>One</p>", mtime_ns=10**18)
+    first = template_handler.get_compiled_template(str(tmp_path), name)
+    assert template_handler.get_compiled_template(str(tmp_path), name) is first
+    assert (first.subject, first.body) == ('Hi {first_name}', '<p>One</p>')
+
+    write_template(tmp_path, name, "Subject: Hello {first_name} ---\n<p>Two</p>", mtime_ns=10**18 + 1)
+    second = template_handler.get_compiled_template(str(tmp_path), name)
+    assert second is not first
+    assert (second.subject, second.body) == ('Hello {first_name}', '<p>Two</p>')
+
+
+def test_unknown_placeholders_are_rejected_at_load(tmp_path):
+    name = write_template(tmp_path, 'bad.html', "Subject: Hi ---\n<p>{frist_name}</p>")
+    assert template_handler.get_compiled_template(str(tmp_path), name) is None
+    assert template_handler.get_compiled_template(str(tmp_path), 'missing.html') is None
+
+
+def test_compiled_rendering_matches_format_map(tmp_path):
+    text = "Subject: {position} at {company} ---\n<p>Dear {first_name}, {{literal}} {value_prop_sentence}</p>"
+    name = write_template(tmp_path, 't.html', text)
+    template = template_handler.get_compiled_template(str(tmp_path), name)
+    rows = pd.DataFrame({
+        'Name': ['Ann Lee', 'Bob'],
+        'Companies': ['Acme', 'Initech'],
+        'Positions': ['Engineer', 'Analyst'],
+        'Framework': ['passion', ''],
+        'my strength': ['building tools', ''],
+        'something my target audience values': ['faster releases', ''],
+    })
+    rendered = template_handler.render_batch(template, rows, *SENDER)
+    expected = [
+        template_handler.personalize_template(template.subject, template.body, row.to_dict(), *SENDER, None, name)[:2]
+        for _, row in rows.iterrows()
+    ]
+    assert [(subject, body) for subject, body, _ in rendered] == expected
+    assert rendered[0][1] == "<p>Dear Ann, {literal} I'm passionate about building tools to achieve faster releases.</p>"
+
+
+# --- Vectorized personalization ---
+
+def test_value_prop_column_matches_the_row_by_row_sentence():
+    cases = [
+        ('passion', 'building tools', 'faster releases'),
+        ('Known_For', 'clean APIs', 'fewer bugs'),
+        ('mission', 'ship', 'happy users'),
+        ('typo', 'testing', 'quality'),
+        ('passion', '', 'faster releases'),
+        ('', 'testing', 'quality'),
+    ]
+    framework, strength, values = (pd.Series(column) for column in zip(*cases))
+    assert template_handler.create_value_prop_column(framework, strength, values).tolist() == [
+        template_handler.create_value_prop(*case) for case in cases
+    ]
+
+
+def test_value_prop_column_treats_missing_cells_as_blank():
+    column = template_handler.create_value_prop_column(
+        pd.Series(['passion', None]), pd.Series([float('nan'), 'x']), pd.Series(['y', 'z'])
+    )
+    assert column.tolist() == [template_handler.DEFAULT_VALUE_PROP] * 2
+
+
+def test_prepare_recipients_keeps_the_index_and_fills_first_names():
+    df = pd.DataFrame({
+        'Name': ['  Ann Lee', None, 'Bob'],
+        'Email': ['a@example.com', 'b@example.com', 'c@example.com'],
+        'Companies': ['Acme', 'Initech', 'Globex'],
+        'Template File': ['t.html'] * 3,
+    }, index=[4, 7, 9])
+    prepared = template_handler.prepare_recipients(df)
+    assert prepared.index.tolist() == [4, 7, 9]
+    assert prepared['first_name'].tolist() == ['Ann', 'there', 'Bob']
+    # Columns the sheet doesn't have come back blank
+    assert prepared['position'].tolist() == ['', '', '']
+    first = next(prepared.itertuples(name='Recipient'))
+    assert (first.Index, first.email, first.company) == (4, 'a@example.com', 'Acme')